@@ -0,0 +1,233 @@
+"""
+Response encoding with content negotiation.
+
+Simulation responses can be large (one entry per agent), so the backend picks
+the most compact representation the client accepts:
+
+- `application/json` (default), serialized with orjson when installed
+- `application/msgpack`: the same structure as MessagePack
+- `application/x-agent-columns+json` / `application/x-agent-columns+msgpack`:
+  comments transposed into columns (see `to_columns`); in MessagePack the
+  lat/lng columns are packed float64 arrays and opinions int8 codes
+
+Bodies above `MIN_COMPRESS_BYTES` are compressed with brotli or gzip per
+`Accept-Encoding`. `from_columns` restores the original response structure.
+"""
+import gzip
+import json
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNS_JSON = "application/x-agent-columns+json"
+COLUMNS_MSGPACK = "application/x-agent-columns+msgpack"
+
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+OPINION_LABELS = ["support", "oppose", "neutral"]
+
+
+def available_media_types() -> List[str]:
+    """Media types this server can produce, in preference order for `*/*`."""
+    types = [JSON, COLUMNS_JSON]
+    if HAS_MSGPACK:
+        types += [MSGPACK, COLUMNS_MSGPACK]
+    return types
+
+
+def dumps_json(payload: Any) -> bytes:
+    """Serialize to JSON bytes, handling numpy values and non-string keys."""
+    if HAS_ORJSON:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_to_builtin, separators=(",", ":")).encode("utf-8")
+
+
+def _to_builtin(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def to_columns(response: Dict[str, Any], binary: bool = False) -> Dict[str, Any]:
+    """Transpose `response["comments"]` into per-field columns.
+
+    Location and opinion become dense `lat`/`lng`/`opinion` columns (opinion
+    as an index into `opinion_labels`, -1 when missing); every other comment
+    field becomes a list column. Fields missing from some comments list those
+    comments' indices in `absent`, so explicit nulls survive the round trip.
+    Comments keyed by ID (m01 keys its sample agents by index, census models
+    by participant) keep their keys in an `id` column. With `binary`, the dense columns are raw little-endian bytes
+    (float64 and int8) for MessagePack.
+    """
+    comments = response.get("comments", [])
+    ids = list(comments.keys()) if isinstance(comments, dict) else None
+    comments = list(comments.values()) if isinstance(comments, dict) else list(comments)
+    count = len(comments)
+    lat = np.full(count, np.nan)
+    lng = np.full(count, np.nan)
+    opinion = np.full(count, -1, dtype=np.int8)
+    fields: Dict[str, List[Any]] = {}
+    present: Dict[str, int] = {}
+
+    for i, comment in enumerate(comments):
+        for key, value in comment.items():
+            if key == "location" and isinstance(value, dict):
+                lat[i] = value.get("lat", np.nan)
+                lng[i] = value.get("lng", np.nan)
+            elif key == "opinion" and value in OPINION_LABELS:
+                opinion[i] = OPINION_LABELS.index(value)
+            else:
+                column = fields.get(key)
+                if column is None:
+                    column = fields[key] = [None] * count
+                column[i] = value
+                present[key] = present.get(key, 0) + 1
+
+    columns = {
+        "count": count,
+        "opinion_labels": OPINION_LABELS,
+        "fields": fields,
+        "absent": {key: [i for i, comment in enumerate(comments) if key not in comment]
+                   for key, n in present.items() if n < count}
+    }
+    if ids is not None:
+        columns["id"] = ids
+    if binary:
+        columns.update(lat=lat.astype("<f8").tobytes(), lng=lng.astype("<f8").tobytes(),
+                       opinion=opinion.tobytes())
+    else:
+        columns.update(lat=[None if np.isnan(v) else v for v in lat.tolist()],
+                       lng=[None if np.isnan(v) else v for v in lng.tolist()],
+                       opinion=opinion.tolist())
+
+    result = {key: value for key, value in response.items() if key != "comments"}
+    result["comments"] = columns
+    return result
+
+
+def from_columns(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of `to_columns`: rebuild the comment list (or dict, if keyed by ID)."""
+    columns = response["comments"]
+    count = columns["count"]
+    labels = columns["opinion_labels"]
+
+    def dense(name, dtype):
+        values = columns[name]
+        if isinstance(values, (bytes, bytearray)):
+            return np.frombuffer(values, dtype=dtype).tolist()
+        return values
+
+    lat = dense("lat", "<f8")
+    lng = dense("lng", "<f8")
+    opinion = dense("opinion", "i1")
+    absent = {key: set(indices) for key, indices in columns.get("absent", {}).items()}
+
+    comments = []
+    for i in range(count):
+        comment = {key: values[i] for key, values in columns["fields"].items()
+                   if key not in absent or i not in absent[key]}
+        if lat[i] is not None and lat[i] == lat[i]:
+            comment["location"] = {"lat": lat[i], "lng": lng[i]}
+        if opinion[i] >= 0:
+            comment["opinion"] = labels[opinion[i]]
+        comments.append(comment)
+
+    result = {key: value for key, value in response.items() if key != "comments"}
+    result["comments"] = dict(zip(columns["id"], comments)) if "id" in columns else comments
+    return result
+
+
+def negotiate_media_type(accept: str) -> str:
+    """Pick the response media type from an Accept header (q-values respected)."""
+    offered = available_media_types()
+    best, best_q = JSON, 0.0
+    for part in (accept or "").split(","):
+        media, _, params = part.strip().partition(";")
+        media = media.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        candidates = offered if media in ("*/*", "application/*") else [media]
+        for candidate in candidates:
+            # Ties keep the earlier (server-preferred) type
+            if candidate in offered and q > best_q:
+                best, best_q = candidate, q
+                break
+    return best
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Pick "br", "gzip" or "" (identity) from an Accept-Encoding header."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    if HAS_BROTLI and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return ""
+
+
+def encode(payload: Dict[str, Any], accept: str = "", accept_encoding: str = "") -> Tuple[bytes, Dict[str, str]]:
+    """Serialize and compress a response for the client's Accept headers.
+
+    Returns:
+        (body, headers) with Content-Type, Vary and, if compressed, Content-Encoding
+    """
+    media_type = negotiate_media_type(accept)
+    if media_type == MSGPACK:
+        body = msgpack.packb(payload, default=_to_builtin)
+    elif media_type == COLUMNS_MSGPACK:
+        body = msgpack.packb(to_columns(payload, binary=True), default=_to_builtin)
+    elif media_type == COLUMNS_JSON:
+        body = dumps_json(to_columns(payload))
+    else:
+        body = dumps_json(payload)
+
+    headers = {"Content-Type": media_type, "Vary": "Accept, Accept-Encoding"}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        coding = negotiate_encoding(accept_encoding)
+        if coding == "br":
+            body = brotli.compress(body, quality=4)
+            headers["Content-Encoding"] = "br"
+        elif coding == "gzip":
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+    return body, headers
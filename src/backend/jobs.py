@@ -0,0 +1,347 @@
+"""
+Persistent background jobs for simulations too large for one HTTP request.
+
+Jobs live in a local SQLite database, so they survive restarts and can be
+processed either by worker tasks inside the API server or by a separate
+`backend/worker.py` process pointed at the same database file. Workers claim
+the highest-priority queued job, record progress as its agents complete,
+cancel the simulation when asked and store the final result, which is the
+`/discuss` response for the same request.
+
+`JobStore` is synchronous and may wait up to 30s for another process's write
+lock, so `JobRunner` and the API call it through `asyncio.to_thread`.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, Any, Callable, List, Optional
+
+from backend.model_pool import ModelPool
+from backend.simulation import run_simulation, opinion_of
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    model TEXT NOT NULL,
+    region TEXT NOT NULL,
+    population INTEGER NOT NULL DEFAULT 0,
+    proposal TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    summary TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+"""
+
+# Columns returned by `JobStore.get` (the large result is fetched separately)
+_STATUS_COLUMNS = ("id", "status", "priority", "model", "region", "population", "completed",
+                   "total", "summary", "error", "worker", "created_at", "started_at", "finished_at")
+
+
+class JobStore:
+    """SQLite-backed job table, safe to share between processes."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Database file; created (with its directory) if missing
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def submit(self, model: str, region: str, proposal: Dict[str, Any],
+               population: int = 0, priority: int = 0) -> str:
+        """Queue a simulation and return its job id. Higher priority runs first."""
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, priority, model, region, population, proposal, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, priority, model, region, population, json.dumps(proposal), time.time())
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status and progress of a job, or None if it does not exist."""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_STATUS_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._status(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally filtered by status."""
+        query = f"SELECT {', '.join(_STATUS_COLUMNS)} FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._status(row) for row in rows]
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Stored result of a completed job."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or row["result"] is None:
+            return None
+        return json.loads(row["result"])
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job; queued jobs stop immediately, running ones at the next agent.
+
+        Returns:
+            The job's status after the request, or None if it does not exist
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, now, job_id, QUEUED)
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING)
+            )
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each state."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def claim(self, worker: str, models: List[str]) -> Optional[Dict[str, Any]]:
+        """Atomically move the next queued job for one of `models` to running."""
+        if not models:
+            return None
+        placeholders = ", ".join("?" for _ in models)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT id, model, region, population, proposal FROM jobs "
+                f"WHERE status = ? AND model IN ({placeholders}) "
+                f"ORDER BY priority DESC, created_at LIMIT 1",
+                (QUEUED, *models)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, worker, now, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        job = dict(row)
+        job["proposal"] = json.loads(job["proposal"])
+        return job
+
+    def update_progress(self, job_id: str, completed: int, total: Optional[int],
+                        summary: Dict[str, int]) -> bool:
+        """Record progress; returns True if cancellation was requested."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET completed = ?, total = ?, summary = ?, updated_at = ? WHERE id = ?",
+                (completed, total, json.dumps(summary), time.time(), job_id)
+            )
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> None:
+        """Mark a job completed, failed or cancelled."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, now, now, job_id)
+            )
+
+    def requeue_stale(self, max_age: float) -> int:
+        """Requeue running jobs whose worker has not reported for `max_age` seconds."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, completed = 0 "
+                "WHERE status = ? AND updated_at < ?",
+                (QUEUED, RUNNING, time.time() - max_age)
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def _status(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else None
+        return job
+
+
+class JobRunner:
+    """Runs queued jobs on `concurrency` worker tasks using a model pool."""
+
+    def __init__(self,
+                 store: JobStore,
+                 model_pool: ModelPool,
+                 concurrency: int = 2,
+                 poll_interval: float = 1.0,
+                 progress_interval: float = 1.0,
+                 stale_after: float = 600.0,
+                 name: Optional[str] = None,
+                 on_result: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None):
+        """
+        Args:
+            store: Job database
+            model_pool: Started pool providing model instances
+            concurrency: Number of jobs processed at once
+            poll_interval: Seconds between queue polls when idle
+            progress_interval: Minimum seconds between progress writes per job
+            stale_after: Running jobs silent for this long are requeued on start
+            name: Worker name recorded on claimed jobs
+            on_result: Called with (job, result) after a job completes
+        """
+        self.store = store
+        self.model_pool = model_pool
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.stale_after = stale_after
+        self.name = name or f"{os.uname().nodename}:{os.getpid()}"
+        self.on_result = on_result
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Requeue stale jobs and spawn worker tasks on the running event loop."""
+        requeued = await asyncio.to_thread(self.store.requeue_stale, self.stale_after)
+        if requeued:
+            logger.info("Requeued %d stale jobs", requeued)
+        self._tasks = [
+            asyncio.create_task(self._work(f"{self.name}/{i}"))
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel worker tasks; interrupted jobs are requeued once stale."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self) -> None:
+        """Start the workers and wait on them (for standalone worker processes)."""
+        await self.start()
+        await asyncio.gather(*self._tasks)
+
+    async def _work(self, worker: str) -> None:
+        while True:
+            job = await asyncio.to_thread(self.store.claim, worker, self.model_pool.available_models)
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            logger.info("Worker %s running job %s (%s)", worker, job["id"], job["model"])
+            try:
+                await self.run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Job %s failed: %s", job["id"], e)
+                await asyncio.to_thread(self.store.finish, job["id"], FAILED, error=str(e))
+
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        """Simulate one claimed job, recording progress and the final result.
+
+        The simulation runs as a task while progress, counted from the agents
+        the model reports (see `BaseModel.on_agent`), is written every
+        `progress_interval` seconds. A cancellation request seen at a progress
+        write cancels the simulation.
+        """
+        summary = {"support": 0, "oppose": 0, "neutral": 0}
+        completed = 0
+
+        def on_agent(entry: Dict[str, Any]) -> None:
+            nonlocal completed
+            completed += 1
+            opinion = opinion_of(entry)
+            if opinion in summary:
+                summary[opinion] += 1
+
+        cancelled = False
+        async with self.model_pool.acquire(job["model"]) as model:
+            total = job["population"] or getattr(model.config, "population", None)
+            simulation = asyncio.create_task(
+                run_simulation(model, job["region"], job["proposal"], job["population"], on_agent=on_agent))
+            try:
+                while True:
+                    done, _ = await asyncio.wait({simulation}, timeout=self.progress_interval)
+                    if done:
+                        break
+                    if await asyncio.to_thread(self.store.update_progress, job["id"], completed, total,
+                                               dict(summary)):
+                        cancelled = True
+                        break
+            finally:
+                if not simulation.done():
+                    simulation.cancel()
+                    await asyncio.gather(simulation, return_exceptions=True)
+
+        if cancelled:
+            await asyncio.to_thread(self.store.finish, job["id"], CANCELLED)
+            logger.info("Job %s cancelled after %d agents", job["id"], completed)
+            return
+
+        result = simulation.result()
+        # Final progress from the result, which also covers models that report no agents
+        comments = result["comments"]
+        summary = {"support": 0, "oppose": 0, "neutral": 0}
+        for comment in (comments.values() if isinstance(comments, dict) else comments):
+            opinion = opinion_of(comment)
+            if opinion in summary:
+                summary[opinion] += 1
+        await asyncio.to_thread(self.store.update_progress, job["id"], len(comments), total, summary)
+        await asyncio.to_thread(self.store.finish, job["id"], COMPLETED, result=result)
+        if self.on_result is not None:
+            try:
+                self.on_result(job, result)
+            except Exception as e:
+                logger.error("Result hook failed for job %s: %s", job["id"], e)
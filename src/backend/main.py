@@ -1,86 +1,516 @@
 # main.py
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from typing import Dict, Type
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
 
-from models.base import BaseModel
-from models.m01_basic.model import BasicSimulationModel
-from models.m02_stupid.model import StupidAgentModel
+from quart import Quart, Response, g, request, jsonify
+from quart_cors import cors
 
-app = Flask(__name__)
-CORS(app)
+sys.path.append(str(Path(__file__).parent.parent))
 
-# Register available models
-AVAILABLE_MODELS: Dict[str, Type[BaseModel]] = {
-    "basic": BasicSimulationModel,
-    "stupid": StupidAgentModel
+from models.metrics import metrics
+from models.proposal import as_proposal
+from backend.encoding import encode
+from backend.jobs import JobStore, JobRunner
+from backend.model_pool import ModelPool, ModelUnavailableError
+from backend.proposal_registry import ProposalRegistry, UnknownProposalError
+from backend.result_cache import ResultCache
+from backend.simulation import run_simulation, run_incremental_simulation, stream_simulation, opinion_of
+from backend.tiles import TileStore
+
+app = cors(Quart(__name__))
+
+# Models served (names from models.registry); imported when the pool starts
+AVAILABLE_MODELS = os.getenv("MODELS", "basic,stupid").split(",")
+
+# Per-model configuration used to construct pooled instances
+MODEL_CONFIGS = {
+    "basic": {"num_sample_agents": 30},
+    "stupid": {
+        "llm": {"backend": os.getenv("LLM_BACKEND", "openai")},
+        # Same residents on every request, so edited proposals re-simulate only affected agents
+        "agent_seed": int(os.getenv("AGENT_SEED", "0"))
+    }
 }
 
-# Initialize default model
+# Instances per model, i.e. maximum concurrent simulations per model
+POOL_SIZE = int(os.getenv("MODEL_POOL_SIZE", "32"))
+
+# Seconds before a simulation request is abandoned
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+
+# Model used when a request does not name one
 DEFAULT_MODEL = "basic"
-current_model = AVAILABLE_MODELS[DEFAULT_MODEL]()
+default_model = DEFAULT_MODEL
+
+# Background jobs: database file and in-process workers (0 leaves jobs to backend/worker.py)
+JOB_DB = os.getenv("JOB_DB", str(Path(__file__).parent / "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# /discuss result cache: maximum entries (0 disables) and seconds entries stay valid
+CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+
+# Proposal registry limits: proposals kept and total cells across them
+REGISTRY_SIZE = int(os.getenv("PROPOSAL_REGISTRY_SIZE", "64"))
+REGISTRY_MAX_CELLS = int(os.getenv("PROPOSAL_REGISTRY_MAX_CELLS", "500000"))
+
+# Map tile layers (proposals and their latest opinion results) kept in memory
+TILE_LAYERS = int(os.getenv("TILE_LAYERS", "64"))
+
+model_pool = ModelPool(AVAILABLE_MODELS, MODEL_CONFIGS, size=POOL_SIZE)
+proposal_registry = ProposalRegistry(max_entries=REGISTRY_SIZE, max_cells=REGISTRY_MAX_CELLS)
+result_cache = ResultCache(max_entries=CACHE_SIZE, ttl=CACHE_TTL)
+tile_store = TileStore(max_layers=TILE_LAYERS)
+job_store = None
+job_runner = None
+# Job counts for the `jobs` gauge, read from the database off the event loop on each scrape
+job_counts: Dict[str, int] = {}
+
+HTTP_REQUESTS = metrics.counter(
+    "http_requests", "HTTP requests by endpoint, method and status", ("endpoint", "method", "status"))
+HTTP_SECONDS = metrics.histogram(
+    "http_request_seconds", "HTTP request handling time until the response starts", ("endpoint",))
+HTTP_IN_PROGRESS = metrics.gauge("http_requests_in_progress", "HTTP requests being handled")
+metrics.gauge("model_pool_idle", "Idle model instances", ("model",)).set_function(
+    lambda: {(name,): n for name, n in model_pool.idle_counts().items()})
+metrics.gauge("jobs", "Background jobs by status", ("status",)).set_function(
+    lambda: {(status,): n for status, n in job_counts.items()})
+metrics.gauge("result_cache_entries", "Cached /discuss responses").set_function(
+    lambda: result_cache.stats()["entries"])
+metrics.gauge("proposal_registry_cells", "Cells held by registered proposals").set_function(
+    lambda: proposal_registry.stats()["cells"])
+metrics.gauge("tile_layers", "Proposal and opinion tile layers held in memory").set_function(
+    lambda: tile_store.stats()["layers"])
+
+
+@app.before_serving
+async def start_model_pool():
+    await model_pool.start()
+
+
+@app.before_serving
+async def start_job_workers():
+    global job_store, job_runner
+    job_store = await asyncio.to_thread(JobStore, JOB_DB)
+    if JOB_WORKERS > 0:
+        job_runner = JobRunner(job_store, model_pool, concurrency=JOB_WORKERS, on_result=record_job_result)
+        await job_runner.start()
+
+
+@app.after_serving
+async def stop_job_workers():
+    if job_runner is not None:
+        await job_runner.stop()
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+    HTTP_IN_PROGRESS.inc()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    HTTP_IN_PROGRESS.dec()
+    return response
+
+
+def record_job_result(job: Dict, result: Dict) -> None:
+    """Update the opinion tiles with a completed background job's result."""
+    proposal = as_proposal(job["proposal"])
+    tile_store.record_result(proposal.content_hash, proposal, job["model"], result)
+
+
+async def simulate_with_model(model_name: str, region: str, proposal: Dict, population: int) -> Dict:
+    """Run a simulation on a model instance owned by this request."""
+    async with model_pool.acquire(model_name) as model:
+        return await run_simulation(model, region, proposal, population)
+
+
+async def resimulate_with_model(model_name: str, region: str, proposal: Dict, population: int,
+                                previous_proposal: Dict, previous_result: Dict) -> Dict:
+    """Run an incremental simulation from a base proposal's result on a model instance owned by this request."""
+    async with model_pool.acquire(model_name) as model:
+        return await run_incremental_simulation(model, region, proposal, previous_proposal, previous_result, population)
+
+
+def previous_simulation(model_name: str, region: str, proposal_hash: str,
+                        population: int) -> Optional[Tuple[Dict, Dict]]:
+    """(base proposal, cached result) for a proposal registered as a delta, if the base was simulated."""
+    base_hash = proposal_registry.base_of(proposal_hash)
+    if base_hash is None:
+        return None
+    cache_key = ResultCache.key(model_name, MODEL_CONFIGS.get(model_name, {}), region, base_hash, population)
+    previous_result = result_cache.get(cache_key)
+    if previous_result is None:
+        return None
+    return proposal_registry.get(base_hash), previous_result
+
+
+def validate_proposal(proposal: Any) -> None:
+    """Raise ValueError unless `proposal` is a proposal object with title and description."""
+    if not proposal or not isinstance(proposal, dict):
+        raise ValueError("Invalid input. Ensure region, population, and proposal are provided.")
+    if "title" not in proposal or "description" not in proposal:
+        raise ValueError("Invalid proposal. Ensure title and description are provided.")
+
+
+def parse_simulation_request(data: Dict) -> Tuple[str, str, int, Dict, str]:
+    """Validate a simulation request body shared by /discuss, /discuss/stream and /jobs.
+
+    The proposal is given inline (`proposal`), by registry hash
+    (`proposal_id`) or as a delta against a registered base (`proposal_delta`).
+    An optional `cell_size` (a multiple of the proposal's) simulates the
+    proposal aggregated to that coarser grid.
+
+    Returns:
+        (model name, region, population, proposal, proposal content hash)
+
+    Raises:
+        ValueError: For invalid input (400)
+        UnknownProposalError: For unregistered proposal hashes (404)
+    """
+    data = data or {}
+    region = data.get('region', '').lower()
+    population = data.get('population', 0)
+    model_name = data.get('model', default_model).lower()
+
+    if not region or not isinstance(population, int):
+        raise ValueError("Invalid input. Ensure region, population, and proposal are provided.")
+
+    if data.get('proposal_id'):
+        proposal_hash = data['proposal_id']
+        if not isinstance(proposal_hash, str):
+            raise ValueError("proposal_id must be a proposal hash string")
+        proposal = proposal_registry.get(proposal_hash)
+    elif data.get('proposal_delta'):
+        if not isinstance(data['proposal_delta'], dict):
+            raise ValueError("proposal_delta must be an object")
+        if not isinstance(data['proposal_delta'].get('base'), str):
+            raise ValueError("proposal_delta.base must be the hash string of a registered proposal")
+        proposal_hash, proposal = proposal_registry.resolve_delta(data['proposal_delta'])
+        tile_store.link(proposal_hash, data['proposal_delta']['base'])
+    else:
+        proposal = data.get('proposal', {})
+        validate_proposal(proposal)
+        proposal = as_proposal(proposal)
+        proposal_hash = proposal.content_hash
+    validate_proposal(proposal)
+
+    cell_size = data.get('cell_size')
+    if cell_size is not None:
+        proposal = at_resolution(proposal, cell_size)
+        proposal_hash = proposal.content_hash
+
+    if model_name not in model_pool.available_models:
+        raise ValueError(f"Unknown model: {model_name}. Available models: {model_pool.available_models}")
+    return model_name, region, population, proposal, proposal_hash
+
+
+def at_resolution(proposal, cell_size) -> Dict:
+    """Proposal aggregated to `cell_size` metres (cached on the proposal)."""
+    if not isinstance(cell_size, int) or isinstance(cell_size, bool):
+        raise ValueError("cell_size must be an integer number of metres")
+    return as_proposal(proposal).at_resolution(cell_size)
+
+
+def encoded_response(payload: Dict[str, Any]) -> Response:
+    """Response in the format and compression negotiated from the request's Accept headers."""
+    body, headers = encode(
+        payload,
+        request.headers.get("Accept", ""),
+        request.headers.get("Accept-Encoding", "")
+    )
+    return Response(body, headers=headers)
+
+
+def request_error(error: Exception):
+    """JSON error response for a failed `parse_simulation_request`."""
+    status = 404 if isinstance(error, UnknownProposalError) else 400
+    return jsonify({"error": str(error)}), status
+
+
+@app.route('/health', methods=['GET'])
+async def health():
+    """Health check endpoint"""
+    return jsonify({
+        "status": "ok",
+        "available_models": model_pool.available_models,
+        "result_cache": result_cache.stats(),
+        "proposal_registry": proposal_registry.stats(),
+        "tiles": tile_store.stats()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    """Prometheus metrics in the text exposition format"""
+    global job_counts
+    if job_store is not None:
+        job_counts = await asyncio.to_thread(job_store.counts)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 
 @app.route('/set_model', methods=['POST'])
 async def set_model():
-    """Endpoint to change the active model"""
-    data = request.get_json()
+    """Endpoint to change the default model for requests that don't name one"""
+    data = await request.get_json()
     model_name = data.get('model', '').lower()
-    
+
     if not model_name:
         return jsonify({"error": "Model name is required."}), 400
-        
-    if model_name not in AVAILABLE_MODELS:
+
+    if model_name not in model_pool.available_models:
         return jsonify({
-            "error": f"Unknown model: {model_name}. Available models: {list(AVAILABLE_MODELS.keys())}"
+            "error": f"Unknown model: {model_name}. Available models: {model_pool.available_models}"
         }), 400
-    
-    global current_model
-    current_model = AVAILABLE_MODELS[model_name]()
+
+    global default_model
+    default_model = model_name
     return jsonify({"message": f"Successfully switched to model: {model_name}"})
 
 @app.route('/get_available_models', methods=['GET'])
 async def get_available_models():
     """Endpoint to list available models"""
     return jsonify({
-        "current_model": next(name for name, cls in AVAILABLE_MODELS.items() 
-                            if isinstance(current_model, cls)),
-        "available_models": list(AVAILABLE_MODELS.keys())
+        "current_model": default_model,
+        "available_models": model_pool.available_models
     })
 
+# Proposal registry: upload once, then reference by hash or send deltas
+@app.route('/proposals', methods=['POST'])
+async def register_proposal():
+    """Register a proposal (or a `{"base": ..., "cells": ...}` delta) and return its content hash"""
+    data = await request.get_json()
+    try:
+        if isinstance(data, dict) and "base" in data and "title" not in data:
+            proposal_hash, proposal = proposal_registry.resolve_delta(data)
+            tile_store.link(proposal_hash, data['base'])
+        else:
+            validate_proposal(data)
+            proposal = data
+            proposal_hash = proposal_registry.register(proposal)
+    except (ValueError, UnknownProposalError) as e:
+        return request_error(e)
+    return jsonify({"proposal_id": proposal_hash, "cells": len(proposal.get("cells", {}))}), 201
+
+
+@app.route('/proposals/<proposal_id>', methods=['GET'])
+async def get_proposal(proposal_id):
+    """Return a registered proposal, optionally aggregated to `?cell_size=` metres"""
+    try:
+        proposal = proposal_registry.get(proposal_id)
+        cell_size = request.args.get('cell_size', type=int)
+        if cell_size is not None:
+            proposal = at_resolution(proposal, cell_size)
+        return jsonify(proposal)
+    except (ValueError, UnknownProposalError) as e:
+        return request_error(e)
+
+
 # API to discuss
 @app.route('/discuss', methods=['POST'])
 async def discuss():
-    data = request.get_json()
-    
+    data = await request.get_json()
+
     # Extract and validate inputs
-    region = data.get('region', '').lower()
-    population = data.get('population', 0)
-    proposal = data.get('proposal', {})
-    
-    # Validate inputs
-    if not region or not isinstance(population, int) or not proposal:
-        return jsonify({"error": "Invalid input. Ensure region, population, and proposal are provided."}), 400
-    if "title" not in proposal or "description" not in proposal:
-        return jsonify({"error": "Invalid proposal. Ensure title and description are provided."}), 400
+    try:
+        model_name, region, population, proposal, proposal_hash = parse_simulation_request(data)
+    except (ValueError, UnknownProposalError) as e:
+        return request_error(e)
+
+    # Identical requests share one cached (or in-flight) simulation;
+    # "Cache-Control: no-cache" forces a fresh run
+    cache_key = ResultCache.key(model_name, MODEL_CONFIGS.get(model_name, {}), region, proposal_hash, population)
+    use_cache = "no-cache" not in request.headers.get("Cache-Control", "")
+
+    # An edited proposal whose base was simulated re-queries only the agents the edit affects
+    compute = lambda: simulate_with_model(model_name, region, proposal, population)
+    previous = previous_simulation(model_name, region, proposal_hash, population) if use_cache else None
+    if previous is not None:
+        compute = lambda: resimulate_with_model(model_name, region, proposal, population, *previous)
 
     try:
-        # Run the simulation using the current model
-        opinion_distribution, sample_agents = await current_model.simulate_opinions(
-            region=region,
-            population=population,
-            proposal=proposal
+        response = await asyncio.wait_for(
+            result_cache.get_or_compute(cache_key, compute, use_cache=use_cache),
+            timeout=REQUEST_TIMEOUT
         )
-        
-        # Response structure
-        response = {
-            "summary": opinion_distribution,
-            "comments": sample_agents
-        }
-        
-        return jsonify(response)
+        tile_store.record_result(proposal_hash, proposal, model_name, response)
+        return encoded_response(response)
+    except ModelUnavailableError as e:
+        return jsonify({"error": str(e)}), 400
+    except asyncio.TimeoutError:
+        return jsonify({"error": f"Simulation timed out after {REQUEST_TIMEOUT:.0f} seconds."}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Map tiles: proposal cells and aggregated opinions for the visible viewport
+def tile_response(layer, z: int, x: int, y: int, immutable: bool) -> Response:
+    """Encoded tile with its ETag; 304 when the client's copy is current."""
+    try:
+        etag, payload = layer.tile(z, x, y)
+    except ValueError as e:
+        return request_error(e)
+    cache_control = "public, max-age=31536000, immutable" if immutable else "no-cache"
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(b"", status=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    response = encoded_response(payload)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+@app.route('/tiles/proposals/<proposal_id>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+async def proposal_tile(proposal_id, z, x, y):
+    """Cells of a registered proposal within tile z/x/y, at the zoom's resolution"""
+    try:
+        proposal = proposal_registry.get(proposal_id)
+    except UnknownProposalError as e:
+        return request_error(e)
+    # A proposal hash always has the same cells, so its tiles never change
+    return tile_response(tile_store.proposal_layer(proposal_id, proposal), z, x, y, immutable=True)
+
+
+@app.route('/tiles/opinions/<proposal_id>/<model_name>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+async def opinion_tile(proposal_id, model_name, z, x, y):
+    """Support/neutral/oppose counts per cell from the latest simulation of a proposal"""
+    layer = tile_store.opinion_layer(proposal_id, model_name.lower())
+    if layer is None:
+        return jsonify({"error": f"No simulation results for proposal {proposal_id} with model {model_name}."}), 404
+    return tile_response(layer, z, x, y, immutable=False)
+
+
+# Background jobs for simulations too large for one request
+@app.route('/jobs', methods=['POST'])
+async def submit_job():
+    """Queue a simulation; same body as /discuss plus optional integer `priority`."""
+    data = await request.get_json()
+
+    try:
+        model_name, region, population, proposal, _ = parse_simulation_request(data)
+    except (ValueError, UnknownProposalError) as e:
+        return request_error(e)
+    priority = data.get('priority', 0)
+    if not isinstance(priority, int):
+        return jsonify({"error": "Invalid priority. Priority must be an integer."}), 400
+
+    job_id = await asyncio.to_thread(job_store.submit, model_name, region, proposal, population, priority)
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+
+@app.route('/jobs', methods=['GET'])
+async def list_jobs():
+    """List recent jobs, optionally filtered with ?status=queued|running|completed|failed|cancelled"""
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({"jobs": await asyncio.to_thread(job_store.list, request.args.get('status'), limit)})
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """Job status and progress (completed agents, total, running summary)"""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+async def get_job_result(job_id):
+    """Stored result of a completed job, in the /discuss response format"""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    if job["status"] != "completed":
+        return jsonify({"error": f"Job {job_id} is {job['status']}.", "status": job["status"]}), 409
+    return encoded_response(await asyncio.to_thread(job_store.result, job_id))
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+async def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    status = await asyncio.to_thread(job_store.cancel, job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify({"job_id": job_id, "status": status})
+
+
+def _format_event(event: str, data: Dict, ndjson: bool) -> str:
+    if ndjson:
+        return json.dumps({"event": event, **data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# API to discuss, streaming each agent's opinion as soon as it is generated
+@app.route('/discuss/stream', methods=['POST'])
+async def discuss_stream():
+    """Stream opinions as server-sent events (or NDJSON with Accept: application/x-ndjson).
+
+    Emits one `opinion` event per agent carrying the agent entry, the running
+    summary counts and the number of completed agents, then a final `done`
+    event (or `error`). If the client disconnects, the response generator is
+    closed and the simulation stops at the next agent.
+    """
+    data = await request.get_json()
+
+    try:
+        model_name, region, population, proposal, proposal_hash = parse_simulation_request(data)
+    except (ValueError, UnknownProposalError) as e:
+        return request_error(e)
+
+    ndjson = "application/x-ndjson" in request.headers.get("Accept", "")
+
+    async def events():
+        summary = {"support": 0, "oppose": 0, "neutral": 0}
+        completed = 0
+        received = []
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + REQUEST_TIMEOUT
+        try:
+            async with model_pool.acquire(model_name) as model:
+                comments = stream_simulation(model, region, proposal, population)
+                try:
+                    while True:
+                        try:
+                            comment = await asyncio.wait_for(comments.__anext__(), deadline - loop.time())
+                        except StopAsyncIteration:
+                            break
+                        completed += 1
+                        received.append(comment)
+                        opinion = opinion_of(comment)
+                        if opinion in summary:
+                            summary[opinion] += 1
+                        yield _format_event("opinion", {
+                            "agent": comment,
+                            "summary": summary,
+                            "completed": completed
+                        }, ndjson)
+                finally:
+                    await comments.aclose()
+            tile_store.record_result(proposal_hash, proposal, model_name, {"comments": received})
+            yield _format_event("done", {"summary": summary, "completed": completed}, ndjson)
+        except asyncio.TimeoutError:
+            yield _format_event("error", {
+                "error": f"Simulation timed out after {REQUEST_TIMEOUT:.0f} seconds.",
+                "completed": completed
+            }, ndjson)
+        except Exception as e:
+            yield _format_event("error", {"error": str(e), "completed": completed}, ndjson)
+
+    response = Response(events(), mimetype="application/x-ndjson" if ndjson else "text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    return response
+
 if __name__ == '__main__':
-    # Run the Flask app
+    # Development server; in production run an ASGI server, e.g.
+    # hypercorn --bind 0.0.0.0:5050 --workers 1 backend.main:app  (from src/)
     app.run(debug=True, host='0.0.0.0', port=5050)
@@ -0,0 +1,85 @@
+"""
+Bounded pools of preconstructed model instances.
+
+Each request checks out its own model instance for the duration of a
+simulation, so concurrent requests never share (or replace) each other's
+model, and the number of simultaneous simulations per model is capped.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List
+
+from models.base import BaseModel, ModelConfig
+from models.registry import create_model
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailableError(Exception):
+    """Raised when a model is unknown or could not be constructed."""
+
+
+class ModelPool:
+    """Keeps up to `size` ready instances of every registered model."""
+
+    def __init__(self,
+                 model_names: List[str],
+                 model_configs: Dict[str, Dict[str, Any]] = None,
+                 size: int = 8):
+        """
+        Args:
+            model_names: Registry names of the models to serve (see `models.registry`);
+                they are imported when the pool starts
+            model_configs: Model name -> keyword arguments for its ModelConfig
+            size: Maximum number of instances (and concurrent simulations) per model
+        """
+        self.model_names = list(model_names)
+        self.model_configs = model_configs or {}
+        self.size = size
+        self._idle: Dict[str, asyncio.Queue] = {}
+        self._errors: Dict[str, str] = {}
+
+    def _build(self, name: str) -> BaseModel:
+        config = ModelConfig(**self.model_configs.get(name, {}))
+        return create_model(name, config)
+
+    async def start(self) -> None:
+        """Construct all instances up front so requests never pay for it."""
+        for name in self.model_names:
+            queue = asyncio.Queue(maxsize=self.size)
+            try:
+                for _ in range(self.size):
+                    queue.put_nowait(self._build(name))
+            except Exception as e:
+                # e.g. missing API keys; other models stay available
+                logger.warning("Model '%s' is unavailable: %s", name, e)
+                self._errors[name] = str(e)
+                continue
+            self._idle[name] = queue
+
+    @property
+    def available_models(self) -> List[str]:
+        """Names of models that have instances ready."""
+        return list(self._idle)
+
+    def idle_counts(self) -> Dict[str, int]:
+        """Idle (immediately available) instances per model."""
+        return {name: queue.qsize() for name, queue in self._idle.items()}
+
+    @asynccontextmanager
+    async def acquire(self, name: str):
+        """Check out an instance of model `name`, waiting if all are busy."""
+        if name not in self._idle:
+            if name in self._errors:
+                raise ModelUnavailableError(f"Model '{name}' is unavailable: {self._errors[name]}")
+            raise ModelUnavailableError(
+                f"Unknown model: {name}. Available models: {self.available_models}"
+            )
+
+        queue = self._idle[name]
+        model = await queue.get()
+        try:
+            yield model
+        finally:
+            queue.put_nowait(model)
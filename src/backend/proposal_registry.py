@@ -0,0 +1,100 @@
+"""
+In-memory registry of uploaded proposals, addressed by content hash.
+
+Clients upload a proposal once and afterwards send only its hash, or a small
+cell-level delta against a registered base (see `models/proposal.py`). Parsed
+proposals stay in memory until the least recently used ones are evicted to
+keep the total number of cells under `max_cells`. The registry remembers
+which base each delta was applied to, so a simulation of the edited
+proposal can start from the base's result (see `models/incremental.py`).
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from models.proposal import Proposal, apply_delta
+
+
+class UnknownProposalError(KeyError):
+    """Raised when a proposal hash is not (or no longer) registered."""
+
+    def __str__(self):
+        return f"Unknown proposal: {self.args[0]}. Upload it to /proposals first."
+
+
+class ProposalRegistry:
+    """LRU store of parsed proposals keyed by content hash."""
+
+    def __init__(self, max_entries: int = 64, max_cells: int = 500_000):
+        """
+        Args:
+            max_entries: Maximum registered proposals
+            max_cells: Maximum cells held across all proposals
+        """
+        self.max_entries = max_entries
+        self.max_cells = max_cells
+        self._proposals: "OrderedDict[str, Proposal]" = OrderedDict()
+        self._cells = 0
+        self._bases: Dict[str, str] = {}
+
+    def __contains__(self, proposal_hash: str) -> bool:
+        return proposal_hash in self._proposals
+
+    def __len__(self) -> int:
+        return len(self._proposals)
+
+    def register(self, proposal: Dict[str, Any]) -> str:
+        """Normalize and store a proposal and return its content hash."""
+        proposal = Proposal.from_dict(proposal)
+        proposal_hash = proposal.content_hash
+        if proposal_hash in self._proposals:
+            self._proposals.move_to_end(proposal_hash)
+            return proposal_hash
+        self._proposals[proposal_hash] = proposal
+        self._cells += len(proposal.get("cells", {}))
+        self._evict()
+        return proposal_hash
+
+    def get(self, proposal_hash: str) -> Proposal:
+        """Registered proposal for `proposal_hash`.
+
+        Raises:
+            UnknownProposalError: If it was never registered or has been evicted
+        """
+        try:
+            proposal = self._proposals[proposal_hash]
+        except KeyError:
+            raise UnknownProposalError(proposal_hash) from None
+        self._proposals.move_to_end(proposal_hash)
+        return proposal
+
+    def resolve_delta(self, delta: Dict[str, Any]) -> Tuple[str, Proposal]:
+        """Apply a delta to its registered base and register the result.
+
+        Returns:
+            (content hash, proposal) of the edited proposal
+
+        Raises:
+            UnknownProposalError: If the base is not registered
+            ValueError: If the delta is malformed
+        """
+        base_hash = delta.get("base", "")
+        base = self.get(base_hash)
+        proposal_hash = self.register(apply_delta(base, delta))
+        if proposal_hash != base_hash:
+            self._bases[proposal_hash] = base_hash
+        return proposal_hash, self._proposals[proposal_hash]
+
+    def base_of(self, proposal_hash: str) -> Optional[str]:
+        """Hash of the registered proposal `proposal_hash` was last derived from by a delta, if any."""
+        base_hash = self._bases.get(proposal_hash)
+        return base_hash if base_hash in self._proposals else None
+
+    def stats(self) -> Dict[str, int]:
+        return {"proposals": len(self._proposals), "cells": self._cells}
+
+    def _evict(self) -> None:
+        while len(self._proposals) > 1 and (
+                len(self._proposals) > self.max_entries or self._cells > self.max_cells):
+            evicted_hash, evicted = self._proposals.popitem(last=False)
+            self._cells -= len(evicted.get("cells", {}))
+            self._bases.pop(evicted_hash, None)
@@ -0,0 +1,130 @@
+"""
+Result cache for `/discuss` with in-flight request coalescing.
+
+Results are keyed by (model, model config, region, population, canonical
+proposal hash) and kept for `ttl` seconds, evicting the least recently used
+entry beyond `max_entries`. A request whose key is already being computed
+awaits that computation instead of starting a duplicate simulation.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+
+from models.metrics import metrics
+
+CACHE_REQUESTS = metrics.counter(
+    "result_cache_requests", "Result cache lookups by result (hit, miss, coalesced)", ("result",))
+
+
+def canonical_hash(value: Any) -> str:
+    """SHA-256 of the canonical JSON encoding (sorted keys, no whitespace)."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """TTL + LRU cache of simulation responses."""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0):
+        """
+        Args:
+            max_entries: Maximum cached responses; 0 disables caching (coalescing still applies)
+            ttl: Seconds a cached response stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(model: str, model_config: Dict[str, Any], region: str,
+            proposal_hash: str, population: int) -> str:
+        """Cache key for one simulation request.
+
+        Args:
+            proposal_hash: Content hash of the proposal (`models.proposal.content_hash`)
+        """
+        return canonical_hash({
+            "model": model,
+            "config": model_config,
+            "region": region,
+            "population": population,
+            "proposal": proposal_hash
+        })
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached response for `key`, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str,
+                             compute: Callable[[], Awaitable[Dict[str, Any]]],
+                             use_cache: bool = True) -> Dict[str, Any]:
+        """Return the cached response, join an in-flight computation, or start one.
+
+        Failed computations are not cached. Cancelling one waiter (e.g. on
+        timeout) does not cancel the shared computation for the others.
+
+        Args:
+            key: Cache key from `key()`
+            compute: Coroutine factory producing the response
+            use_cache: False always starts a new computation, skipping both the
+                cache and any in-flight one; later requests join the new one and
+                its result is stored
+        """
+        if use_cache:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                CACHE_REQUESTS.inc(result="hit")
+                return cached
+
+        task = self._inflight.get(key) if use_cache else None
+        if task is not None:
+            self.coalesced += 1
+            CACHE_REQUESTS.inc(result="coalesced")
+        else:
+            self.misses += 1
+            CACHE_REQUESTS.inc(result="miss")
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        # A computation replaced by a fresh (use_cache=False) one leaves the cache to it
+        if self._inflight.get(key) is not task:
+            return
+        del self._inflight[key]
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced
+        }
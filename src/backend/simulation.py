@@ -0,0 +1,183 @@
+"""
+Adapter between HTTP requests and the models' `simulate_opinions`.
+
+Older models (m01) take a `population` argument and return a
+(distribution, agents) tuple; newer models read the population from their
+config and return a single result dict. Both are normalized to the
+`{"summary": ..., "comments": ...}` response structure.
+
+`stream_simulation` yields the same comment entries one agent at a time for
+models that implement `stream_opinions`, and `run_incremental_simulation`
+simulates an edited proposal starting from its base proposal's result.
+"""
+import asyncio
+import inspect
+from typing import Dict, Any, AsyncIterator, Callable, Optional
+
+from models.base import BaseModel
+from models.metrics import metrics, SIMULATIONS, SIMULATION_SECONDS, SIMULATED_AGENTS
+
+INCREMENTAL_AGENTS = metrics.counter(
+    "incremental_agents", "Agents of incremental simulations by result (reused, resimulated)", ("model", "result"))
+
+
+async def run_simulation(model: BaseModel,
+                         region: str,
+                         proposal: Dict[str, Any],
+                         population: int = 0,
+                         on_agent: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Run one simulation on a checked-out model instance, recording metrics.
+
+    Args:
+        model: Model instance owned by the caller for the duration of the call
+        region: Target region name
+        proposal: Proposal details
+        population: Number of agents; 0 keeps the model's configured population
+        on_agent: Called with each agent's entry as it is simulated, for models that
+            report them (see `BaseModel.on_agent`); others report none
+
+    Returns:
+        Response dict with at least "summary" and "comments"
+    """
+    model_name = type(model).__name__
+    outcome = "error"
+    try:
+        with SIMULATION_SECONDS.time(model=model_name):
+            response = await _simulate(model, region, proposal, population, on_agent)
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        SIMULATIONS.inc(model=model_name, outcome=outcome)
+    SIMULATED_AGENTS.inc(len(response["comments"]), model=model_name)
+    return response
+
+
+async def _simulate(model: BaseModel,
+                    region: str,
+                    proposal: Dict[str, Any],
+                    population: int,
+                    on_agent: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    params = inspect.signature(model.simulate_opinions).parameters
+    if "population" in params:
+        distribution, agents = await model.simulate_opinions(
+            region=region,
+            population=population or model.config.population,
+            proposal=proposal
+        )
+        return {"summary": distribution, "comments": agents}
+
+    default_population = model.config.population
+    if population:
+        model.config.population = population
+    model.on_agent = on_agent
+    try:
+        result = await model.simulate_opinions(region=region, proposal=proposal)
+    finally:
+        model.config.population = default_population
+        model.on_agent = None
+
+    if isinstance(result, dict) and "summary" in result:
+        return result
+    # Survey-style models return per-participant results without a summary
+    return {"summary": {}, "comments": result}
+
+
+async def run_incremental_simulation(model: BaseModel,
+                                     region: str,
+                                     proposal: Dict[str, Any],
+                                     previous_proposal: Dict[str, Any],
+                                     previous_result: Dict[str, Any],
+                                     population: int = 0) -> Dict[str, Any]:
+    """Simulate an edited proposal, reusing the agents of `previous_result` that the edit does not affect.
+
+    Models with the legacy `population` signature run a full simulation.
+
+    Args:
+        previous_proposal: Proposal `proposal` was edited from
+        previous_result: Response of a simulation of `previous_proposal` with the same model and population
+
+    Returns:
+        Response dict with at least "summary" and "comments"
+    """
+    params = inspect.signature(model.simulate_opinions).parameters
+    if "population" in params:
+        return await run_simulation(model, region, proposal, population)
+
+    model_name = type(model).__name__
+    default_population = model.config.population
+    if population:
+        model.config.population = population
+    outcome = "error"
+    try:
+        with SIMULATION_SECONDS.time(model=model_name):
+            result = await model.resimulate_opinions(region, proposal, previous_proposal, previous_result)
+        outcome = "ok"
+    finally:
+        model.config.population = default_population
+        SIMULATIONS.inc(model=model_name, outcome=outcome)
+
+    response = result if isinstance(result, dict) and "summary" in result else {"summary": {}, "comments": result}
+    report = model.run_report.get("incremental")
+    if report:
+        INCREMENTAL_AGENTS.inc(report["reused"], model=model_name, result="reused")
+        INCREMENTAL_AGENTS.inc(report["resimulated"], model=model_name, result="resimulated")
+        SIMULATED_AGENTS.inc(report["resimulated"], model=model_name)
+    else:
+        SIMULATED_AGENTS.inc(len(response["comments"]), model=model_name)
+    return response
+
+
+async def stream_simulation(model: BaseModel,
+                            region: str,
+                            proposal: Dict[str, Any],
+                            population: int = 0) -> AsyncIterator[Dict[str, Any]]:
+    """Yield comment entries as the model produces them.
+
+    Models with the legacy `population` signature cannot stream, so their
+    entries are yielded after the whole simulation finishes. Closing the
+    generator (e.g. on client disconnect) stops the simulation at the next
+    agent boundary.
+    """
+    params = inspect.signature(model.simulate_opinions).parameters
+    if "population" in params:
+        result = await run_simulation(model, region, proposal, population)
+        comments = result["comments"]
+        # m01 keys its sample agents by index
+        for comment in (comments.values() if isinstance(comments, dict) else comments):
+            yield comment
+        return
+
+    model_name = type(model).__name__
+    default_population = model.config.population
+    if population:
+        model.config.population = population
+    outcome = "error"
+    try:
+        with SIMULATION_SECONDS.time(model=model_name):
+            async for comment in model.stream_opinions(region, proposal):
+                SIMULATED_AGENTS.inc(model=model_name)
+                yield comment
+        outcome = "ok"
+    except GeneratorExit:
+        outcome = "cancelled"
+        raise
+    finally:
+        model.config.population = default_population
+        SIMULATIONS.inc(model=model_name, outcome=outcome)
+
+
+def opinion_of(comment: Dict[str, Any]) -> Optional[str]:
+    """Support/oppose/neutral for a comment entry, mapping survey ratings 1-10."""
+    if "opinion" in comment:
+        return comment["opinion"]
+    ratings = list(comment.get("opinions", {}).values())
+    if not ratings:
+        return None
+    rating = ratings[0]
+    if rating <= 4:
+        return "oppose"
+    if rating <= 6:
+        return "neutral"
+    return "support"
@@ -0,0 +1,368 @@
+"""
+Map tiles for the proposal and opinion layers.
+
+Cells are served as Web Mercator `z/x/y` tiles (the scheme used by Mapbox GL)
+so the frontend only downloads what is visible. Each zoom range uses one grid
+resolution from the proposal pyramid (`models/grid.py`): coarse cells when
+zoomed out, the proposal's own cells when zoomed in.
+
+A `TileLayer` keeps a quadtree index (tile -> cell IDs) for every zoom in
+`[min_zoom, max_zoom]`, computed once, plus a lazily filled cache of tile
+payloads and their ETags. `update` diffs the new cells against the current
+ones and re-indexes and invalidates only the tiles touching changed cells,
+so a proposal delta or a new simulation result leaves every other tile, and
+its ETag, untouched. Tiles beyond `max_zoom` are cut from their ancestor.
+"""
+import copy
+import hashlib
+import json
+import math
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from models.grid import cell_bbox, grid_dimensions
+from models.proposal import Proposal, as_proposal
+from backend.simulation import opinion_of
+
+# First zoom level at which each cell size is used
+ZOOM_LEVELS = {0: 800, 12: 400, 13: 200, 14: 100}
+MIN_ZOOM = 10
+MAX_ZOOM = 16
+# Deepest zoom served (beyond Mapbox GL's maximum of 22)
+MAX_REQUEST_ZOOM = 24
+
+OPINIONS = ("support", "neutral", "oppose")
+
+TileKey = Tuple[int, int, int]
+
+
+def lng_to_tile_x(lng, zoom: int):
+    """Tile column(s) containing longitude(s) `lng` at `zoom`."""
+    n = 2 ** zoom
+    return np.clip(np.floor((np.asarray(lng) + 180.0) / 360.0 * n), 0, n - 1).astype(int)
+
+
+def lat_to_tile_y(lat, zoom: int):
+    """Tile row(s) containing latitude(s) `lat` at `zoom` (row 0 at the north)."""
+    n = 2 ** zoom
+    lat_rad = np.deg2rad(np.asarray(lat))
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / math.pi) / 2.0 * n
+    return np.clip(np.floor(y), 0, n - 1).astype(int)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Dict[str, float]:
+    """Geographic bounds of a tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return {"north": lat(y), "south": lat(y + 1), "west": x / n * 360.0 - 180.0, "east": (x + 1) / n * 360.0 - 180.0}
+
+
+def _intersects(bbox: Dict[str, float], bounds: Dict[str, float]) -> bool:
+    return (bbox["west"] < bounds["east"] and bbox["east"] > bounds["west"]
+            and bbox["south"] < bounds["north"] and bbox["north"] > bounds["south"])
+
+
+def _etag(payload: Dict[str, Any]) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return 'W/"' + hashlib.sha1(encoded.encode("utf-8")).hexdigest() + '"'
+
+
+class TileLayer:
+    """Quadtree tile index over per-resolution cell dicts (each cell has a `bbox`)."""
+
+    def __init__(self,
+                 levels: Dict[int, Dict[str, Dict[str, Any]]],
+                 zoom_levels: Dict[int, int] = None,
+                 min_zoom: int = MIN_ZOOM,
+                 max_zoom: int = MAX_ZOOM):
+        """
+        Args:
+            levels: Cell size -> cells at that resolution, for every size in `zoom_levels`
+            zoom_levels: First zoom -> cell size used from that zoom on
+            min_zoom: Coarsest indexed zoom; lower zooms merge its tiles
+            max_zoom: Finest indexed zoom; higher zooms are cut from it
+        """
+        self.zoom_levels = dict(sorted((zoom_levels or ZOOM_LEVELS).items()))
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.levels: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        self._index: Dict[int, Dict[Tuple[int, int], Set[str]]] = {
+            z: {} for z in range(min_zoom, max_zoom + 1)
+        }
+        self._tiles: Dict[TileKey, Tuple[str, Dict[str, Any]]] = {}
+        self.update(levels)
+
+    def cell_size(self, z: int) -> int:
+        """Cell size served at zoom `z`."""
+        size = None
+        for first_zoom, cell_size in self.zoom_levels.items():
+            if z >= first_zoom:
+                size = cell_size
+        return size if size is not None else next(iter(self.zoom_levels.values()))
+
+    def _zooms(self, cell_size: int) -> List[int]:
+        return [z for z in self._index if self.cell_size(z) == cell_size]
+
+    @staticmethod
+    def _tile_ranges(cells: List[Dict[str, Any]], z: int) -> np.ndarray:
+        """(N, 4) array of x0, x1, y0, y1 tile ranges covered by each cell's bbox."""
+        if not cells:
+            return np.empty((0, 4), dtype=int)
+        bboxes = np.array([[c["bbox"]["west"], c["bbox"]["east"], c["bbox"]["north"], c["bbox"]["south"]]
+                           for c in cells])
+        return np.column_stack([
+            lng_to_tile_x(bboxes[:, 0], z), lng_to_tile_x(bboxes[:, 1], z),
+            lat_to_tile_y(bboxes[:, 2], z), lat_to_tile_y(bboxes[:, 3], z)
+        ])
+
+    def _place(self, z: int, cell_ids: List[str], cells: List[Dict[str, Any]], add: bool) -> Set[TileKey]:
+        """Add or remove cells from the index at zoom `z`; returns the tiles touched."""
+        index = self._index[z]
+        touched = set()
+        for cell_id, (x0, x1, y0, y1) in zip(cell_ids, self._tile_ranges(cells, z)):
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    touched.add((z, x, y))
+                    if add:
+                        index.setdefault((x, y), set()).add(cell_id)
+                    else:
+                        tile = index.get((x, y))
+                        if tile is not None:
+                            tile.discard(cell_id)
+                            if not tile:
+                                del index[(x, y)]
+        return touched
+
+    def update(self, levels: Dict[int, Dict[str, Dict[str, Any]]]) -> int:
+        """Replace the cells of each given level, re-indexing only changed cells.
+
+        Returns:
+            Number of cached tiles invalidated
+        """
+        touched: Set[TileKey] = set()
+        for cell_size, cells in levels.items():
+            old_cells = self.levels.get(cell_size, {})
+            changed = [cell_id for cell_id in old_cells.keys() | cells.keys()
+                       if old_cells.get(cell_id) != cells.get(cell_id)]
+            removed = [cell_id for cell_id in changed if cell_id in old_cells]
+            added = [cell_id for cell_id in changed if cell_id in cells]
+            for z in self._zooms(cell_size):
+                touched |= self._place(z, removed, [old_cells[i] for i in removed], add=False)
+                touched |= self._place(z, added, [cells[i] for i in added], add=True)
+            self.levels[cell_size] = cells
+
+        # Tiles outside the indexed zooms depend on their indexed ancestor/descendants
+        invalidated = 0
+        for key in list(self._tiles):
+            if key in touched or self._derived_from(key, touched):
+                del self._tiles[key]
+                invalidated += 1
+        return invalidated
+
+    def _derived_from(self, key: TileKey, touched: Set[TileKey]) -> bool:
+        z, x, y = key
+        if z > self.max_zoom:
+            shift = z - self.max_zoom
+            return (self.max_zoom, x >> shift, y >> shift) in touched
+        if z < self.min_zoom:
+            shift = self.min_zoom - z
+            return any(tz == self.min_zoom and tx >> shift == x and ty >> shift == y for tz, tx, ty in touched)
+        return False
+
+    def copy(self) -> "TileLayer":
+        """Independent copy sharing cell dicts and cached tile payloads (both treated as immutable)."""
+        layer = copy.copy(self)
+        layer.levels = dict(self.levels)
+        layer._index = {z: {key: set(ids) for key, ids in tiles.items()} for z, tiles in self._index.items()}
+        layer._tiles = dict(self._tiles)
+        return layer
+
+    def _tile_cells(self, z: int, x: int, y: int) -> Iterable[str]:
+        if z > self.max_zoom:
+            shift = z - self.max_zoom
+            cells = self.levels[self.cell_size(self.max_zoom)]
+            bounds = tile_bounds(z, x, y)
+            parent = self._index[self.max_zoom].get((x >> shift, y >> shift), ())
+            return [cell_id for cell_id in parent if _intersects(cells[cell_id]["bbox"], bounds)]
+        if z < self.min_zoom:
+            shift = self.min_zoom - z
+            ids = set()
+            for (tx, ty), tile in self._index[self.min_zoom].items():
+                if tx >> shift == x and ty >> shift == y:
+                    ids |= tile
+            return ids
+        return self._index[z].get((x, y), ())
+
+    def tile(self, z: int, x: int, y: int) -> Tuple[str, Dict[str, Any]]:
+        """(ETag, payload) for a tile; empty tiles have no cells.
+
+        Raises:
+            ValueError: If the tile coordinates are out of range
+        """
+        n = 2 ** z
+        if not 0 <= z <= MAX_REQUEST_ZOOM or not (0 <= x < n and 0 <= y < n):
+            raise ValueError(f"Invalid tile {z}/{x}/{y}")
+        key = (z, x, y)
+        cached = self._tiles.get(key)
+        if cached is None:
+            cell_size = self.cell_size(min(max(z, self.min_zoom), self.max_zoom))
+            cells = self.levels.get(cell_size, {})
+            payload = {
+                "z": z, "x": x, "y": y,
+                "cellSize": cell_size,
+                "cells": {cell_id: cells[cell_id] for cell_id in sorted(self._tile_cells(z, x, y))}
+            }
+            cached = (_etag(payload), payload)
+            # Only tiles with cells are kept, so requests far off the map cannot grow the cache
+            if payload["cells"]:
+                self._tiles[key] = cached
+        return cached
+
+
+def proposal_levels(proposal: Proposal, cell_sizes: Iterable[int]) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    """Cells of `proposal` at each cell size; sizes it cannot be coarsened to use its own cells.
+
+    Cells without a bbox cannot be placed on the map and are left out.
+    """
+    levels = {}
+    for cell_size in cell_sizes:
+        try:
+            cells = proposal.at_resolution(max(cell_size, proposal.cell_size)).cells
+        except ValueError:
+            cells = proposal.cells
+        levels[cell_size] = {cell_id: cell for cell_id, cell in cells.items() if cell.get("bbox")}
+    return levels
+
+
+def opinion_levels(proposal: Proposal,
+                   comments: Iterable[Dict[str, Any]],
+                   cell_sizes: Iterable[int]) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    """Support/neutral/oppose counts per grid cell at each cell size.
+
+    Comments are placed by their `location`, or else by the centre of their
+    `cell_id` in the proposal; comments with neither are skipped.
+    """
+    lats, lngs, codes = [], [], []
+    cells = proposal.cells
+    for comment in comments:
+        opinion = opinion_of(comment)
+        if opinion not in OPINIONS:
+            continue
+        location = comment.get("location")
+        if isinstance(location, dict) and "lat" in location and "lng" in location:
+            lat, lng = location["lat"], location["lng"]
+        elif comment.get("cell_id") in cells and "bbox" in cells[comment["cell_id"]]:
+            bbox = cells[comment["cell_id"]]["bbox"]
+            lat, lng = (bbox["north"] + bbox["south"]) / 2, (bbox["east"] + bbox["west"]) / 2
+        else:
+            continue
+        lats.append(lat)
+        lngs.append(lng)
+        codes.append(OPINIONS.index(opinion))
+
+    bounds = proposal.bounds
+    levels = {}
+    for cell_size in cell_sizes:
+        levels_cells = {}
+        if bounds and lats:
+            width, height = grid_dimensions(bounds, max(cell_size, proposal.cell_size))
+            lat_array, lng_array = np.array(lats), np.array(lngs)
+            rows = np.floor((bounds["north"] - lat_array) / (bounds["north"] - bounds["south"]) * height).astype(int)
+            cols = np.floor((lng_array - bounds["west"]) / (bounds["east"] - bounds["west"]) * width).astype(int)
+            inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+            blocks = (rows * width + cols)[inside]
+            counts = np.bincount(blocks * len(OPINIONS) + np.array(codes)[inside],
+                                 minlength=width * height * len(OPINIONS)).reshape(-1, len(OPINIONS))
+            occupied = np.flatnonzero(counts.sum(axis=1))
+            block_rows, block_cols = np.divmod(occupied, width)
+            bboxes = cell_bbox(block_rows, block_cols, bounds, width, height)
+            for i, (block, row, col) in enumerate(zip(occupied, block_rows, block_cols)):
+                cell = {opinion: int(counts[block, j]) for j, opinion in enumerate(OPINIONS)}
+                cell["count"] = int(counts[block].sum())
+                cell["bbox"] = {side: float(values[i]) for side, values in bboxes.items()}
+                levels_cells[f"{row}_{col}"] = cell
+        levels[cell_size] = levels_cells
+    return levels
+
+
+class TileStore:
+    """Tile layers for registered proposals and their latest simulation results (LRU)."""
+
+    def __init__(self, max_layers: int = 64, zoom_levels: Dict[int, int] = None,
+                 min_zoom: int = MIN_ZOOM, max_zoom: int = MAX_ZOOM):
+        self.max_layers = max_layers
+        self.zoom_levels = zoom_levels or ZOOM_LEVELS
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._layers: "OrderedDict[tuple, TileLayer]" = OrderedDict()
+        self._bases: Dict[str, str] = {}
+
+    def _new_layer(self, levels) -> TileLayer:
+        return TileLayer(levels, self.zoom_levels, self.min_zoom, self.max_zoom)
+
+    def _store(self, key: tuple, layer: TileLayer) -> TileLayer:
+        self._layers[key] = layer
+        self._layers.move_to_end(key)
+        while len(self._layers) > self.max_layers:
+            self._layers.popitem(last=False)
+        return layer
+
+    def _get(self, key: tuple) -> Optional[TileLayer]:
+        layer = self._layers.get(key)
+        if layer is not None:
+            self._layers.move_to_end(key)
+        return layer
+
+    def link(self, proposal_hash: str, base_hash: str) -> None:
+        """Record that `proposal_hash` is a delta of `base_hash`, so its layers derive from the base's."""
+        if proposal_hash != base_hash:
+            self._bases[proposal_hash] = base_hash
+
+    def proposal_layer(self, proposal_hash: str, proposal: Dict[str, Any]) -> TileLayer:
+        """Tile layer of a proposal, built on first use (from its base's layer if linked)."""
+        key = ("proposal", proposal_hash)
+        layer = self._get(key)
+        if layer is None:
+            levels = proposal_levels(as_proposal(proposal), set(self.zoom_levels.values()))
+            base = self._get(("proposal", self._bases.get(proposal_hash)))
+            if base is not None:
+                layer = base.copy()
+                layer.update(levels)
+            else:
+                layer = self._new_layer(levels)
+            self._store(key, layer)
+        return layer
+
+    def record_result(self, proposal_hash: str, proposal: Dict[str, Any],
+                      model: str, result: Dict[str, Any]) -> TileLayer:
+        """Update the opinion layer of (proposal, model) with a new simulation result.
+
+        Only tiles whose per-cell counts changed are invalidated. A proposal's
+        first result starts from its base proposal's layer when linked.
+        """
+        comments = result.get("comments", [])
+        if isinstance(comments, dict):
+            comments = comments.values()
+        levels = opinion_levels(as_proposal(proposal), comments, set(self.zoom_levels.values()))
+        key = ("opinions", proposal_hash, model)
+        layer = self._get(key)
+        if layer is None:
+            base = self._get(("opinions", self._bases.get(proposal_hash), model))
+            layer = base.copy() if base is not None else None
+        if layer is None:
+            layer = self._new_layer(levels)
+        else:
+            layer.update(levels)
+        return self._store(key, layer)
+
+    def opinion_layer(self, proposal_hash: str, model: str) -> Optional[TileLayer]:
+        """Opinion layer of (proposal, model), or None if no result was recorded."""
+        return self._get(("opinions", proposal_hash, model))
+
+    def stats(self) -> Dict[str, int]:
+        return {"layers": len(self._layers)}
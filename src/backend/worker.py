@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Standalone job worker.
+
+Processes jobs submitted through the API's `/jobs` endpoints without running
+them inside the server process. Point it at the same database as the server:
+
+    python src/backend/worker.py --db jobs.sqlite3 --concurrency 4
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from backend.jobs import JobStore, JobRunner
+from backend.main import AVAILABLE_MODELS, MODEL_CONFIGS, JOB_DB
+from backend.model_pool import ModelPool
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run background simulation jobs")
+    parser.add_argument("--db", type=str, default=JOB_DB, help="Job database file")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs processed at once")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between queue polls when idle")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    model_pool = ModelPool(AVAILABLE_MODELS, MODEL_CONFIGS, size=args.concurrency)
+    await model_pool.start()
+    runner = JobRunner(JobStore(args.db), model_pool,
+                       concurrency=args.concurrency, poll_interval=args.poll_interval)
+    await runner.run_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,122 @@
+"""
+Synthetic fixtures for the benchmark suite.
+
+All fixtures are deterministic for a given size and seed and follow the
+formats of the real data under `eval/data/` and `models/*/census_data/`.
+"""
+import math
+import random
+from typing import Dict, Any, List
+
+# San Francisco bounds used by the real proposals
+SF_BOUNDS = {
+    "north": 37.8120,
+    "south": 37.7080,
+    "east": -122.3549,
+    "west": -122.5157
+}
+
+HEIGHT_OPTIONS = [40, 65, 80, 85, 105, 130, 140, 240, 300]
+CATEGORIES = ["mixed_use", "residential", "commercial"]
+REASON_CODES = list("ABCDEFGHIJKL")
+SCENARIO_IDS = ["1.1", "1.2", "1.3", "2.1", "2.2", "2.3", "3.1", "3.2", "3.3"]
+
+
+def make_proposal(num_cells: int, seed: int = 0) -> Dict[str, Any]:
+    """Build a proposal with `num_cells` cells on a square grid over SF."""
+    rng = random.Random(seed)
+    side = math.ceil(math.sqrt(num_cells))
+    lat_step = (SF_BOUNDS["north"] - SF_BOUNDS["south"]) / side
+    lng_step = (SF_BOUNDS["east"] - SF_BOUNDS["west"]) / side
+
+    cells = {}
+    for index in range(num_cells):
+        row, col = divmod(index, side)
+        north = SF_BOUNDS["north"] - row * lat_step
+        west = SF_BOUNDS["west"] + col * lng_step
+        cells[f"{row}_{col}"] = {
+            "heightLimit": rng.choice(HEIGHT_OPTIONS),
+            "category": rng.choice(CATEGORIES),
+            "lastUpdated": "2025-02-13",
+            "bbox": {
+                "north": north,
+                "south": north - lat_step,
+                "east": west + lng_step,
+                "west": west
+            }
+        }
+
+    return {
+        "gridConfig": {"cellSize": 100, "bounds": dict(SF_BOUNDS)},
+        "heightLimits": {"default": 0, "options": list(HEIGHT_OPTIONS)},
+        "cells": cells
+    }
+
+
+def make_locations(count: int, seed: int = 0) -> List[Dict[str, float]]:
+    """Random (lat, lng) points inside SF."""
+    rng = random.Random(seed)
+    return [
+        {
+            "lat": rng.uniform(SF_BOUNDS["south"], SF_BOUNDS["north"]),
+            "lng": rng.uniform(SF_BOUNDS["west"], SF_BOUNDS["east"])
+        }
+        for _ in range(count)
+    ]
+
+
+def make_survey_responses(num_participants: int, seed: int = 0) -> Dict[str, Any]:
+    """Census-style outputs / survey ground truth for all nine scenarios."""
+    rng = random.Random(seed)
+    responses = {}
+    for i in range(num_participants):
+        responses[f"participant_{i:07d}"] = {
+            "opinions": {sid: rng.randint(1, 10) for sid in SCENARIO_IDS},
+            "reasons": {sid: rng.sample(REASON_CODES, rng.randint(1, 3)) for sid in SCENARIO_IDS}
+        }
+    return responses
+
+
+def make_comment_result(num_agents: int, seed: int = 0) -> Dict[str, Any]:
+    """A StupidAgentModel-style result with `num_agents` comments."""
+    rng = random.Random(seed)
+    opinions = ["support", "oppose", "neutral"]
+    comments = []
+    for i, location in enumerate(make_locations(num_agents, seed)):
+        comments.append({
+            "id": i + 1,
+            "agent": {
+                "age": rng.randint(18, 85),
+                "income_level": rng.choice(["low_income", "middle_income", "high_income"]),
+                "education_level": rng.choice(["high_school", "bachelor", "postgraduate"]),
+                "occupation": rng.choice(["student", "white_collar", "service", "retired"]),
+                "gender": rng.choice(["male", "female", "other"])
+            },
+            "location": location,
+            "cell_id": f"{rng.randint(0, 100)}_{rng.randint(0, 140)}",
+            "opinion": rng.choice(opinions),
+            "comment": "A short synthetic comment about the proposal."
+        })
+    summary = {opinion: sum(1 for c in comments if c["opinion"] == opinion) for opinion in opinions}
+    return {"summary": summary, "comments": comments, "key_themes": {"support": [], "oppose": []}}
+
+
+def make_census_tables(num_records: int, seed: int = 0) -> Dict[str, Dict[str, str]]:
+    """Raw Census API data ({zipcode: {variable: value}}) with about `num_records` values."""
+    rng = random.Random(seed)
+    variables_per_zip = 8
+    data = {}
+    for z in range(max(1, num_records // variables_per_zip)):
+        household_total = rng.randint(100, 20000)
+        commute_total = rng.randint(100, 40000)
+        data[f"{90000 + z}"] = {
+            "B11004_001E": str(household_total),
+            "B11004_004E": str(rng.randint(0, household_total)),
+            "B11004_010E": str(rng.randint(0, household_total)),
+            "B11004_016E": str(rng.randint(0, household_total)),
+            "B08006_001E": str(commute_total),
+            "B08006_008E": str(rng.randint(0, commute_total)),
+            "B08006_015E": str(rng.randint(0, commute_total)),
+            "B08006_034E": str(rng.randint(0, commute_total))
+        }
+    return data
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the CPU hot paths of models, runners and evaluators.
+
+Benchmarks run on synthetic fixtures (see `fixtures.py`) so no API access is
+needed. Results are written to JSON and compared against a stored baseline;
+any benchmark slower than `threshold` x its baseline is flagged as a regression.
+
+Usage:
+    python experiment/benchmarks/run_benchmarks.py                      # quick profile
+    python experiment/benchmarks/run_benchmarks.py --profile full       # 10^3..10^6 cells, 10^2..10^6 agents
+    python experiment/benchmarks/run_benchmarks.py --only nearest_cell
+    python experiment/benchmarks/run_benchmarks.py --save-baseline      # record a new baseline
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from experiment.benchmarks import fixtures
+
+BENCHMARK_DIR = Path(__file__).parent
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+
+# Problem sizes per profile: proposal cells and agent population
+PROFILES = {
+    "quick": {
+        "cells": [10**3, 10**4],
+        "agents": [10**2, 10**3, 10**4]
+    },
+    "full": {
+        "cells": [10**3, 10**4, 10**5, 10**6],
+        "agents": [10**2, 10**3, 10**4, 10**5, 10**6]
+    }
+}
+
+# Number of agent locations resolved per nearest-cell benchmark
+NEAREST_CELL_QUERIES = 100
+
+# Baseline timings below this are too noisy to flag
+NOISE_FLOOR_SECONDS = 0.001
+
+# Scratch space for fixture files; removed when the process exits
+_SCRATCH = tempfile.TemporaryDirectory(prefix="bench_")
+
+
+def bench_nearest_cell(num_cells: int) -> Callable[[], Any]:
+    from models.proposal import Proposal
+
+    proposal = Proposal.from_dict(fixtures.make_proposal(num_cells))
+    locations = fixtures.make_locations(NEAREST_CELL_QUERIES)
+
+    def run():
+        for location in locations:
+            proposal.nearest_cell(location["lat"], location["lng"])
+    return run
+
+
+def bench_load_proposal(num_cells: int) -> Callable[[], Any]:
+    from experiment.eval.utils.data_utils import create_zoning_proposal
+
+    path = Path(_SCRATCH.name) / f"proposal_{num_cells}.json"
+    with open(path, "w") as f:
+        json.dump(fixtures.make_proposal(num_cells), f, indent=4)
+
+    def run():
+        with open(path) as f:
+            create_zoning_proposal(json.load(f))
+    return run
+
+
+def bench_proposal_description(num_cells: int) -> Callable[[], Any]:
+    from models.base import ModelConfig
+    from models.m03_census.model import Census
+    from models.proposal import Proposal
+
+    model = Census(ModelConfig(llm={"backend": "synthetic"}))
+    proposal = fixtures.make_proposal(num_cells)
+
+    def run():
+        # Fresh proposal each time so the cached description is rebuilt
+        model._create_proposal_description(Proposal.from_dict(proposal))
+    return run
+
+
+def bench_build_pyramid(num_cells: int) -> Callable[[], Any]:
+    from models.grid import build_pyramid
+
+    proposal = fixtures.make_proposal(num_cells)
+
+    def run():
+        build_pyramid(proposal)
+    return run
+
+
+def bench_agent_generation(num_agents: int) -> Callable[[], Any]:
+    from models.m02_stupid.components.agent_generator import AgentGenerator
+
+    generator = AgentGenerator()
+
+    def run():
+        generator.generate_agents(num_agents, fixtures.SF_BOUNDS)
+    return run
+
+
+def bench_compute_ratios(num_records: int) -> Callable[[], Any]:
+    from models.m03_census.census_data.data_processor import DataProcessor
+
+    processor = DataProcessor(fixtures.make_census_tables(num_records))
+
+    def run():
+        processor.compute_ratios()
+    return run
+
+
+def bench_opinion_score(num_agents: int) -> Callable[[], Any]:
+    from experiment.eval.evaluators.survey_evaluator import OpinionScoreEvaluator
+
+    predicted = fixtures.make_survey_responses(num_agents, seed=1)
+    ground_truth = fixtures.make_survey_responses(num_agents, seed=2)
+    evaluator = OpinionScoreEvaluator()
+
+    def run():
+        evaluator.evaluate(predicted, ground_truth)
+    return run
+
+
+def bench_reason_match(num_agents: int) -> Callable[[], Any]:
+    from experiment.eval.evaluators.survey_evaluator import ReasonMatchEvaluator
+
+    predicted = fixtures.make_survey_responses(num_agents, seed=1)
+    ground_truth = fixtures.make_survey_responses(num_agents, seed=2)
+    evaluator = ReasonMatchEvaluator()
+
+    def run():
+        evaluator.evaluate(predicted, ground_truth)
+    return run
+
+
+def bench_save_experiment_result(num_agents: int) -> Callable[[], Any]:
+    from experiment.eval.utils.data_utils import DataManager
+
+    data_manager = DataManager(base_dir=_SCRATCH.name)
+    exp_dir, _ = data_manager.create_experiment(f"bench_{num_agents}", "stupid")
+    proposal = fixtures.make_proposal(10**3)
+    result = fixtures.make_comment_result(num_agents)
+
+    def run():
+        data_manager.save_experiment_result(exp_dir, proposal, result, "proposal_000", "stupid")
+    return run
+
+
+# name -> (size axis, setup function returning the timed callable)
+BENCHMARKS = {
+    "nearest_cell": ("cells", bench_nearest_cell),
+    "load_proposal": ("cells", bench_load_proposal),
+    "proposal_description": ("cells", bench_proposal_description),
+    "build_pyramid": ("cells", bench_build_pyramid),
+    "agent_generation": ("agents", bench_agent_generation),
+    "compute_ratios": ("agents", bench_compute_ratios),
+    "opinion_score": ("agents", bench_opinion_score),
+    "reason_match": ("agents", bench_reason_match),
+    "save_experiment_result": ("agents", bench_save_experiment_result)
+}
+
+
+def time_callable(run: Callable[[], Any], min_repeats: int = 3, max_seconds: float = 2.0) -> Dict[str, Any]:
+    """Time `run` at least `min_repeats` times (or once if a single run exceeds `max_seconds`)."""
+    timings = []
+    started = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        if len(timings) >= min_repeats and elapsed >= max_seconds / 4:
+            break
+        if elapsed >= max_seconds:
+            break
+    return {
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "repeats": len(timings)
+    }
+
+
+def run_benchmarks(profile: str, only: List[str] = None) -> Dict[str, Any]:
+    """Run the selected benchmarks for every size in the profile."""
+    results = {}
+    for name, (axis, setup) in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        for size in PROFILES[profile][axis]:
+            key = f"{name}[{axis}={size}]"
+            run = setup(size)
+            results[key] = time_callable(run)
+            print(f"{key:45s} {results[key]['min_seconds'] * 1000:12.3f} ms")
+    return results
+
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """Return benchmarks whose best time exceeds `threshold` x the baseline's."""
+    regressions = {}
+    for key, current in results.items():
+        reference = baseline.get(key)
+        if not reference or reference["min_seconds"] < NOISE_FLOOR_SECONDS:
+            continue
+        ratio = current["min_seconds"] / reference["min_seconds"]
+        if ratio > threshold:
+            regressions[key] = {
+                "baseline_seconds": reference["min_seconds"],
+                "current_seconds": current["min_seconds"],
+                "ratio": ratio
+            }
+    return regressions
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run CPU hot-path microbenchmarks")
+    parser.add_argument("--profile", choices=list(PROFILES), default="quick", help="Problem sizes to run")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--output", type=str, help="Results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=str, default=str(DEFAULT_BASELINE), help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio flagged as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run_benchmarks(args.profile, args.only)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "profile": args.profile,
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+
+    baseline_path = Path(args.baseline)
+    regressions = {}
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        report["regressions"] = regressions
+        for key, info in regressions.items():
+            print(f"REGRESSION {key}: {info['ratio']:.2f}x slower than baseline")
+
+    output_path = Path(args.output) if args.output else \
+        BENCHMARK_DIR / "results" / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output_path}")
+
+    if args.save_baseline:
+        if baseline_path.exists():
+            # Keep entries for benchmarks/sizes not run this time
+            with open(baseline_path) as f:
+                merged = json.load(f)
+            merged["results"].update(results)
+            merged["meta"] = report["meta"]
+            report = merged
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
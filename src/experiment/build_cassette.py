@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Build replay cassettes from existing experiment runs.
+
+A cassette maps prompts to LLM responses so models can be re-run offline with
+`llm: {backend: replay, cassette: ...}` in the protocol's `model_config`.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import List
+
+import yaml
+
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.base import ModelConfig
+from models.llm_backends import Cassette
+from models.registry import get_model_class
+from experiment.run_experiment import get_project_root
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Build a replay cassette from experiment logs")
+    parser.add_argument(
+        "--experiment-dir",
+        type=str,
+        nargs="+",
+        required=True,
+        help="One or more experiment directories under log/"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Path of the cassette (.jsonl) to write; existing entries are kept"
+    )
+    return parser.parse_args()
+
+
+def resolve_data_path(path: str) -> str:
+    """Resolve a model data path relative to the project root, src/ or the CWD."""
+    project_root = get_project_root()
+    for candidate in [Path(path), project_root / path, project_root / "src" / path]:
+        if candidate.exists():
+            return str(candidate)
+    return path
+
+
+def build_cassette(experiment_dirs: List[Path], cassette_path: str) -> int:
+    """Append the exchanges recorded in each experiment directory to a cassette.
+
+    Returns:
+        Number of exchanges written
+    """
+    cassette = Cassette(cassette_path)
+    written = 0
+
+    for exp_dir in experiment_dirs:
+        with open(exp_dir / "protocol.yaml") as f:
+            protocol = yaml.safe_load(f)
+
+        model_class = get_model_class(protocol["model"])
+        if not hasattr(model_class, "recorded_exchanges"):
+            print(f"Skipping {exp_dir.name}: model '{protocol['model']}' outputs cannot be replayed")
+            continue
+
+        # Prompts are rebuilt by the model itself; no live backend is needed
+        model_config = dict(protocol.get("model_config", {}))
+        if "agent_data_file" in model_config:
+            model_config["agent_data_file"] = resolve_data_path(model_config["agent_data_file"])
+        model_config["llm"] = {"backend": "synthetic"}
+        model = model_class(ModelConfig(population=protocol["population"], **model_config))
+        region = protocol.get("region", "san_francisco")
+
+        for input_file in sorted(exp_dir.glob("*_input.json")):
+            output_file = input_file.with_name(input_file.name.replace("_input.json", "_output.json"))
+            if not output_file.exists():
+                continue
+            with open(input_file) as f:
+                proposal = json.load(f)
+            with open(output_file) as f:
+                output = json.load(f)
+
+            exchanges = model.recorded_exchanges(proposal, output, region)
+            for prompt, response in exchanges:
+                cassette.append(prompt, response)
+            written += len(exchanges)
+            print(f"{exp_dir.name}/{input_file.name}: {len(exchanges)} exchanges")
+
+    return written
+
+
+def main():
+    args = parse_args()
+    written = build_cassette([Path(d) for d in args.experiment_dir], args.output)
+    print(f"Wrote {written} exchanges to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Measure the fidelity of a cheap census run against a full reference run.
+
+Compares every `proposal_XXX_output.json` of a candidate experiment (e.g. one
+using archetypes) with the same proposal in a reference experiment that
+simulated every agent, and reports how far the ratings, opinion split and
+reasons drift (see `models.archetypes.fidelity_report`).
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.archetypes import fidelity_report
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Compare a census run against a full reference run")
+    parser.add_argument(
+        "--reference",
+        type=str,
+        required=True,
+        help="Experiment directory of the full run"
+    )
+    parser.add_argument(
+        "--candidate",
+        type=str,
+        required=True,
+        help="Experiment directory of the run to assess"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="Where to write the report (default: fidelity_report.json in the candidate directory)"
+    )
+    return parser.parse_args()
+
+
+def compare_runs(reference_dir: Path, candidate_dir: Path) -> Dict[str, Any]:
+    """Fidelity per proposal plus the mean of each measure over proposals."""
+    proposals = {}
+    for output_file in sorted(candidate_dir.glob("proposal_*_output.json")):
+        reference_file = reference_dir / output_file.name
+        if not reference_file.exists():
+            print(f"Skipping {output_file.name}: not in the reference run")
+            continue
+        with open(output_file) as f:
+            candidate = json.load(f)
+        with open(reference_file) as f:
+            reference = json.load(f)
+        proposals[output_file.name.replace("_output.json", "")] = fidelity_report(candidate, reference)
+
+    measures = sorted({key for report in proposals.values() for key in report if key != "compared"})
+    overall = {
+        measure: sum(report[measure] for report in proposals.values() if measure in report)
+        / max(sum(1 for report in proposals.values() if measure in report), 1)
+        for measure in measures
+    }
+    return {"reference": str(reference_dir), "candidate": str(candidate_dir),
+            "overall": overall, "proposals": proposals}
+
+
+def main():
+    args = parse_args()
+    candidate_dir = Path(args.candidate)
+    report = compare_runs(Path(args.reference), candidate_dir)
+    output = Path(args.output) if args.output else candidate_dir / "fidelity_report.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    for measure, value in report["overall"].items():
+        print(f"{measure}: {value:.3f}")
+    print(f"Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
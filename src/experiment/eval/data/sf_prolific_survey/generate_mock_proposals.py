@@ -1,85 +1,67 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""
+Generate the nine survey scenarios (1.1 - 3.3) as a sweep over the raw
+upzoning proposal: three height bands of cells to keep x three target heights.
 
+Writes `processed/mock_sweep.json`, a few KB of deltas referencing the raw
+proposal, which `run_experiment.py` accepts through `input.sweep`. Pass
+`--materialize` to also write the full `processed/mock_proposals/{id}.json`
+files.
+"""
+import argparse
 import json
 import os
-import copy
-import shutil
+import sys
+from pathlib import Path
 
-# Define the paths
-RAW_FILE_PATH = './raw/raw_upzoning_proposal.json'
-OUTPUT_DIR = './processed/mock_proposals'
+sys.path.append(str(Path(__file__).resolve().parents[4]))
 
-# Create output directory if it doesn't exist
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
+from experiment.eval.utils.sweep_utils import generate_sweep, save_sweep, iter_sweep
+from models.proposal import Proposal
 
-# Load the raw upzoning proposal
-with open(RAW_FILE_PATH, 'r') as f:
-    raw_proposal = json.load(f)
+# Define the paths
+BASE_DIR = Path(__file__).resolve().parent
+RAW_FILE_PATH = BASE_DIR / 'raw' / 'raw_upzoning_proposal.json'
+SWEEP_FILE_PATH = BASE_DIR / 'processed' / 'mock_sweep.json'
+OUTPUT_DIR = BASE_DIR / 'processed' / 'mock_proposals'
 
-# Define the patterns and their corresponding height limits
-patterns = {
-    '1': {'range': (65, 300), 'variants': {'1': 80, '2': 140, '3': 300}},
-    '2': {'range': (85, 300), 'variants': {'1': 80, '2': 140, '3': 300}},
-    '3': {'range': (240, 300), 'variants': {'1': 80, '2': 140, '3': 300}}
+# Scenario patterns: cells with height limits in the band are kept...
+BANDS = {
+    '1': (65, 300),
+    '2': (85, 300),
+    '3': (240, 300)
 }
+# ...and all set to the variant's height
+HEIGHTS = {'1': 80, '2': 140, '3': 300}
 
-# Create a mapping of cells to patterns
-pattern_cells = {
-    '1': [],  # Cells with height limits between 65 and 300
-    '2': [],  # Cells with height limits between 85 and 300
-    '3': []   # Cells with height limits between 240 and 300
-}
 
-# Classify cells into patterns based on height limits
-for cell_id, cell_data in raw_proposal['cells'].items():
-    height_limit = cell_data.get('heightLimit', 0)
-    
-    # Pattern 1: 65-300
-    if 65 <= height_limit <= 300:
-        pattern_cells['1'].append(cell_id)
-    
-    # Pattern 2: 85-300
-    if 85 <= height_limit <= 300:
-        pattern_cells['2'].append(cell_id)
-    
-    # Pattern 3: 240-300
-    if 240 <= height_limit <= 300:
-        pattern_cells['3'].append(cell_id)
+def main():
+    parser = argparse.ArgumentParser(description="Generate the mock survey scenario sweep")
+    parser.add_argument("--materialize", action="store_true",
+                        help="Also write every scenario as a full proposal file")
+    args = parser.parse_args()
+
+    # Load the raw upzoning proposal
+    with open(RAW_FILE_PATH, 'r') as f:
+        raw_proposal = Proposal.from_dict(json.load(f))
+
+    sweep = generate_sweep(raw_proposal, BANDS, HEIGHTS,
+                           base_path=os.path.relpath(RAW_FILE_PATH, SWEEP_FILE_PATH.parent))
+    save_sweep(sweep, SWEEP_FILE_PATH)
+    for scenario_id, delta in sweep['scenarios'].items():
+        print(f"Scenario {scenario_id}: {delta['kept_cells']} cells, all set to height "
+              f"{delta['set_cells']['heightLimit']}")
+    print(f"Sweep written to {SWEEP_FILE_PATH}")
 
-# Generate the 9 mock proposals
-for pattern_id, cells in pattern_cells.items():
-    for variant_id, new_height in patterns[pattern_id]['variants'].items():
-        # Create a copy of the raw proposal
-        mock_proposal = copy.deepcopy(raw_proposal)
-        
-        # Create a new cells dictionary that only includes cells in the current pattern
-        new_cells = {}
-        
-        # Only keep cells that are in the current pattern and update their height limits
-        for cell_id in cells:
-            if cell_id in mock_proposal['cells']:
-                new_cells[cell_id] = mock_proposal['cells'][cell_id]
-                new_cells[cell_id]['heightLimit'] = new_height
-        
-        # Replace the original cells dictionary with the filtered one
-        mock_proposal['cells'] = new_cells
-        
-        # Save the mock proposal to a JSON file with the format "pattern.variant.json"
-        filename = f"{pattern_id}.{variant_id}.json"
-        output_file = os.path.join(OUTPUT_DIR, filename)
-        with open(output_file, 'w') as f:
-            json.dump(mock_proposal, f, indent=4)
-        
-        # Print status
-        print(f"Generated mock proposal {filename} with {len(cells)} cells, all set to height {new_height}")
+    if args.materialize:
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        for scenario_id, proposal in iter_sweep(raw_proposal, sweep['scenarios']):
+            output_file = OUTPUT_DIR / f"{scenario_id}.json"
+            with open(output_file, 'w') as f:
+                json.dump(proposal, f, indent=4)
+            print(f"Generated mock proposal {output_file.name}")
 
-# Clean up any existing subdirectories
-for item in os.listdir(OUTPUT_DIR):
-    item_path = os.path.join(OUTPUT_DIR, item)
-    if os.path.isdir(item_path):
-        shutil.rmtree(item_path)
-        print(f"Removed directory: {item_path}")
 
-print("All mock proposals generated successfully!") 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
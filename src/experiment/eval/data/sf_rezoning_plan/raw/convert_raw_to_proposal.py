@@ -1,32 +1,29 @@
 import json
 import geopandas as gpd
 from datetime import datetime
-import numpy as np
 import os
+import sys
+from pathlib import Path
 from shapely.geometry import box
 from tqdm import tqdm
 import multiprocessing as mp
 from functools import partial
 
+sys.path.append(str(Path(__file__).resolve().parents[5]))
+
+from models.grid import build_pyramid, cell_bbox, grid_dimensions
+
+# Finest grid is rasterized from the geometry; coarser levels are aggregated from it
+CELL_SIZE_METERS = 100
+PYRAMID_FACTORS = (2, 4, 8)  # 200m, 400m, 800m
+
 def get_cell_bbox(row, col, bounds, grid_width, grid_height):
     """Get the bounding box for a grid cell.
     
     Note: row 0 starts from the top (north)
     """
-    # Calculate cell boundaries using the same logic as frontend
-    west = bounds["west"] + (col / grid_width) * (bounds["east"] - bounds["west"])
-    east = bounds["west"] + ((col + 1) / grid_width) * (bounds["east"] - bounds["west"])
-    
-    # Match frontend's south-north calculation
-    south = bounds["south"] + ((grid_height - row - 1) / grid_height) * (bounds["north"] - bounds["south"])
-    north = bounds["south"] + ((grid_height - row) / grid_height) * (bounds["north"] - bounds["south"])
-    
-    return {
-        "north": north,
-        "south": south,
-        "east": east,
-        "west": west
-    }
+    # Same logic as the frontend (see models/grid.py)
+    return cell_bbox(row, col, bounds, grid_width, grid_height)
 
 def process_cell(args, zoning_data):
     """Process a single grid cell. Find the largest intersecting polygon and use its height."""
@@ -64,7 +61,7 @@ def main():
     # Set file paths
     current_dir = os.path.dirname(os.path.abspath(__file__))
     input_file = os.path.join(current_dir, "sf_zoning_2024.geojson")
-    output_file = os.path.join(current_dir, "sf_proposal_2024.json")
+    output_pattern = os.path.join(current_dir, "sf_proposal_2024_{cell_size}m.json")
 
     # Read 2024 zoning data
     print("Reading zoning data...")
@@ -76,7 +73,7 @@ def main():
     print(f"Found height options: {height_options}")
     
     # Define grid
-    cell_size_meters = 100  # Cell size in meters
+    cell_size_meters = CELL_SIZE_METERS  # Cell size in meters
     bounds = {
         "north": 37.8120,
         "south": 37.7080,
@@ -85,14 +82,7 @@ def main():
     }
     
     # Calculate grid dimensions using the same logic as frontend
-    avg_lat = (bounds["north"] + bounds["south"]) / 2
-    # Convert degrees to meters
-    width = (bounds["east"] - bounds["west"]) * 111319.9 * np.cos(np.deg2rad(avg_lat))
-    height = (bounds["north"] - bounds["south"]) * 111319.9
-    
-    # Calculate grid dimensions
-    grid_width = int(np.floor(width / cell_size_meters))
-    grid_height = int(np.floor(height / cell_size_meters))
+    grid_width, grid_height = grid_dimensions(bounds, cell_size_meters)
     
     print(f"Grid dimensions: {grid_width}x{grid_height} cells")
     
@@ -130,8 +120,9 @@ def main():
             desc="Processing cells"
         ))
     
-    # Create cells from results
+    # Create cells from results, keeping the covered area to weight the aggregation
     print("Creating final proposal...")
+    areas = []
     for result in tqdm(results, desc="Creating cells"):
         if result is not None:
             (row, col), cell_info = result
@@ -142,14 +133,22 @@ def main():
                 "lastUpdated": datetime.now().strftime("%Y-%m-%d"),
                 "bbox": cell_info["bbox"]
             }
+            areas.append(cell_info["area"])
+    
+    # Derive the coarser levels from this single rasterization: each coarse
+    # cell takes the height covering the largest area of its fine cells
+    print("Aggregating coarser levels...")
+    pyramid = build_pyramid(proposal, PYRAMID_FACTORS, weights=areas)
     
     # Save results
     print("Saving results...")
-    with open(output_file, "w") as f:
-        json.dump(proposal, f, indent=4)
+    for cell_size, level in pyramid.items():
+        output_file = output_pattern.format(cell_size=cell_size)
+        with open(output_file, "w") as f:
+            json.dump(level, f, indent=4)
+        print(f"{cell_size}m: {len(level['cells'])} cells saved to {output_file}")
     
-    print(f"Conversion complete! Created {len(proposal['cells'])} cells")
-    print(f"Output saved to: {output_file}")
+    print(f"Conversion complete! Created {len(proposal['cells'])} cells at {cell_size_meters}m")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
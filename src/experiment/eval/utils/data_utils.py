@@ -5,14 +5,19 @@ Contains basic data structures and management functions.
 from pathlib import Path
 from typing import Dict, Any, Tuple
 import json
+import logging
 from datetime import datetime
 import os
 import shutil
 
+from models.proposal import Proposal
+
+logger = logging.getLogger(__name__)
+
 # Simple dictionary-based data structures instead of Pydantic models
-def create_zoning_proposal(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Create a zoning proposal from raw data without validation"""
-    return data
+def create_zoning_proposal(data: Dict[str, Any]) -> Proposal:
+    """Create a schema-normalized zoning proposal from raw data without validation"""
+    return Proposal.from_dict(data)
 
 class DataManager:
     """Manages experiment data storage and retrieval."""
@@ -88,9 +93,8 @@ class DataManager:
         Returns:
             Tuple[Path, Path]: Paths to the saved input and output files
         """
-        # Debug information
-        print(f"DEBUG save_experiment_result: proposal_id={proposal_id}, model_name={model_name}")
-        print(f"DEBUG save_experiment_result: result type={type(result)}")
+        logger.debug("save_experiment_result: proposal_id=%s, model_name=%s, result type=%s",
+                     proposal_id, model_name, type(result).__name__)
         
         # Save input proposal
         input_path = exp_dir / f"{proposal_id}_input.json"
@@ -0,0 +1,89 @@
+"""
+Logging setup for experiment runs.
+
+Records are handed to a queue by the calling code and written by a
+background listener thread, so slow consoles or disks never block a
+simulation. Each run gets a JSON-lines log in its experiment directory.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, keeping `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: str = "INFO",
+                  log_file: Optional[Path] = None,
+                  buffer_size: int = 256) -> logging.handlers.QueueListener:
+    """Route all logging through a non-blocking queue.
+
+    Args:
+        level: Log level name, typically the protocol's `output.log_level`
+        log_file: Optional JSON-lines file receiving every record at `level`
+        buffer_size: Number of records buffered before the file is written
+            (errors are always written immediately)
+
+    Returns:
+        The running listener; pass it to `shutdown_logging` when done
+    """
+    numeric_level = logging.getLevelName(str(level).upper())
+    if not isinstance(numeric_level, int):
+        raise ValueError(f"Unknown log level: {level}")
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(message)s"))
+    handlers = [console]
+
+    if log_file is not None:
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(logging.handlers.MemoryHandler(
+            capacity=buffer_size,
+            flushLevel=logging.ERROR,
+            target=file_handler
+        ))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(numeric_level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def shutdown_logging(listener: logging.handlers.QueueListener) -> None:
+    """Drain the queue and flush and close every handler."""
+    listener.stop()
+    for handler in listener.handlers:
+        target = getattr(handler, "target", None)
+        handler.flush()
+        handler.close()
+        if target is not None:
+            target.close()
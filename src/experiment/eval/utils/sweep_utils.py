@@ -0,0 +1,112 @@
+"""
+Parametric proposal sweeps.
+
+A sweep describes many scenarios as compact deltas against one base proposal
+(see `models/proposal.py` for the delta format) instead of full proposal
+files. Each scenario keeps the base cells inside a height band and sets them
+to a target height, so a sweep over bands x heights is a few hundred bytes per
+scenario no matter how large the base proposal is.
+
+Sweep file format:
+
+```json
+{
+    "base": "../raw/raw_upzoning_proposal.json",
+    "base_hash": "<content hash of the base proposal>",
+    "scenarios": {
+        "1.1": {"base": "<hash>", "keep_heights": [65, 300], "set_cells": {"heightLimit": 80}, "kept_cells": 1412},
+        ...
+    }
+}
+```
+
+`base` is resolved relative to the sweep file. Scenario order is preserved, so
+the i-th scenario becomes `proposal_{i:03d}` in `run_experiment.py`.
+"""
+from pathlib import Path
+from typing import Dict, Any, Iterator, Tuple, Union
+import json
+
+import numpy as np
+
+from models.proposal import Proposal, apply_delta, as_proposal
+
+
+def generate_sweep(base: Dict[str, Any],
+                   bands: Dict[str, Tuple[float, float]],
+                   heights: Dict[str, float],
+                   base_path: str = None) -> Dict[str, Any]:
+    """Build a sweep over every (height band, target height) pair.
+
+    Scenario IDs are `"{band}.{height}"` using the keys of `bands` and
+    `heights`, in the order given.
+
+    Args:
+        base: Base proposal
+        bands: Band ID -> inclusive (min, max) height limits of the cells to keep
+        heights: Height ID -> height limit assigned to the kept cells
+        base_path: Path of the base proposal recorded in the sweep (relative to
+            where the sweep file will be saved)
+
+    Returns:
+        Sweep dict; `"kept_cells"` per scenario reports how many cells it keeps
+    """
+    base = as_proposal(base)
+    base_hash = base.content_hash
+
+    # One vectorized comparison per band; the masks only feed the cell counts
+    masks = {band_id: base.height_mask(band) for band_id, band in bands.items()}
+
+    scenarios = {}
+    for band_id, band in bands.items():
+        kept = int(np.count_nonzero(masks[band_id]))
+        for height_id, height in heights.items():
+            scenarios[f"{band_id}.{height_id}"] = {
+                "base": base_hash,
+                "keep_heights": [band[0], band[1]],
+                "set_cells": {"heightLimit": height},
+                "kept_cells": kept
+            }
+
+    sweep = {"base_hash": base_hash, "scenarios": scenarios}
+    if base_path is not None:
+        sweep = {"base": str(base_path), **sweep}
+    return sweep
+
+
+def save_sweep(sweep: Dict[str, Any], path: Union[str, Path]) -> Path:
+    """Write a sweep file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(sweep, f, indent=2)
+    return path
+
+
+def load_sweep(path: Union[str, Path]) -> Tuple[Proposal, Dict[str, Dict[str, Any]]]:
+    """Load a sweep file and its base proposal.
+
+    Returns:
+        Tuple of (base proposal, scenario ID -> delta)
+
+    Raises:
+        ValueError: If the base proposal no longer matches the sweep's `base_hash`
+    """
+    path = Path(path)
+    with open(path) as f:
+        sweep = json.load(f)
+    if "base" not in sweep:
+        raise ValueError(f"Sweep {path} does not reference a base proposal")
+
+    with open(path.parent / sweep["base"]) as f:
+        base = Proposal.from_dict(json.load(f))
+    expected = sweep.get("base_hash")
+    if expected and base.content_hash != expected:
+        raise ValueError(f"Base proposal {sweep['base']} changed since sweep {path} was generated")
+    return base, sweep["scenarios"]
+
+
+def iter_sweep(base: Proposal, scenarios: Dict[str, Dict[str, Any]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (scenario ID, proposal) for each scenario, built on demand."""
+    for scenario_id, delta in scenarios.items():
+        yield scenario_id, apply_delta(base, delta)
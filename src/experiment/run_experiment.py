@@ -5,29 +5,25 @@ Main experiment runner for opinion simulation experiments.
 import asyncio
 import json
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Tuple
 import argparse
 from datetime import datetime
 import yaml
-import traceback
+import logging
 
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
 
 from models.base import BaseModel, ModelConfig
-from models.m01_basic.model import BasicSimulationModel
-from models.m02_stupid.model import StupidAgentModel
-from models.m03_census.model import Census
-from models.m04_census_twolayer.model import CensusTwoLayer
+from models.registry import get_model_class
+from models.metrics import metrics, SnapshotWriter, SIMULATIONS, SIMULATION_SECONDS, SIMULATED_AGENTS
+from models.tracing import tracer
+from models.proposal import apply_delta
 from experiment.eval.utils.data_utils import DataManager, create_zoning_proposal
-from experiment.eval.evaluators import evaluate_experiment_dir
+from experiment.eval.utils.sweep_utils import load_sweep
+from experiment.eval.utils.logging_utils import setup_logging, shutdown_logging
 
-AVAILABLE_MODELS = {
-    "basic": BasicSimulationModel,
-    "stupid": StupidAgentModel,
-    "census": Census,
-    "twolayer": CensusTwoLayer
-}
+logger = logging.getLogger(__name__)
 
 def get_project_root() -> Path:
     """Get the absolute path of the project root directory."""
@@ -76,123 +72,240 @@ async def run_experiment(protocol: dict, eval_only: bool = False, experiment_dir
         # Use existing experiment directory
         exp_dir = Path(experiment_dir)
         exp_id = exp_dir.name
-        print(f"\nRunning evaluation on existing experiment: {exp_id}")
     else:
         # Create new experiment directory
         exp_dir, exp_id = data_manager.create_experiment(protocol["name"], protocol["model"])
+    
+    # Log to the console and to a per-run JSON-lines file without blocking the run
+    log_level = protocol.get("output", {}).get("log_level", "INFO")
+    listener = setup_logging(log_level, exp_dir / "run_log.jsonl")
+    
+    try:
+        if eval_only and experiment_dir:
+            logger.info("Running evaluation on existing experiment: %s", exp_id)
+        else:
+            await run_simulations(protocol, data_manager, exp_dir, exp_id)
         
-        # Save protocol for reproducibility
-        with open(exp_dir / "protocol.yaml", "w") as f:
-            yaml.dump(protocol, f, default_flow_style=False)
-        
-        # Initialize model with model_config if specified in protocol
-        model_class = AVAILABLE_MODELS[protocol["model"]]
-        model_config = protocol.get("model_config", {})
-        config = ModelConfig(population=protocol["population"], **model_config)
-        print(f"Initializing model with config: {config.__dict__}")
-        model = model_class(config)
-        
-        # Run experiment
-        print(f"\nRunning experiment: {exp_id}")
-        print(f"Model: {protocol['model']}")
-        print(f"Population size: {protocol['population']}")
-        print(f"Number of proposals: {len(protocol['input']['proposals'])}")
-        
-        start_time = datetime.now()
+        # Run evaluation if specified in protocol
+        if "evaluation" in protocol and "evaluators" in protocol["evaluation"]:
+            run_evaluation(exp_dir, protocol)
+    finally:
+        shutdown_logging(listener)
+
+def proposal_sources(protocol: dict, data_manager: DataManager) -> List[Tuple[str, Callable[[], Dict[str, Any]]]]:
+    """List (label, loader) for every proposal in the protocol, in run order.
+
+    `input.proposals` lists proposal files; `input.sweep` names a sweep file
+    whose scenarios are built from deltas against one shared base proposal.
+    Both are relative to the data directory and may be combined (files first).
+    Loading is deferred so a bad file only fails its own proposal.
+    """
+    sources = []
+    for proposal_file in protocol["input"].get("proposals", []) or []:
+        def load_file(proposal_file=proposal_file):
+            input_file = data_manager.data_dir / proposal_file
+            logger.debug("Looking for proposal file at: %s", input_file)
+            if not input_file.exists():
+                raise FileNotFoundError(f"Proposal file not found: {input_file}")
+            with open(input_file) as f:
+                return create_zoning_proposal(json.load(f))
+        sources.append((proposal_file, load_file))
+
+    sweep_file = protocol["input"].get("sweep")
+    if sweep_file:
+        # The base proposal is loaded once; each scenario applies its delta on demand
+        base, scenarios = load_sweep(data_manager.data_dir / sweep_file)
+        for scenario_id, delta in scenarios.items():
+            def load_scenario(delta=delta):
+                return create_zoning_proposal(apply_delta(base, delta))
+            sources.append((f"{sweep_file}#{scenario_id}", load_scenario))
+    return sources
+
+def save_proposal_result(protocol: dict, data_manager: DataManager, exp_dir: Path,
+                         proposal: Dict[str, Any], proposal_id: str, result: Dict[str, Any]):
+    """Copy the ground truth (if any) and save one proposal's input and output."""
+    # Copy ground truth files if provided in protocol
+    if "evaluation" in protocol and "ground_truth" in protocol["evaluation"]:
+        gt_file = protocol["evaluation"]["ground_truth"]
+        if gt_file:
+            gt_dest = data_manager.copy_ground_truth(gt_file, exp_dir, proposal_id)
+            if gt_dest:
+                logger.info("Copied ground truth to %s", gt_dest)
+            else:
+                logger.warning("Ground truth file not found: %s", gt_file)
+    
+    # Save results
+    logger.debug("Saving results for %s", proposal_id)
+    try:
+        with tracer.span("save_results"):
+            input_path, output_path = data_manager.save_experiment_result(
+                exp_dir=exp_dir,
+                proposal=proposal,
+                result=result,
+                proposal_id=proposal_id,
+                model_name=protocol["model"]
+            )
+        logger.info("✓ Results saved for %s", proposal_id)
+        logger.info("  - Input: %s", input_path)
+        logger.info("  - Output: %s", output_path)
+    except Exception:
+        logger.exception("Error saving results for %s", proposal_id)
+
+async def run_multi_scenario(protocol: dict, data_manager: DataManager, exp_dir: Path, model: Any,
+                             sources: List[Tuple[str, Callable[[], Dict[str, Any]]]],
+                             run_reports: Dict[str, Any]):
+    """Simulate all proposals in one survey (`multi_scenario` models) and save them per proposal."""
+    model_name = type(model).__name__
+    proposals = {}
+    for i, (source, load_proposal) in enumerate(sources):
+        proposal_id = f"proposal_{i:03d}"
+        try:
+            with tracer.span("load_proposal"):
+                proposal = load_proposal()
+        except Exception:
+            logger.exception("Error loading %s (%s)", proposal_id, source)
+            continue
+        proposal["proposal_id"] = proposal_id
+        proposals[proposal_id] = proposal
+    
+    region = protocol.get("region", "san_francisco")
+    logger.info("Simulating %d proposals in one survey...", len(proposals))
+    outcome = "error"
+    try:
+        with tracer.span("simulate", proposal_id="all"), \
+                SIMULATION_SECONDS.time(model=model_name):
+            results = await model.simulate_scenarios(region=region, proposals=list(proposals.values()))
+        outcome = "ok"
+    except Exception:
+        logger.exception("Error simulating the survey")
+        return
+    finally:
+        SIMULATIONS.inc(model=model_name, outcome=outcome)
+    run_report = getattr(model, "run_report", None)
+    if run_report:
+        run_reports["all"] = dict(run_report)
+    
+    for proposal_id, proposal in proposals.items():
+        result = results.get(proposal_id, {})
+        SIMULATED_AGENTS.inc(len(result), model=model_name)
+        save_proposal_result(protocol, data_manager, exp_dir, proposal, proposal_id, result)
+
+async def run_simulations(protocol: dict, data_manager: DataManager, exp_dir: Path, exp_id: str):
+    """Simulate every proposal in the protocol and save the results to `exp_dir`."""
+    # Save protocol for reproducibility
+    with open(exp_dir / "protocol.yaml", "w") as f:
+        yaml.dump(protocol, f, default_flow_style=False)
+    
+    # Initialize model with model_config if specified in protocol
+    model_class = get_model_class(protocol["model"])
+    model_config = protocol.get("model_config", {})
+    config = ModelConfig(population=protocol["population"], **model_config)
+    logger.info("Initializing model with config: %s", config.__dict__)
+    model = model_class(config)
+    
+    # Run experiment
+    logger.info("Running experiment: %s", exp_id)
+    logger.info("Model: %s", protocol["model"])
+    logger.info("Population size: %s", protocol["population"])
+    sources = proposal_sources(protocol, data_manager)
+    logger.info("Number of proposals: %d", len(sources))
+    
+    # Enable per-stage tracing if requested by the protocol
+    trace_enabled = protocol.get("output", {}).get("trace", False)
+    if trace_enabled:
+        tracer.enable()
+    
+    # Periodically snapshot metrics to metrics.prom (0 disables)
+    metrics_interval = protocol.get("output", {}).get("metrics_interval", 15)
+    snapshot_writer = None
+    if metrics_interval:
+        snapshot_writer = SnapshotWriter(metrics, exp_dir / "metrics.prom", metrics_interval).start()
+    model_name = type(model).__name__
+    
+    start_time = datetime.now()
+    run_reports = {}
+    
+    try:
+        # Multi-scenario models answer every proposal in one survey per agent
+        if getattr(model, "multi_scenario", False):
+            await run_multi_scenario(protocol, data_manager, exp_dir, model, sources, run_reports)
+        else:
+            for i, (source, load_proposal) in enumerate(sources):
+                proposal_id = f"proposal_{i:03d}"
+                logger.info("Processing %s (%s)...", proposal_id, source, extra={"proposal_id": proposal_id})
         
-        for i, proposal_file in enumerate(protocol["input"]["proposals"]):
-            proposal_id = f"proposal_{i:03d}"
-            print(f"\nProcessing {proposal_id} ({proposal_file})...")
-            
-            try:
-                # Load proposal
-                input_file = data_manager.data_dir / proposal_file
-                print(f"DEBUG: Looking for proposal file at: {input_file}")
-                
-                if not input_file.exists():
-                    print(f"ERROR: Proposal file not found: {input_file}")
-                    raise FileNotFoundError(f"Proposal file not found: {input_file}")
-                
-                with open(input_file) as f:
-                    data = json.load(f)
-                    proposal = create_zoning_proposal(data)
-                
-                # Add proposal_id to the proposal for reference in the model
-                proposal["proposal_id"] = proposal_id
-                
-                print(f"DEBUG: Running simulation with proposal: {proposal_id}, region: {protocol.get('region', 'san_francisco')}")
-                
-                # Run simulation
-                result = await model.simulate_opinions(
-                    region=protocol.get("region", "san_francisco"),
-                    proposal=proposal
-                )
-                
-                print(f"DEBUG: Simulation completed. Result keys: {result.keys() if isinstance(result, dict) else 'Not a dict'}")
-                
-                # Copy ground truth files if provided in protocol
-                if "evaluation" in protocol and "ground_truth" in protocol["evaluation"]:
-                    gt_file = protocol["evaluation"]["ground_truth"]
-                    if gt_file:
-                        gt_dest = data_manager.copy_ground_truth(gt_file, exp_dir, proposal_id)
-                        if gt_dest:
-                            print(f"Copied ground truth to {gt_dest}")
-                        else:
-                            print(f"Warning: Ground truth file not found: {gt_file}")
-                
-                # Save results
-                print(f"DEBUG: Saving results for {proposal_id}")
                 try:
-                    result_paths = data_manager.save_experiment_result(
-                        exp_dir=exp_dir,
-                        proposal=proposal,
-                        result=result,
-                        proposal_id=proposal_id,
-                        model_name=protocol["model"]
-                    )
-                    
-                    # Handle different return types from save_experiment_result
-                    if isinstance(result_paths, tuple) and len(result_paths) == 2:
-                        input_path, output_path = result_paths
-                        print(f"✓ Results saved for {proposal_id}")
-                        print(f"  - Input: {input_path}")
-                        print(f"  - Output: {output_path}")
-                    else:
-                        print(f"✓ Results saved for {proposal_id}")
-                        print(f"  - Result paths: {result_paths}")
-                except Exception as save_error:
-                    print(f"Error saving results: {str(save_error)}")
-                    print(f"DEBUG: {traceback.format_exc()}")
-                
-            except Exception as e:
-                print(f"Error processing {proposal_id}: {str(e)}")
-                print(f"DEBUG: {traceback.format_exc()}")
-        
-        # Save experiment metadata
-        end_time = datetime.now()
-        metadata = protocol.copy()
-        metadata["runtime"] = {
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat(),
-            "duration_seconds": (end_time - start_time).total_seconds()
-        }
-        data_manager.save_metadata(exp_dir, metadata)
-        
-        print(f"\nExperiment completed: {exp_id}")
-        print(f"Duration: {(end_time - start_time).total_seconds():.2f} seconds")
-        print(f"Results saved in: {exp_dir}")
+                    # Load proposal
+                    with tracer.span("load_proposal"):
+                        proposal = load_proposal()
+            
+                    # Add proposal_id to the proposal for reference in the model
+                    proposal["proposal_id"] = proposal_id
+            
+                    region = protocol.get("region", "san_francisco")
+                    logger.debug("Running simulation with proposal: %s, region: %s", proposal_id, region)
+            
+                    # Run simulation
+                    outcome = "error"
+                    try:
+                        with tracer.span("simulate", proposal_id=proposal_id), \
+                                SIMULATION_SECONDS.time(model=model_name):
+                            result = await model.simulate_opinions(
+                                region=region,
+                                proposal=proposal
+                            )
+                        outcome = "ok"
+                    finally:
+                        SIMULATIONS.inc(model=model_name, outcome=outcome)
+                    SIMULATED_AGENTS.inc(len(result.get("comments", result)), model=model_name)
+                    run_report = getattr(model, "run_report", None)
+                    if run_report:
+                        run_reports[proposal_id] = dict(run_report)
+            
+                    logger.debug("Simulation completed. Result type: %s", type(result).__name__)
+                    save_proposal_result(protocol, data_manager, exp_dir, proposal, proposal_id, result)
+            
+                except Exception:
+                    logger.exception("Error processing %s", proposal_id)
+    
+    finally:
+        # Stop tracing even if a model raised, so later runs in this process are not traced
+        if snapshot_writer:
+            snapshot_writer.stop()
+            logger.info("Metrics saved to %s", exp_dir / "metrics.prom")
+        if trace_enabled:
+            tracer.disable()
+            tracer.write_chrome_trace(exp_dir / "trace.json")
+            logger.info("Trace saved to %s", exp_dir / "trace.json")
     
-    # Run evaluation if specified in protocol
-    if "evaluation" in protocol and "evaluators" in protocol["evaluation"]:
-        run_evaluation(exp_dir, protocol)
+    # Save experiment metadata
+    end_time = datetime.now()
+    metadata = protocol.copy()
+    metadata["runtime"] = {
+        "start_time": start_time.isoformat(),
+        "end_time": end_time.isoformat(),
+        "duration_seconds": (end_time - start_time).total_seconds()
+    }
+    if run_reports:
+        metadata["run_reports"] = run_reports
+    if trace_enabled:
+        metadata["trace_summary"] = tracer.summary()
+    data_manager.save_metadata(exp_dir, metadata)
+    
+    logger.info("Experiment completed: %s", exp_id)
+    logger.info("Duration: %.2f seconds", (end_time - start_time).total_seconds())
+    logger.info("Results saved in: %s", exp_dir)
 
 def run_evaluation(exp_dir: Path, protocol: dict):
     """Run evaluation on experiment results using evaluator module."""
-    print("\nRunning evaluation...")
+    # Imported here so runs without evaluation never load NumPy
+    from experiment.eval.evaluators import evaluate_experiment_dir
+    
+    logger.info("Running evaluation...")
     
     # Get evaluators from protocol
     evaluator_names = protocol["evaluation"]["evaluators"]
-    print(f"Running evaluators: {', '.join(evaluator_names)}")
+    logger.info("Running evaluators: %s", ", ".join(evaluator_names))
     
     try:
         # Run evaluation on experiment directory
@@ -203,11 +316,10 @@ def run_evaluation(exp_dir: Path, protocol: dict):
         with open(eval_results_path, 'w') as f:
             json.dump(results, f, indent=2)
         
-        print(f"Evaluation completed. Results saved to {eval_results_path}")
+        logger.info("Evaluation completed. Results saved to %s", eval_results_path)
     
-    except Exception as e:
-        print(f"Error during evaluation: {str(e)}")
-        print(f"DEBUG: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error during evaluation")
 
 async def main():
     args = parse_args()
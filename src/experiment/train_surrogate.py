@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Train a surrogate opinion model from existing experiment runs.
+
+The surrogate answers confident agents without an LLM call when a protocol
+sets `surrogate: {path: ...}` in its `model_config` (see `models/surrogate.py`).
+Train census-family and `stupid` runs separately: the first predict ratings
+and reasons, the second support/neutral/oppose.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from models.proposal import Proposal
+from models.surrogate import Surrogate
+from experiment.build_cassette import resolve_data_path
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Train a surrogate opinion model from experiment logs")
+    parser.add_argument(
+        "--experiment-dir",
+        type=str,
+        nargs="+",
+        required=True,
+        help="One or more experiment directories under log/"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Path of the surrogate (.json) to write"
+    )
+    parser.add_argument(
+        "--agent-data-file",
+        type=str,
+        help="Agent file for census-style runs (default: the one in each run's protocol)"
+    )
+    parser.add_argument(
+        "--radius",
+        type=float,
+        default=500.0,
+        help="Neighbourhood radius in metres for the zone-mix features"
+    )
+    return parser.parse_args()
+
+
+def load_examples(experiment_dirs: List[Path], agent_data_file: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Collect one training example per logged proposal.
+
+    Comment-style outputs carry their agents; census-style outputs (keyed by
+    participant) are joined with the run's agent data file.
+
+    Returns:
+        Examples as expected by `Surrogate.train`
+    """
+    examples = []
+    for exp_dir in experiment_dirs:
+        agents_file = agent_data_file
+        if agents_file is None and (exp_dir / "protocol.yaml").exists():
+            with open(exp_dir / "protocol.yaml") as f:
+                protocol = yaml.safe_load(f) or {}
+            agents_file = protocol.get("model_config", {}).get("agent_data_file")
+        agents_by_id = None
+
+        for output_file in sorted(exp_dir.glob("proposal_*_output.json")):
+            input_file = output_file.with_name(output_file.name.replace("_output.json", "_input.json"))
+            if not input_file.exists():
+                continue
+            with open(input_file) as f:
+                proposal = Proposal.from_dict(json.load(f))
+            with open(output_file) as f:
+                output = json.load(f)
+
+            example = {"source": f"{exp_dir.name}/{output_file.name}", "proposal": proposal,
+                       "agents": [], "labels": [], "reasons": []}
+            if "comments" in output:
+                example["label_kind"] = "opinion"
+                for comment in output["comments"]:
+                    if comment.get("opinion") in ("support", "neutral", "oppose"):
+                        example["agents"].append(comment)
+                        example["labels"].append(comment["opinion"])
+                        example["reasons"].append([])
+            else:
+                example["label_kind"] = "rating"
+                if agents_by_id is None:
+                    if not agents_file or not Path(resolve_data_path(agents_file)).exists():
+                        print(f"Skipping {exp_dir.name}: agent data file {agents_file} not found")
+                        break
+                    with open(resolve_data_path(agents_file)) as f:
+                        agents_by_id = {str(agent.get("id", i)): agent for i, agent in enumerate(json.load(f))}
+                for participant_id, answer in output.items():
+                    agent = agents_by_id.get(str(participant_id))
+                    opinions = answer.get("opinions", {}) if isinstance(answer, dict) else {}
+                    if agent is None or not opinions:
+                        continue
+                    scenario_id, rating = next(iter(opinions.items()))
+                    example["agents"].append(agent)
+                    example["labels"].append(int(rating))
+                    example["reasons"].append(answer.get("reasons", {}).get(scenario_id, []))
+
+            if example["labels"]:
+                examples.append(example)
+                print(f"{example['source']}: {len(example['labels'])} answers")
+    return examples
+
+
+def main():
+    args = parse_args()
+    examples = load_examples([Path(d) for d in args.experiment_dir], args.agent_data_file)
+    surrogate = Surrogate.train(examples, radius=args.radius)
+    surrogate.save(args.output)
+    training = surrogate.training
+    accuracy = training.get("holdout_accuracy")
+    print(f"Trained {surrogate.label_kind} surrogate on {training['examples']} answers "
+          f"from {training['proposals']} proposals"
+          + (f" (holdout accuracy {accuracy:.2f})" if accuracy is not None else ""))
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Archetype clustering: one LLM query per group of similar agents.
+
+Large agent tables contain many near-identical agents. In archetype mode the
+census models cluster the agents with k-prototypes (k-means on standardized
+numeric attributes and coordinates plus a mismatch count on categorical
+attributes), query the LLM for one representative per cluster (the medoid,
+so prompts always describe a real agent) and give every member an answer
+drawn from the representative's answers.
+
+```yaml
+model_config:
+  archetypes:
+    clusters: 12          # cost/fidelity dial: LLM calls = clusters x samples
+    samples: 3            # answers per archetype, drawn at `temperature`
+    temperature: 1.0      # default: the model's temperature
+    noise: 1.0            # rating noise (std) when an archetype has a single answer
+    gamma: 0.5            # weight of one categorical mismatch vs. numeric distance
+    location_weight: 1.0  # weight of the coordinates among the numeric features
+    seed: 0
+```
+
+Members draw one of their archetype's answers at random, so with several
+samples the spread of member ratings follows the LLM's own spread for that
+profile. With a single sample each member's rating gets Gaussian `noise`
+instead. `fidelity_report` compares an archetype run with a full run (see
+`experiment/compare_runs.py`).
+"""
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .sampling import rating_opinion
+from .surrogate import agent_attributes
+
+
+def _is_numeric(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def encode_agents(records: List[Dict[str, Any]], location_weight: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Numeric and categorical matrices for k-prototypes.
+
+    Numeric attributes and the coordinates are standardized (missing values sit
+    at the mean); every other attribute becomes an integer code per value.
+
+    Returns:
+        Tuple of (numeric (N, p) floats, categorical (N, q) integer codes)
+    """
+    parsed = [agent_attributes(record) for record in records]
+    keys = sorted({key for attributes, _, _ in parsed for key in attributes})
+    numeric_keys = [key for key in keys
+                    if all(_is_numeric(a.get(key)) for a, _, _ in parsed if a.get(key) is not None)]
+    categorical_keys = [key for key in keys if key not in numeric_keys]
+
+    numeric = np.array([[a.get(key) if _is_numeric(a.get(key)) else np.nan for key in numeric_keys]
+                        + [lat, lng] for a, lat, lng in parsed], dtype=float).reshape(len(parsed), -1)
+    with np.errstate(invalid="ignore"):
+        mean = np.nanmean(numeric, axis=0) if len(numeric) else np.zeros(numeric.shape[1])
+        scale = np.nanstd(numeric, axis=0) if len(numeric) else np.ones(numeric.shape[1])
+    mean = np.nan_to_num(mean)
+    scale = np.where(np.nan_to_num(scale) > 0, np.nan_to_num(scale), 1.0)
+    numeric = np.nan_to_num((numeric - mean) / scale)
+    numeric[:, -2:] *= location_weight
+
+    categorical = np.zeros((len(parsed), len(categorical_keys)), dtype=int)
+    for column, key in enumerate(categorical_keys):
+        _, codes = np.unique(np.array([str(a.get(key)) for a, _, _ in parsed]), return_inverse=True)
+        categorical[:, column] = codes.reshape(-1)
+    return numeric, categorical
+
+
+def _distances(numeric: np.ndarray, categorical: np.ndarray,
+               centres_numeric: np.ndarray, centres_categorical: np.ndarray, gamma: float) -> np.ndarray:
+    """(N, k) k-prototypes distances, computed one centre at a time to bound memory."""
+    distances = np.empty((len(numeric), len(centres_numeric)))
+    for c in range(len(centres_numeric)):
+        distances[:, c] = (((numeric - centres_numeric[c]) ** 2).sum(axis=1)
+                           + gamma * (categorical != centres_categorical[c]).sum(axis=1))
+    return distances
+
+
+def kprototypes(numeric: np.ndarray, categorical: np.ndarray, clusters: int, gamma: float = 0.5,
+                max_iter: int = 50, rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Cluster mixed numeric/categorical data with k-prototypes.
+
+    Centres start from k-means++ seeding; numeric centres are member means and
+    categorical centres member modes. Empty clusters are re-seeded with the
+    point farthest from its centre.
+
+    Returns:
+        Tuple of (cluster per row, medoid row per cluster, total distance to the centres)
+    """
+    rng = rng or np.random.default_rng()
+    count = len(numeric)
+    clusters = max(1, min(clusters, count))
+
+    # k-means++ seeding
+    seeds = [int(rng.integers(count))]
+    nearest = _distances(numeric, categorical, numeric[seeds], categorical[seeds], gamma)[:, 0]
+    while len(seeds) < clusters:
+        total = nearest.sum()
+        seed = int(rng.choice(count, p=nearest / total)) if total > 0 else int(rng.integers(count))
+        seeds.append(seed)
+        nearest = np.minimum(nearest, _distances(numeric, categorical, numeric[[seed]], categorical[[seed]], gamma)[:, 0])
+    centres_numeric = numeric[seeds].copy()
+    centres_categorical = categorical[seeds].copy()
+
+    assignment = np.full(count, -1)
+    for _ in range(max_iter):
+        distances = _distances(numeric, categorical, centres_numeric, centres_categorical, gamma)
+        updated = np.argmin(distances, axis=1)
+        sizes = np.bincount(updated, minlength=clusters)
+        for empty in np.flatnonzero(sizes == 0):
+            farthest = int(np.argmax(distances[np.arange(count), updated]))
+            updated[farthest] = empty
+            distances[farthest] = 0.0
+            sizes = np.bincount(updated, minlength=clusters)
+        if np.array_equal(updated, assignment):
+            break
+        assignment = updated
+        for column in range(numeric.shape[1]):
+            centres_numeric[:, column] = np.bincount(assignment, weights=numeric[:, column],
+                                                     minlength=clusters) / np.maximum(sizes, 1)
+        for column in range(categorical.shape[1]):
+            values = categorical[:, column]
+            counts = np.zeros((clusters, values.max() + 1), dtype=int)
+            np.add.at(counts, (assignment, values), 1)
+            centres_categorical[:, column] = np.argmax(counts, axis=1)
+
+    distances = _distances(numeric, categorical, centres_numeric, centres_categorical, gamma)
+    own = distances[np.arange(count), assignment]
+    medoids = np.array([np.flatnonzero(assignment == c)[np.argmin(own[assignment == c])] for c in range(clusters)])
+    return assignment, medoids, float(own.sum())
+
+
+class ArchetypeClustering:
+    """Archetype settings from a model configuration."""
+
+    def __init__(self, clusters: int = 12, samples: int = 1, temperature: Optional[float] = None,
+                 noise: float = 1.0, gamma: float = 0.5, location_weight: float = 1.0, seed: int = 0):
+        if clusters < 1 or samples < 1:
+            raise ValueError(f"Archetypes need at least one cluster and one sample, got {clusters} and {samples}")
+        self.clusters = int(clusters)
+        self.samples = int(samples)
+        self.temperature = temperature
+        self.noise = noise
+        self.gamma = gamma
+        self.location_weight = location_weight
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_config(cls, config: Any) -> Optional["ArchetypeClustering"]:
+        """Settings for a configuration's `archetypes` entry, or None if it has none."""
+        options = dict(getattr(config, "archetypes", None) or {})
+        if not options:
+            return None
+        return cls(**options)
+
+    def cluster(self, records: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, float]:
+        """(cluster per agent, representative agent per cluster, clustering cost) for an agent table."""
+        numeric, categorical = encode_agents(records, self.location_weight)
+        return kprototypes(numeric, categorical, self.clusters, gamma=self.gamma, rng=self.rng)
+
+    def assign(self, answers: List[Tuple[int, List[str]]], members: int) -> List[Tuple[int, List[str]]]:
+        """(rating, reasons) for each member of an archetype with the given answers.
+
+        Members draw one answer each; with a single answer the rating gets
+        rounded Gaussian noise of std `noise`, clipped to 1-10.
+        """
+        picks = self.rng.integers(len(answers), size=members)
+        assigned = []
+        for pick in picks:
+            rating, reasons = answers[pick]
+            if len(answers) == 1 and self.noise:
+                rating = int(np.clip(round(rating + self.rng.normal(0.0, self.noise)), 1, 10))
+            assigned.append((rating, list(reasons)))
+        return assigned
+
+
+def fidelity_report(candidate: Dict[str, Any], reference: Dict[str, Any]) -> Dict[str, Any]:
+    """Compare a census-style output with a full-run reference for the same proposal.
+
+    Both outputs are keyed by participant ({"opinions": {scenario: rating},
+    "reasons": {scenario: [codes]}}); participants present in both are compared.
+
+    Returns:
+        Rating MAE and mean difference, total variation distance between the
+        rating distributions and between the support/neutral/oppose splits,
+        and the mean Jaccard similarity of the reason lists
+    """
+    pairs = []
+    for participant_id, answer in candidate.items():
+        expected = reference.get(participant_id)
+        if not isinstance(answer, dict) or not isinstance(expected, dict):
+            continue
+        for scenario_id, rating in answer.get("opinions", {}).items():
+            if scenario_id in expected.get("opinions", {}):
+                pairs.append((rating, expected["opinions"][scenario_id],
+                              set(answer.get("reasons", {}).get(scenario_id, [])),
+                              set(expected.get("reasons", {}).get(scenario_id, []))))
+    if not pairs:
+        return {"compared": 0}
+
+    ratings = np.array([p[0] for p in pairs], dtype=float)
+    expected = np.array([p[1] for p in pairs], dtype=float)
+
+    def total_variation(a: Sequence[Any], b: Sequence[Any]) -> float:
+        labels = set(a) | set(b)
+        return 0.5 * sum(abs(list(a).count(label) / len(a) - list(b).count(label) / len(b)) for label in labels)
+
+    jaccard = [len(mine & theirs) / len(mine | theirs) if mine | theirs else 1.0 for _, _, mine, theirs in pairs]
+    return {
+        "compared": len(pairs),
+        "rating_mae": float(np.mean(np.abs(ratings - expected))),
+        "mean_rating_difference": float(ratings.mean() - expected.mean()),
+        "rating_distribution_tvd": total_variation(ratings.tolist(), expected.tolist()),
+        "opinion_split_tvd": total_variation([rating_opinion(r) for r in ratings],
+                                             [rating_opinion(r) for r in expected]),
+        "reason_jaccard": float(np.mean(jaccard))
+    }
@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Callable
 from dataclasses import dataclass
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ModelConfig:
     """Configuration for a simulation model."""
@@ -15,9 +18,9 @@ class ModelConfig:
         self.population = population
         
         # Store all additional configuration parameters
-        print(f"DEBUG ModelConfig: Initializing with population={population} and {len(kwargs)} additional parameters")
+        logger.debug("ModelConfig: initializing with population=%s and %d additional parameters", population, len(kwargs))
         for key, value in kwargs.items():
-            print(f"DEBUG ModelConfig: Setting {key}={value}")
+            logger.debug("ModelConfig: setting %s=%r", key, value)
             setattr(self, key, value)
 
 class BaseModel(ABC):
@@ -31,6 +34,11 @@ class BaseModel(ABC):
             config: Model configuration. If None, uses default configuration.
         """
         self.config = config or ModelConfig()
+        # Diagnostics of the latest simulation (e.g. surrogate routing), keyed by
+        # feature; run_experiment stores them in the experiment metadata
+        self.run_report: Dict[str, Any] = {}
+        # Called with each agent's entry as `simulate_opinions` produces it (e.g. for job progress)
+        self.on_agent: Optional[Callable[[Dict[str, Any]], None]] = None
     
     @abstractmethod
     async def simulate_opinions(self, 
@@ -46,4 +54,66 @@ class BaseModel(ABC):
         Returns:
             Opinion distribution summary
         """
-        pass 
\ No newline at end of file
+        pass
+    
+    async def stream_opinions(self,
+                              region: str,
+                              proposal: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield per-agent results as they become available
+        
+        Models that simulate agents one at a time should override this so
+        callers see results before the whole run completes. The default
+        runs `simulate_opinions` and then yields its entries.
+        
+        Args:
+            region: Target region name
+            proposal: Proposal details including title and description
+            
+        Yields:
+            One comment entry (or {"id": ..., **participant_result}) per agent
+        """
+        result = await self.simulate_opinions(region, proposal)
+        if "comments" in result:
+            for comment in result["comments"]:
+                yield comment
+        else:
+            for participant_id, participant_result in result.items():
+                yield {"id": participant_id, **participant_result}
+    
+    async def resimulate_opinions(self,
+                                  region: str,
+                                  proposal: Dict[str, Any],
+                                  previous_proposal: Dict[str, Any],
+                                  previous_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Simulate an edited proposal, given the result for the proposal it was edited from
+        
+        Models whose prompts only depend on an agent's local context can
+        override this to re-query just the agents an edit affects (see
+        `models.incremental`). The default runs a full `simulate_opinions`.
+        
+        Args:
+            region: Target region name
+            proposal: Edited proposal
+            previous_proposal: Proposal the previous result was simulated for
+            previous_result: Result of `simulate_opinions` for `previous_proposal`
+            
+        Returns:
+            Same structure as `simulate_opinions`
+        """
+        return await self.simulate_opinions(region, proposal)
+    
+    def _agent_done(self, entry: Dict[str, Any]) -> None:
+        """Pass one simulated agent's entry (as `stream_opinions` yields it) to `on_agent`, if set."""
+        if self.on_agent is not None:
+            self.on_agent(entry)
+    
+    def _report_cascade(self) -> None:
+        """Record the model cascade's per-tier usage since the last report (see `models.cascade`)."""
+        # Imported here, like in `create_llm`, so models without a cascade do not load it
+        from .cascade import CascadeLLM
+
+        llm = getattr(self, "llm", None)
+        if isinstance(llm, CascadeLLM):
+            self.run_report["cascade"] = llm.report(reset=True)
@@ -0,0 +1,207 @@
+"""
+Cost-aware model cascade: a cheap fast tier first, a stronger one when needed.
+
+Most agents are easy to answer, so a cascade sends every prompt to the first
+tier and only escalates to the next one when that tier's answer is not
+usable. Models call `generate_checked(prompt, check, ...)`, where `check`
+returns None for an acceptable response or the reason to escalate, e.g.
+`parse_failure`, `invalid_reasons` or `low_confidence` (see
+`llm_backends.census_check`). Backend errors escalate as `error`. The last
+tier's answer is returned whatever the check says, and the model's own
+fallbacks handle it.
+
+```yaml
+model_config:
+  llm: {backend: openai}     # shared backend options, overridable per tier
+  cascade:
+    min_confidence: 6        # census models ask for a Confidence line and escalate below it
+    tiers:
+      - name: fast
+        model: gpt-4o-mini
+        cost: {prompt: 0.15, completion: 0.60}   # USD per million tokens
+      - name: strong
+        model: gpt-4o
+        cost: {prompt: 2.50, completion: 10.00}
+        llm: {seed: 1}       # tier-specific backend options
+```
+
+Every tier is an ordinary backend from `create_llm`, labelled
+`<backend>:<tier>` in the LLM metrics. `CascadeLLM.report()` gives the calls,
+escalations by reason, latency, tokens and cost per tier. Token counts come
+from the API where the backend reports `usage` (the OpenAI wrappers) and are
+otherwise estimated from characters. Streams closed before the API reported
+their usage (`stream_responses`) are estimated too, and any estimate marks
+the tier's tokens `estimated`.
+"""
+import time
+from typing import Dict, Any, Optional, Callable, List
+
+from .llm_backends import LLMBackend
+from .metrics import metrics
+
+CASCADE_CALLS = metrics.counter(
+    "llm_cascade_calls", "Cascade tier calls by outcome (accepted, escalated, error)", ("tier", "outcome"))
+
+# Rough characters per token, for backends that do not report usage
+CHARS_PER_TOKEN = 4.0
+
+
+class CascadeTier:
+    """One backend of a cascade with its prices and usage counters."""
+
+    def __init__(self, name: str, llm: LLMBackend, model: Optional[str] = None,
+                 cost: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            name: Label of the tier in metrics and reports
+            llm: Backend answering for this tier
+            model: Model name, for reports
+            cost: USD per million `prompt` and `completion` tokens
+        """
+        self.name = name
+        self.llm = llm
+        self.model = model
+        self.cost = {"prompt": 0.0, "completion": 0.0, **(cost or {})}
+        self.reset()
+
+    def reset(self) -> None:
+        """Start new usage counters (e.g. for the next simulation)."""
+        self.calls = 0
+        self.accepted = 0
+        self.errors = 0
+        self.escalated: Dict[str, int] = {}
+        self.seconds = 0.0
+        self.prompt_chars = 0
+        self.completion_chars = 0
+        usage = getattr(self.llm, "usage", None)
+        self._usage_start = dict(usage) if isinstance(usage, dict) else None
+
+    def tokens(self) -> Dict[str, Any]:
+        """Prompt and completion tokens since the last reset, reported or estimated."""
+        usage = getattr(self.llm, "usage", None)
+        if isinstance(usage, dict) and self._usage_start is not None:
+            delta = {key: usage.get(key, 0) - self._usage_start.get(key, 0) for key in usage}
+            return {
+                "prompt_tokens": delta["prompt_tokens"]
+                + round(delta.get("unreported_prompt_chars", 0) / CHARS_PER_TOKEN),
+                "completion_tokens": delta["completion_tokens"]
+                + round(delta.get("unreported_completion_chars", 0) / CHARS_PER_TOKEN),
+                "estimated": delta.get("unreported_calls", 0) > 0
+            }
+        return {
+            "prompt_tokens": round(self.prompt_chars / CHARS_PER_TOKEN),
+            "completion_tokens": round(self.completion_chars / CHARS_PER_TOKEN),
+            "estimated": True
+        }
+
+    def report(self) -> Dict[str, Any]:
+        tokens = self.tokens()
+        cost = (tokens["prompt_tokens"] * self.cost["prompt"]
+                + tokens["completion_tokens"] * self.cost["completion"]) / 1e6
+        return {
+            "tier": self.name,
+            "model": self.model,
+            "calls": self.calls,
+            "accepted": self.accepted,
+            "escalated": dict(self.escalated),
+            "errors": self.errors,
+            "seconds": self.seconds,
+            "mean_seconds": self.seconds / self.calls if self.calls else 0.0,
+            **tokens,
+            "cost": cost
+        }
+
+
+class CascadeLLM(LLMBackend):
+    """Tries each tier in order until a response passes the caller's check."""
+
+    def __init__(self, tiers: List[CascadeTier], min_confidence: Optional[float] = None):
+        """
+        Args:
+            tiers: Tiers from cheapest to strongest
+            min_confidence: Lowest acceptable self-reported confidence (1-10), for models that ask for one
+
+        Raises:
+            ValueError: If no tier is given
+        """
+        if not tiers:
+            raise ValueError("A cascade needs at least one tier")
+        self.tiers = tiers
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def from_config(cls, config: Any, create_tier: Callable[[Dict[str, Any]], LLMBackend]) -> Optional["CascadeLLM"]:
+        """Cascade for a configuration's `cascade` entry, or None if it has none.
+
+        Args:
+            config: Model configuration
+            create_tier: Builds the backend of one tier from its configuration
+        """
+        options = dict(getattr(config, "cascade", None) or {})
+        if not options:
+            return None
+        tiers = []
+        for k, tier in enumerate(options.get("tiers", [])):
+            name = tier.get("name", tier.get("model", f"tier{k}"))
+            tiers.append(CascadeTier(name, create_tier({"name": name, **tier}),
+                                     model=tier.get("model"), cost=tier.get("cost")))
+        return cls(tiers, min_confidence=options.get("min_confidence"))
+
+    @property
+    def supports_response_format(self) -> bool:
+        return all(tier.llm.supports_response_format for tier in self.tiers)
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
+        return await self.generate_checked(prompt, lambda response: None, max_tokens=max_tokens,
+                                           temperature=temperature)
+
+    async def generate_checked(self, prompt: str, check: Callable[[str], Optional[str]],
+                               max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                               is_complete: Optional[Callable[[str], bool]] = None,
+                               response_format: Optional[Dict[str, Any]] = None) -> str:
+        for k, tier in enumerate(self.tiers):
+            last = k == len(self.tiers) - 1
+            tier.calls += 1
+            tier.prompt_chars += len(prompt)
+            start = time.perf_counter()
+            try:
+                response = await tier.llm.generate_checked(prompt, check, max_tokens=max_tokens,
+                                                           temperature=temperature, is_complete=is_complete,
+                                                           response_format=response_format)
+            except Exception:
+                tier.errors += 1
+                CASCADE_CALLS.inc(tier=tier.name, outcome="error")
+                if last:
+                    raise
+                tier.escalated["error"] = tier.escalated.get("error", 0) + 1
+                continue
+            finally:
+                tier.seconds += time.perf_counter() - start
+            tier.completion_chars += len(response)
+            reason = None if last else check(response)
+            if reason is None:
+                tier.accepted += 1
+                CASCADE_CALLS.inc(tier=tier.name, outcome="accepted")
+                return response
+            tier.escalated[reason] = tier.escalated.get(reason, 0) + 1
+            CASCADE_CALLS.inc(tier=tier.name, outcome="escalated")
+
+    def report(self, reset: bool = False) -> Dict[str, Any]:
+        """Usage per tier since the last reset, plus the totals.
+
+        Args:
+            reset: Start new counters afterwards
+        """
+        tiers = [tier.report() for tier in self.tiers]
+        calls = tiers[0]["calls"]
+        escalations = sum(sum(tier["escalated"].values()) for tier in tiers)
+        if reset:
+            for tier in self.tiers:
+                tier.reset()
+        return {
+            "requests": calls,
+            "escalation_rate": sum(tiers[0]["escalated"].values()) / calls if calls else 0.0,
+            "escalations": escalations,
+            "cost": sum(tier["cost"] for tier in tiers),
+            "tiers": tiers
+        }
@@ -0,0 +1,143 @@
+"""
+Incremental re-simulation of edited proposals.
+
+Planners usually tweak a few cells and resubmit. A model whose prompts only
+depend on an agent's local context (its nearest cell, or the cells within
+`radius` metres) then only needs to re-query the agents whose context an
+edit touched, and can reuse every other agent's previous answer.
+
+`changed_cells` diffs two proposals; `affected_agents` uses an `AgentIndex`
+(a uniform grid of buckets over agent coordinates) to find the agents near
+the edited cells:
+
+- agents whose previous nearest cell was edited or removed
+- agents now closer to an added or edited cell than to their previous
+  nearest cell (their nearest cell changes)
+- agents within `radius` of an edited cell's old or new centre
+
+Distances use the same planar degree metric as `Proposal.nearest_cell`. Any
+change outside `cells` (title, default height, grid configuration, ...) may
+change every prompt, so it affects all agents.
+"""
+from typing import Dict, Any, Optional, Sequence, Set
+
+import numpy as np
+
+from .grid import METERS_PER_DEGREE
+from .proposal import as_proposal
+
+
+def changed_cells(previous: Dict[str, Any], proposal: Dict[str, Any]) -> Optional[Set[str]]:
+    """IDs of cells added, removed or edited between two proposals.
+
+    Returns:
+        The changed cell IDs, or None if a field outside `cells` changed
+    """
+    if {key: value for key, value in previous.items() if key != "cells"} != \
+            {key: value for key, value in proposal.items() if key != "cells"}:
+        return None
+    previous_cells = previous.get("cells", {})
+    cells = proposal.get("cells", {})
+    changed = {cell_id for cell_id, cell in cells.items() if previous_cells.get(cell_id) != cell}
+    changed.update(cell_id for cell_id in previous_cells if cell_id not in cells)
+    return changed
+
+
+class AgentIndex:
+    """Uniform grid of buckets over agent coordinates for radius queries."""
+
+    def __init__(self, lats: Sequence[float], lngs: Sequence[float], bucket_size: float = 0.005):
+        """
+        Args:
+            lats: Agent latitudes (NaN for agents without a location)
+            lngs: Agent longitudes
+            bucket_size: Bucket edge in degrees
+        """
+        self.points = np.column_stack([np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)])
+        self.bucket_size = bucket_size
+        self._buckets: Dict[tuple, np.ndarray] = {}
+        located = np.flatnonzero(~np.isnan(self.points).any(axis=1))
+        keys = np.floor(self.points[located] / bucket_size).astype(int)
+        if len(located):
+            order = np.lexsort((keys[:, 1], keys[:, 0]))
+            keys, located = keys[order], located[order]
+            starts = np.flatnonzero(np.r_[True, (np.diff(keys, axis=0) != 0).any(axis=1)])
+            for start, end in zip(starts, np.r_[starts[1:], len(located)]):
+                self._buckets[tuple(keys[start])] = located[start:end]
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def query(self, lat: float, lng: float, radius: float) -> np.ndarray:
+        """Indices of agents within `radius` degrees of (lat, lng)."""
+        low = np.floor((np.array([lat, lng]) - radius) / self.bucket_size).astype(int)
+        high = np.floor((np.array([lat, lng]) + radius) / self.bucket_size).astype(int)
+        if (high - low + 1).prod() > len(self._buckets):
+            candidates = list(self._buckets.values())
+        else:
+            candidates = [self._buckets[(row, col)]
+                          for row in range(low[0], high[0] + 1)
+                          for col in range(low[1], high[1] + 1)
+                          if (row, col) in self._buckets]
+        if not candidates:
+            return np.empty(0, dtype=int)
+        candidates = np.concatenate(candidates)
+        squared = ((self.points[candidates] - [lat, lng]) ** 2).sum(axis=1)
+        return np.sort(candidates[squared <= radius ** 2])
+
+
+def affected_agents(previous: Dict[str, Any],
+                    proposal: Dict[str, Any],
+                    index: AgentIndex,
+                    nearest: Sequence[Optional[str]],
+                    radius: float = 0.0) -> np.ndarray:
+    """Mask of agents whose local context differs between two proposals.
+
+    Args:
+        previous: Proposal the agents were last simulated with
+        proposal: Edited proposal
+        index: Spatial index over the agents
+        nearest: Each agent's nearest cell ID under `previous` (None if unknown)
+        radius: Context radius in metres of the model's prompts (0: nearest cell only)
+
+    Returns:
+        Boolean mask over the agents of `index`
+    """
+    changed = changed_cells(previous, proposal)
+    if changed is None:
+        return np.ones(len(index), dtype=bool)
+    affected = np.zeros(len(index), dtype=bool)
+    if not changed:
+        return affected
+    previous, proposal = as_proposal(previous), as_proposal(proposal)
+
+    nearest = np.array([cell_id if cell_id is not None else "" for cell_id in nearest], dtype=object)
+    affected |= np.isin(nearest, list(changed))
+    # Agents without a known nearest cell are simulated again
+    affected |= nearest == ""
+
+    # Distance from every agent to its previous nearest cell, to test whether an edited cell is now closer
+    positions = {cell_id: k for k, cell_id in enumerate(previous.cell_ids)}
+    rows = np.array([positions.get(cell_id, -1) for cell_id in nearest], dtype=int)
+    centres = previous.centroids[np.maximum(rows, 0)] if len(previous.cell_ids) else np.full((len(index), 2), np.nan)
+    current = np.sqrt(((index.points - centres) ** 2).sum(axis=1))
+    current = np.where((rows < 0) | np.isnan(current), np.inf, current)
+    affected |= rows < 0
+    finite = current[np.isfinite(current)]
+    reach = float(finite.max()) if len(finite) else 0.0
+
+    context = radius / METERS_PER_DEGREE
+    for cells in (previous, proposal):
+        row_of = {cell_id: k for k, cell_id in enumerate(cells.cell_ids)}
+        for cell_id in changed:
+            row = row_of.get(cell_id)
+            if row is None or np.isnan(cells.centroids[row]).any():
+                continue
+            lat, lng = cells.centroids[row]
+            if context > 0:
+                affected[index.query(lat, lng, context)] = True
+            if cells is proposal:
+                candidates = index.query(lat, lng, reach)
+                squared = ((index.points[candidates] - [lat, lng]) ** 2).sum(axis=1)
+                affected[candidates[squared <= current[candidates] ** 2]] = True
+    return affected
@@ -0,0 +1,628 @@
+"""
+Pluggable LLM backends shared by all models.
+
+Every model talks to its LLM through the `LLMBackend` interface. Besides the
+OpenAI wrappers in each model's `components/llm.py`, this module provides
+backends that need no network access:
+
+- `ReplayLLM`: serves responses from a recorded prompt->response cassette
+- `RecordingLLM`: wraps another backend and appends every exchange to a cassette
+- `SyntheticLLM`: fabricates well-formed responses with configurable latency
+  and error rates
+
+`create_llm` wraps whichever backend is selected in `InstrumentedLLM`, which
+records call counts and latency in `models.metrics`.
+
+`generate_until` streams a response and closes the stream as soon as a
+caller-supplied check accepts the text received so far, so models that only
+need a few fields do not wait for (or pay for) the rest of a verbose answer.
+Backends with `supports_response_format` also honour an OpenAI-style
+`response_format`, constraining the output to a JSON schema.
+
+With a `cascade` entry in `model_config`, `create_llm` returns a
+`cascade.CascadeLLM` that escalates from a fast tier to stronger ones when
+`generate_checked` rejects an answer.
+
+Backends are selected through the `llm` entry of a protocol's `model_config`:
+
+```yaml
+model_config:
+  llm:
+    backend: replay            # openai | replay | record | synthetic
+    cassette: path/to/cassette.jsonl
+    model: gpt-4o-mini         # openai/record (default: the model's OpenAILLM default)
+    on_miss: synthetic         # error | synthetic (replay only)
+    latency: {distribution: lognormal, mean: 0.8, sigma: 0.4}
+    error_rate: 0.02
+    seed: 42
+    chatter: 60                # synthetic: words of explanation after census answers
+```
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable, List, AsyncIterator
+
+from .metrics import LLM_REQUESTS, LLM_SECONDS
+from .tracing import tracer
+
+# Reason codes understood by the census family of models
+REASON_CODES = list("ABCDEFGHIJKL")
+
+# Multi-scenario census prompts list their scenarios on this line
+SCENARIOS_LINE = re.compile(r"^Scenarios to rate:\s*(.+)$", re.MULTILINE)
+SCENARIO_HEADER = re.compile(r"^\s*\**\s*Scenario\s+([\w.]+)\s*\**\s*:?\s*\**\s*$", re.MULTILINE | re.IGNORECASE)
+
+
+class LLMBackend(ABC):
+    """Base interface for all LLM backends"""
+
+    # Whether `stream` honours `response_format` (output constrained to a JSON schema)
+    supports_response_format = False
+
+    @abstractmethod
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
+        """
+        Generate text for a prompt
+
+        Args:
+            prompt: Input prompt
+            max_tokens: Optional maximum number of tokens to generate
+            temperature: Sampling temperature
+
+        Returns:
+            Generated text
+        """
+        pass
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                     response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Yield the response to a prompt in chunks as it is generated
+
+        Backends without streaming yield the whole `generate` response as one
+        chunk and ignore `response_format`.
+
+        Args:
+            prompt: Input prompt
+            max_tokens: Optional maximum number of tokens to generate
+            temperature: Sampling temperature
+            response_format: OpenAI-style `response_format`, honoured if `supports_response_format`
+        """
+        yield await self.generate(prompt, max_tokens=max_tokens, temperature=temperature)
+
+    async def generate_until(self, prompt: str, is_complete: Callable[[str], bool],
+                             max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                             response_format: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Stream a response and close the stream as soon as `is_complete` accepts the text so far
+
+        Args:
+            prompt: Input prompt
+            is_complete: Called with the accumulated text after every chunk
+            max_tokens: Optional maximum number of tokens to generate
+            temperature: Sampling temperature
+            response_format: Passed to `stream` if the backend supports it
+
+        Returns:
+            The text received until it was complete (or the whole response)
+        """
+        if not self.supports_response_format:
+            response_format = None
+        chunks = self.stream(prompt, max_tokens=max_tokens, temperature=temperature, response_format=response_format)
+        text = ""
+        try:
+            async for chunk in chunks:
+                text += chunk
+                if is_complete(text):
+                    tracer.count("early_stops")
+                    break
+        finally:
+            await chunks.aclose()
+        return text
+
+    async def generate_checked(self, prompt: str, check: Callable[[str], Optional[str]],
+                               max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                               is_complete: Optional[Callable[[str], bool]] = None,
+                               response_format: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate a response that the caller can validate with `check`
+
+        A single backend returns its response as is; `cascade.CascadeLLM`
+        escalates to a stronger tier when `check` rejects it.
+
+        Args:
+            prompt: Input prompt
+            check: Returns None for an acceptable response, else the reason to escalate
+            max_tokens: Optional maximum number of tokens to generate
+            temperature: Sampling temperature
+            is_complete: If given, stream with `generate_until` and stop once it accepts the text
+            response_format: Passed to `generate_until` if the backend supports it
+
+        Returns:
+            Generated text
+        """
+        if is_complete is None and response_format is None:
+            return await self.generate(prompt, max_tokens=max_tokens, temperature=temperature)
+        return await self.generate_until(prompt, is_complete or (lambda text: False), max_tokens=max_tokens,
+                                         temperature=temperature, response_format=response_format)
+
+
+def prompt_key(prompt: str) -> str:
+    """Return the cassette key for a prompt (SHA-256 of the stripped prompt)."""
+    return hashlib.sha256(prompt.strip().encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """A prompt->response recording stored as JSON lines.
+
+    Each line holds one exchange: {"key": ..., "prompt": ..., "response": ...}.
+    JSON lines keep recording append-only, so a crashed run still leaves a
+    usable cassette behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: Dict[str, List[str]] = {}
+        if self.path.exists():
+            self._load()
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                key = entry.get("key") or prompt_key(entry["prompt"])
+                self.entries.setdefault(key, []).append(entry["response"])
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self.entries.values())
+
+    def lookup(self, prompt: str, occurrence: int = 0) -> Optional[str]:
+        """Return the recorded response for a prompt, or None if not recorded.
+
+        When the same prompt was recorded several times, `occurrence` picks
+        which recording to serve (wrapping around).
+        """
+        responses = self.entries.get(prompt_key(prompt))
+        if not responses:
+            return None
+        return responses[occurrence % len(responses)]
+
+    def append(self, prompt: str, response: str) -> None:
+        """Record an exchange in memory and on disk."""
+        key = prompt_key(prompt)
+        self.entries.setdefault(key, []).append(response)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "prompt": prompt, "response": response}) + "\n")
+
+
+class LatencyModel:
+    """Samples simulated LLM latencies in seconds.
+
+    Supported distributions: constant, uniform, exponential, lognormal.
+    """
+
+    def __init__(self, distribution: str = "constant", rng: Optional[random.Random] = None, **params):
+        self.distribution = distribution
+        self.params = params
+        self.rng = rng or random.Random()
+        if distribution not in {"constant", "uniform", "exponential", "lognormal"}:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+
+    def sample(self) -> float:
+        """Draw one latency value."""
+        p = self.params
+        if self.distribution == "constant":
+            return float(p.get("value", p.get("mean", 0.0)))
+        if self.distribution == "uniform":
+            return self.rng.uniform(p.get("low", 0.0), p.get("high", 1.0))
+        if self.distribution == "exponential":
+            return self.rng.expovariate(1.0 / p.get("mean", 1.0))
+        # lognormal parameterised by its median-like `mean` and shape `sigma`
+        mean = p.get("mean", 1.0)
+        return mean * self.rng.lognormvariate(0.0, p.get("sigma", 0.5))
+
+
+class SyntheticLLM(LLMBackend):
+    """Fabricates responses in the format each model's prompt asks for.
+
+    Responses are deterministic per prompt and seed, so repeated runs are
+    reproducible. Latency and failures are simulated to exercise concurrency
+    and error handling without network access. `chatter` appends that many
+    words of explanation to rating answers, as verbose models do, and
+    `stream` spreads the latency over word-sized chunks, so early-terminated
+    streams can be benchmarked. With a `response_format`, rating answers are
+    returned as JSON.
+    """
+
+    supports_response_format = True
+
+    def __init__(self,
+                 latency: Optional[Dict[str, Any]] = None,
+                 error_rate: float = 0.0,
+                 seed: int = 0,
+                 chatter: int = 0):
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self.latency = LatencyModel(rng=self._rng, **(latency or {}))
+        self.error_rate = error_rate
+        self.chatter = chatter
+        self.calls = 0
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
+        self.calls += 1
+        delay = self.latency.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise RuntimeError("Synthetic LLM error")
+        return self.respond(prompt)
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                     response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise RuntimeError("Synthetic LLM error")
+        chunks = re.findall(r"\s*\S+", self.respond(prompt, response_format))
+        delay = self.latency.sample() / max(len(chunks), 1)
+        for chunk in chunks:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    def respond(self, prompt: str, response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Build a plausible response for a prompt without any delay."""
+        rng = random.Random(f"{self.seed}:{prompt_key(prompt)}")
+        scenarios = SCENARIOS_LINE.search(prompt)
+        if scenarios:
+            return format_census_scenarios_response({
+                label.strip(): (rng.randint(1, 10), rng.sample(REASON_CODES, rng.randint(1, 3)))
+                for label in scenarios.group(1).split(",")
+            })
+        if "Rating:" in prompt:
+            rating = rng.randint(1, 10)
+            reasons = rng.sample(REASON_CODES, rng.randint(1, 3))
+            # Confidence is only drawn when asked for, so other answers stay the same
+            confidence = rng.randint(1, 10) if "Confidence:" in prompt else None
+            if response_format is not None:
+                answer = {"rating": rating, "reasons": reasons}
+                if confidence is not None:
+                    answer["confidence"] = confidence
+                return json.dumps(answer)
+            response = format_census_response(rating, reasons, confidence)
+            if self.chatter:
+                words = ["housing", "the", "neighborhood", "would", "change", "because", "of", "new", "density"]
+                response += "\n\nExplanation: " + " ".join(rng.choice(words) for _ in range(self.chatter)) + "."
+            return response
+        if "opinion|comment" in prompt:
+            opinion = rng.choice(["support", "oppose", "neutral"])
+            themes = rng.sample(["housing", "traffic", "shadows", "jobs", "density", "character"], 2)
+            return f"{opinion}|Synthetic comment from a resident who would {opinion} this.|{','.join(themes)}"
+        return "Synthetic response."
+
+
+class ReplayLLM(LLMBackend):
+    """Serves responses from a recorded cassette.
+
+    Prompts that are not in the cassette either raise (`on_miss="error"`) or
+    are answered by a `SyntheticLLM` (`on_miss="synthetic"`).
+    """
+
+    def __init__(self, cassette: str, on_miss: str = "error", synthetic: Optional[SyntheticLLM] = None):
+        self.cassette = Cassette(cassette)
+        if on_miss not in {"error", "synthetic"}:
+            raise ValueError(f"Unknown on_miss policy: {on_miss}")
+        self.on_miss = on_miss
+        self.synthetic = synthetic or SyntheticLLM()
+        self.hits = 0
+        self.misses = 0
+        self._occurrences: Dict[str, int] = {}
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
+        key = prompt_key(prompt)
+        occurrence = self._occurrences.get(key, 0)
+        self._occurrences[key] = occurrence + 1
+
+        response = self.cassette.lookup(prompt, occurrence)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        self.misses += 1
+        if self.on_miss == "synthetic":
+            return await self.synthetic.generate(prompt, max_tokens, temperature)
+        raise RuntimeError(f"Prompt not found in cassette {self.cassette.path} (key={key[:12]})")
+
+
+class RecordingLLM(LLMBackend):
+    """Wraps another backend and records every successful exchange."""
+
+    def __init__(self, inner: LLMBackend, cassette: str):
+        self.inner = inner
+        self.cassette = Cassette(cassette)
+
+    @property
+    def supports_response_format(self) -> bool:
+        return self.inner.supports_response_format
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
+        response = await self.inner.generate(prompt, max_tokens=max_tokens, temperature=temperature)
+        self.cassette.append(prompt, response)
+        return response
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                     response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        # Records the text received, which is truncated if the caller stops early
+        received = []
+        chunks = self.inner.stream(prompt, max_tokens=max_tokens, temperature=temperature,
+                                   response_format=response_format)
+        try:
+            async for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+        finally:
+            await chunks.aclose()
+            if received:
+                self.cassette.append(prompt, "".join(received))
+
+
+class InstrumentedLLM(LLMBackend):
+    """Records call outcomes and latency of another backend in the metrics registry."""
+
+    def __init__(self, inner: LLMBackend, backend: str):
+        self.inner = inner
+        self.backend = backend
+
+    def __getattr__(self, name):
+        # Expose the wrapped backend's attributes (e.g. `calls`, `hits`)
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    @property
+    def supports_response_format(self) -> bool:
+        return self.inner.supports_response_format
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
+        outcome = "error"
+        try:
+            with LLM_SECONDS.time(backend=self.backend):
+                response = await self.inner.generate(prompt, max_tokens=max_tokens, temperature=temperature)
+            outcome = "ok"
+            return response
+        finally:
+            LLM_REQUESTS.inc(backend=self.backend, outcome=outcome)
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                     response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        # Streams closed by the caller before they end are counted as "stopped"
+        outcome = "error"
+        chunks = self.inner.stream(prompt, max_tokens=max_tokens, temperature=temperature,
+                                   response_format=response_format)
+        try:
+            with LLM_SECONDS.time(backend=self.backend):
+                async for chunk in chunks:
+                    yield chunk
+            outcome = "ok"
+        except GeneratorExit:
+            outcome = "stopped"
+            raise
+        finally:
+            await chunks.aclose()
+            LLM_REQUESTS.inc(backend=self.backend, outcome=outcome)
+
+
+def create_llm(config: Any, default_factory: Callable[..., LLMBackend]) -> LLMBackend:
+    """Create the LLM backend requested by a model configuration.
+
+    With a `cascade` entry, every tier gets its own backend built from the
+    `llm` options updated with the tier's `llm` options (see `models.cascade`).
+
+    Args:
+        config: Model configuration; its optional `llm` attribute selects the backend
+        default_factory: Builds the model's live backend (usually its `OpenAILLM`);
+            called with `model=` when a model name is configured
+
+    Returns:
+        An `LLMBackend` instance
+    """
+    options = dict(getattr(config, "llm", None) or {})
+    if getattr(config, "cascade", None):
+        from .cascade import CascadeLLM
+
+        def create_tier(tier: Dict[str, Any]) -> LLMBackend:
+            tier_options = {**options, **(tier.get("llm") or {})}
+            if tier.get("model"):
+                tier_options["model"] = tier["model"]
+            return _create_backend(tier_options, default_factory, tier["name"])
+
+        return CascadeLLM.from_config(config, create_tier)
+    return _create_backend(options, default_factory)
+
+
+def _create_backend(options: Dict[str, Any], default_factory: Callable[..., LLMBackend],
+                    tier: Optional[str] = None) -> LLMBackend:
+    """Instrumented backend for one set of `llm` options (labelled `<backend>:<tier>` in a cascade)."""
+    backend = options.get("backend", "openai")
+
+    def synthetic() -> SyntheticLLM:
+        return SyntheticLLM(
+            latency=options.get("latency"),
+            error_rate=options.get("error_rate", 0.0),
+            seed=options.get("seed", 0),
+            chatter=options.get("chatter", 0)
+        )
+
+    def live() -> LLMBackend:
+        return default_factory(model=options["model"]) if options.get("model") else default_factory()
+
+    if backend == "openai":
+        llm = live()
+    elif backend == "synthetic":
+        llm = synthetic()
+    elif backend == "replay":
+        llm = ReplayLLM(options["cassette"], on_miss=options.get("on_miss", "error"), synthetic=synthetic())
+    elif backend == "record":
+        llm = RecordingLLM(live(), options["cassette"])
+    else:
+        raise ValueError(f"Unknown LLM backend: {backend}")
+    return InstrumentedLLM(llm, f"{backend}:{tier}" if tier else backend)
+
+
+def format_census_response(rating: int, reasons: List[str], confidence: Optional[int] = None) -> str:
+    """Render a census-style rating and reason list (and confidence) as an LLM response."""
+    response = f"Rating: {rating}\nReasons: {','.join(reasons)}"
+    if confidence is not None:
+        response += f"\nConfidence: {confidence}"
+    return response
+
+
+def format_census_scenarios_response(answers: Dict[str, Any]) -> str:
+    """Render per-scenario (rating, reasons) answers as a multi-scenario LLM response."""
+    return "\n\n".join(
+        f"Scenario {label}\n{format_census_response(rating, reasons)}"
+        for label, (rating, reasons) in answers.items()
+    )
+
+
+def parse_scenario_blocks(response: str) -> Dict[str, str]:
+    """Split a multi-scenario response into the text following each "Scenario X" header."""
+    headers = list(SCENARIO_HEADER.finditer(response))
+    return {
+        header.group(1).rstrip("."): response[header.end():headers[k + 1].start() if k + 1 < len(headers) else None]
+        for k, header in enumerate(headers)
+    }
+
+
+# `response_format` constraining census answers to {"rating": 1-10, "reasons": [1-3 codes]}
+CENSUS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "census_opinion",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "rating": {"type": "integer", "enum": list(range(1, 11))},
+                "reasons": {"type": "array", "items": {"type": "string", "enum": REASON_CODES},
+                            "minItems": 1, "maxItems": 3}
+            },
+            "required": ["rating", "reasons"],
+            "additionalProperties": False
+        }
+    }
+}
+
+
+def census_response_format(confidence: bool = False) -> Dict[str, Any]:
+    """`CENSUS_RESPONSE_FORMAT`, optionally with a required 1-10 `confidence`."""
+    if not confidence:
+        return CENSUS_RESPONSE_FORMAT
+    response_format = json.loads(json.dumps(CENSUS_RESPONSE_FORMAT))
+    schema = response_format["json_schema"]["schema"]
+    schema["properties"]["confidence"] = {"type": "integer", "enum": list(range(1, 11))}
+    schema["required"].append("confidence")
+    return response_format
+
+
+CENSUS_RATING_LINE = re.compile(r"^\s*\**rating\**:\**\s*(\d+)[ \t]*(\n?)", re.MULTILINE | re.IGNORECASE)
+CENSUS_REASONS_LINE = re.compile(r"^\s*\**reasons\**:\**[ \t]*([^\n]*)(\n?)", re.MULTILINE | re.IGNORECASE)
+CENSUS_CONFIDENCE_LINE = re.compile(r"^\s*\**confidence\**:\**\s*(\d+)[^\n]*(\n?)", re.MULTILINE | re.IGNORECASE)
+
+
+def _reason_codes(line: str) -> List[str]:
+    return [code.strip().strip("*") for code in line.split(",") if code.strip()]
+
+
+def census_answer_complete(text: str, confidence: bool = False) -> bool:
+    """Whether a partial census response already holds a valid rating and reason list.
+
+    Plain-text answers are complete once the rating line has ended with a
+    rating of 1-10 and the reasons line has ended holding only valid codes
+    (a line still being received may be cut mid-word), followed by an ended
+    confidence line if `confidence`. JSON answers are complete once they parse.
+    Used with `LLMBackend.generate_until` to stop reading verbose responses.
+    """
+    if text.lstrip().startswith("{"):
+        try:
+            answer = json.loads(text)
+        except ValueError:
+            return False
+        return (isinstance(answer, dict) and "rating" in answer and "reasons" in answer
+                and (not confidence or "confidence" in answer))
+    rating = CENSUS_RATING_LINE.search(text)
+    if rating is None or not rating.group(2) or not 1 <= int(rating.group(1)) <= 10:
+        return False
+    reasons = CENSUS_REASONS_LINE.search(text, rating.end())
+    if reasons is None:
+        return False
+    codes = _reason_codes(reasons.group(1))
+    if not codes or any(code not in REASON_CODES for code in codes) or not reasons.group(2):
+        return False
+    if not confidence:
+        return True
+    line = CENSUS_CONFIDENCE_LINE.search(text, reasons.end())
+    return line is not None and bool(line.group(2))
+
+
+def census_scenarios_complete(labels: List[str]) -> Callable[[str], bool]:
+    """Completeness check for a multi-scenario response covering `labels`."""
+    def is_complete(text: str) -> bool:
+        blocks = parse_scenario_blocks(text)
+        return all(label in blocks and census_answer_complete(blocks[label]) for label in labels)
+    return is_complete
+
+
+def census_check(min_confidence: Optional[float] = None,
+                 labels: Optional[List[str]] = None) -> Callable[[str], Optional[str]]:
+    """Escalation check of census responses for `LLMBackend.generate_checked`.
+
+    The check returns `parse_failure` without a rating of 1-10,
+    `invalid_reasons` without reason codes or with unknown ones, and
+    `low_confidence` when `min_confidence` is set and the answer's confidence
+    is missing or lower. With `labels`, every scenario block must pass.
+    """
+    def check_answer(text: str) -> Optional[str]:
+        if text.lstrip().startswith("{"):
+            try:
+                answer = json.loads(text)
+            except ValueError:
+                return "parse_failure"
+            if not isinstance(answer, dict):
+                return "parse_failure"
+            rating, codes, confidence = answer.get("rating"), answer.get("reasons"), answer.get("confidence")
+            if not isinstance(codes, list):
+                codes = []
+        else:
+            match = CENSUS_RATING_LINE.search(text)
+            rating = int(match.group(1)) if match else None
+            match = CENSUS_REASONS_LINE.search(text)
+            codes = _reason_codes(match.group(1)) if match else []
+            match = CENSUS_CONFIDENCE_LINE.search(text)
+            confidence = int(match.group(1)) if match else None
+        if not isinstance(rating, int) or not 1 <= rating <= 10:
+            return "parse_failure"
+        if not codes or any(code not in REASON_CODES for code in codes):
+            return "invalid_reasons"
+        if min_confidence is not None and (not isinstance(confidence, int) or confidence < min_confidence):
+            return "low_confidence"
+        return None
+
+    def check(text: str) -> Optional[str]:
+        if labels is None:
+            return check_answer(text)
+        blocks = parse_scenario_blocks(text)
+        for label in labels:
+            reason = check_answer(blocks[label]) if label in blocks else "parse_failure"
+            if reason is not None:
+                return reason
+        return None
+    return check
@@ -2,6 +2,7 @@ from typing import Dict, Any
 import random
 
 from ..base import BaseModel, ModelConfig
+from ..proposal import as_proposal
 
 class TemplateModel(BaseModel):
     """Template for opinion simulation model implementation"""
@@ -24,14 +25,16 @@ class TemplateModel(BaseModel):
         Returns:
             Opinion distribution summary with agent details
         """
+        # Normalize key aliases once; the proposal caches cell centroids for lookups
+        proposal = as_proposal(proposal)
+        
         # Get grid bounds from proposal
-        grid_bounds = (proposal.get("grid_config", {})
-                      .get("bounds", {
-                          "north": 37.8120,
-                          "south": 37.7080,
-                          "east": -122.3549,
-                          "west": -122.5157
-                      }))
+        grid_bounds = proposal.bounds or {
+            "north": 37.8120,
+            "south": 37.7080,
+            "east": -122.3549,
+            "west": -122.5157
+        }
         
         # Generate sample agents
         agents = []
@@ -60,18 +63,7 @@ class TemplateModel(BaseModel):
             lng = random.uniform(grid_bounds["west"], grid_bounds["east"])
             
             # Find nearest cell
-            nearest_cell_id = None
-            min_distance = float('inf')
-            
-            for cell_id, cell in proposal['cells'].items():
-                bbox = cell['bbox']
-                cell_lat = (bbox['north'] + bbox['south']) / 2
-                cell_lng = (bbox['east'] + bbox['west']) / 2
-                
-                distance = ((lat - cell_lat) ** 2 + (lng - cell_lng) ** 2) ** 0.5
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_cell_id = cell_id
+            nearest_cell_id, _, _ = proposal.nearest_cell(lat, lng)
             
             # Generate random age based on weights
             ranges, weights = zip(*[(r[:2], r[2]) for r in demographics["age_ranges"]])
@@ -1,5 +1,5 @@
 import random
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 class AgentGenerator:
     """Generate agents with random coordinates and demographics"""
@@ -25,43 +25,46 @@ class AgentGenerator:
             (65, 85, 0.10)   # 10% probability
         ]
     
-    def _generate_random_age(self) -> int:
+    def _generate_random_age(self, rng=random) -> int:
         """
         Generate a random age based on demographic distribution
         Returns an integer age between 18 and 85
         """
         # Choose an age range based on weights
         ranges, weights = zip(*[(r[:2], r[2]) for r in self.age_ranges])
-        selected_range = random.choices(ranges, weights=weights)[0]
+        selected_range = rng.choices(ranges, weights=weights)[0]
         
         # Generate a random age within the selected range
-        return random.randint(selected_range[0], selected_range[1])
+        return rng.randint(selected_range[0], selected_range[1])
 
-    def generate_agents(self, num_agents: int, grid_bounds: Dict[str, float]) -> List[Dict[str, Any]]:
+    def generate_agents(self, num_agents: int, grid_bounds: Dict[str, float],
+                        seed: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Generate agents with random coordinates and demographics
         
         Args:
             num_agents: Number of agents to generate
             grid_bounds: Grid boundaries (north, south, east, west)
+            seed: Seed for a reproducible population (same seed, size and bounds give the same agents)
             
         Returns:
             List of agent dictionaries
         """
+        rng = random.Random(seed) if seed is not None else random
         agents = []
         for i in range(num_agents):
             # Generate random coordinates within bounds
-            lat = random.uniform(grid_bounds["south"], grid_bounds["north"])
-            lng = random.uniform(grid_bounds["west"], grid_bounds["east"])
+            lat = rng.uniform(grid_bounds["south"], grid_bounds["north"])
+            lng = rng.uniform(grid_bounds["west"], grid_bounds["east"])
             
             # Generate random demographics
             demographics = {
-                attr: random.choice(options)
+                attr: rng.choice(options)
                 for attr, options in self.demographic_options.items()
             }
             
             # Generate specific age
-            demographics["age"] = self._generate_random_age()
+            demographics["age"] = self._generate_random_age(rng)
             
             agents.append({
                 "id": i,
@@ -1,9 +1,17 @@
 import json
 import random
 from pathlib import Path
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, AsyncIterator, Optional
 
 from ..base import BaseModel, ModelConfig
+from ..incremental import AgentIndex, affected_agents
+from ..llm_backends import create_llm
+from ..prompts import BoundPrompt, PromptTemplate
+from ..proposal import Proposal, as_proposal
+from ..metrics import FALLBACKS
+from ..sampling import sampling_from_config
+from ..surrogate import SurrogateRouter
+from ..tracing import tracer
 from .components.llm import OpenAILLM
 from .components.agent_generator import AgentGenerator
 
@@ -15,82 +23,154 @@ DEFAULT_GRID_BOUNDS = {
     "west": -122.5157
 }
 
+# Agent attributes defining demographic strata in stratified sampling
+DEFAULT_STRATA = ["income_level"]
+
+# Instructions first, then the proposal, then the resident and their nearest
+# rezoning area, so prompts share everything but the agent as a cacheable prefix
+OPINION_PROMPT = PromptTemplate(
+    "stupid",
+    static="""Given a rezoning proposal and a resident's information, generate their opinion and a brief comment.
+
+Consider how the height limit change and distance from the rezoning area might affect the resident's daily life, property value, and community character.
+
+Generate:
+1. Opinion (support/oppose/neutral)
+2. A brief comment explaining their stance (1-2 sentences)
+3. Key themes in the comment (2-3 keywords)
+
+Format: opinion|comment|theme1,theme2,theme3
+
+""",
+    proposal="""Proposal Details:
+- Default Height Limit: {default_height} feet
+""",
+    agent="""- Nearest Rezoning Area: A {category} zone with height limit changed to {height_limit} feet
+- Distance from Resident: {distance:.4f} degrees (approximately {distance_km:.1f} km)
+
+Resident Information:
+- Location: ({lat}, {lng})
+- Age: {age}
+- Income: {income}
+- Education: {education}
+- Occupation: {occupation}
+- Gender: {gender}"""
+)
+
 class StupidAgentModel(BaseModel):
     """A simple model using OpenAI API and random coordinates"""
     
     def __init__(self, config: ModelConfig = None):
         """Initialize model components"""
         super().__init__(config)
-        self.llm = OpenAILLM()
+        self.llm = create_llm(self.config, OpenAILLM)
         self.agent_generator = AgentGenerator()
+        # Seed for a fixed agent population (required for incremental re-simulation)
+        self.agent_seed = getattr(self.config, "agent_seed", None)
+        # Optional surrogate answering confident agents without an LLM call
+        self.surrogate = SurrogateRouter.from_config(self.config, "opinion")
+        # Optional agent sampling (stratified or early stopping)
+        self.sampling = sampling_from_config(self.config, DEFAULT_STRATA)
+        # Prompt with the instructions and the current proposal rendered (see models.prompts)
+        self._bound_prompt: Optional[BoundPrompt] = None
+        # Random fallback opinions so far; their answers are not compared with the surrogate
+        self._fallbacks = 0
     
     async def simulate_opinions(self,
                               region: str,
                               proposal: Dict[str, Any]) -> Dict[str, Any]:
         """Simulate opinions using OpenAI and random coordinates"""
-        # Get grid bounds from proposal or use defaults
-        grid_bounds = (proposal.get("grid_config", {})
-                      .get("bounds", DEFAULT_GRID_BOUNDS))
+        agents = []
+        themes = []
+        async for agent, agent_themes in self._iter_agent_opinions(proposal):
+            agents.append(agent)
+            themes.append(agent_themes)
+            self._agent_done(agent)
+        return self._summarize(agents, themes)
+    
+    async def resimulate_opinions(self,
+                                  region: str,
+                                  proposal: Dict[str, Any],
+                                  previous_proposal: Dict[str, Any],
+                                  previous_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Re-simulate only the agents an edit affects, reusing the others' previous answers.
         
-        # Generate agents with random coordinates
-        raw_agents = self.agent_generator.generate_agents(
-            num_agents=self.config.population,
-            grid_bounds=grid_bounds
-        )
+        The prompt only depends on an agent's nearest cell, so agents whose
+        nearest cell is unchanged (see `models.incremental`) keep their entry
+        from `previous_result`. Needs a fixed population (`agent_seed`) and
+        falls back to a full run when the previous result does not match the
+        population, or with sampling or a surrogate. Key themes of reused
+        agents are not stored per agent, so the previous key themes are kept.
+        """
+        proposal = as_proposal(proposal)
+        previous_comments = previous_result.get("comments", [])
+        raw_agents = None
+        if self.agent_seed is not None and self.sampling is None and self.surrogate is None:
+            with tracer.span("agent_generation"):
+                raw_agents = self.agent_generator.generate_agents(
+                    num_agents=self.config.population,
+                    grid_bounds=proposal.bounds or DEFAULT_GRID_BOUNDS,
+                    seed=self.agent_seed
+                )
+        if raw_agents is None or len(previous_comments) != len(raw_agents) or any(
+                comment.get("location") != raw_agent["coordinates"]
+                for comment, raw_agent in zip(previous_comments, raw_agents)):
+            result = await self.simulate_opinions(region, proposal)
+            self.run_report["incremental"] = {"agents": len(result["comments"]), "resimulated": len(result["comments"]),
+                                              "reused": 0}
+            return result
         
-        # Generate opinions and comments using OpenAI
+        with tracer.span("affected_agents"):
+            index = AgentIndex([a["coordinates"]["lat"] for a in raw_agents],
+                               [a["coordinates"]["lng"] for a in raw_agents])
+            affected = affected_agents(previous_proposal, proposal, index,
+                                       [comment.get("cell_id") for comment in previous_comments])
+        
+        self.run_report = {}
+        self._bound_prompt = None
         agents = []
+        themes = []
+        previous_themes = previous_result.get("key_themes", {})
+        for i, raw_agent in enumerate(raw_agents):
+            if not affected[i]:
+                agents.append(dict(previous_comments[i]))
+                opinion = previous_comments[i]["opinion"]
+                themes.append(previous_themes.get(opinion, []))
+                continue
+            opinion, comment, agent_themes = await self._generate_opinion_and_comment(raw_agent, proposal)
+            agents.append(self._comment_entry(i, raw_agent, self._convert_agent(raw_agent["agent"]),
+                                              proposal, opinion, comment))
+            themes.append(agent_themes)
+        
+        resimulated = int(affected.sum())
+        self.run_report["incremental"] = {"agents": len(agents), "resimulated": resimulated,
+                                          "reused": len(agents) - resimulated}
+        self._report_prompt()
+        self._report_cascade()
+        return self._summarize(agents, themes)
+    
+    def _summarize(self, agents: List[Dict[str, Any]], themes: List[List[str]]) -> Dict[str, Any]:
+        """Response with opinion counts and key themes for a list of comment entries."""
         opinion_counts = {"support": 0, "oppose": 0, "neutral": 0}
         key_themes = {
             "support": set(),
             "oppose": set()
         }
-        
-        for i, raw_agent in enumerate(raw_agents):
-            opinion, comment, themes = await self._generate_opinion_and_comment(raw_agent, proposal)
+        for agent, agent_themes in zip(agents, themes):
+            opinion = agent["opinion"]
             opinion_counts[opinion] += 1
             
-            # Find nearest cell
-            agent_lat = raw_agent['coordinates']['lat']
-            agent_lng = raw_agent['coordinates']['lng']
-            nearest_cell = None
-            min_distance = float('inf')
-            nearest_cell_id = None
-            
-            for cell_id, cell in proposal['cells'].items():
-                bbox = cell['bbox']
-                cell_lat = (bbox['north'] + bbox['south']) / 2
-                cell_lng = (bbox['east'] + bbox['west']) / 2
-                
-                distance = ((agent_lat - cell_lat) ** 2 + (agent_lng - cell_lng) ** 2) ** 0.5
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_cell = cell
-                    nearest_cell_id = cell_id
-            
-            # Convert agent format to match ground truth
-            agent = {
-                "id": i + 1,
-                "agent": {
-                    "age": self._convert_age(raw_agent["agent"]["age"]),
-                    "income_level": self._convert_income(raw_agent["agent"]["income"]),
-                    "education_level": self._convert_education(raw_agent["agent"]["education"]),
-                    "occupation": self._convert_occupation(raw_agent["agent"]["occupation"]),
-                    "gender": raw_agent["agent"]["gender"]
-                },
-                "location": {
-                    "lat": raw_agent["coordinates"]["lat"],
-                    "lng": raw_agent["coordinates"]["lng"]
-                },
-                "cell_id": nearest_cell_id,
-                "opinion": opinion,
-                "comment": comment
+            # Collect themes (only support/oppose themes are reported)
+            if agent_themes and opinion in key_themes:
+                key_themes[opinion].update(agent_themes)
+        
+        # A sampled run reports estimated population counts instead of sample counts
+        if self.sampling is not None and self.sampling.name in self.run_report:
+            distribution = self.run_report[self.sampling.name].get("distribution", {})
+            opinion_counts = {
+                opinion: round(distribution.get(opinion, {}).get("estimate", 0.0) * self.config.population)
+                for opinion in opinion_counts
             }
-            agents.append(agent)
-            
-            # Collect themes
-            if themes:
-                key_themes[opinion].update(themes)
         
         # Return results with raw counts
         return {
@@ -102,6 +182,125 @@ class StupidAgentModel(BaseModel):
             }
         }
     
+    async def stream_opinions(self,
+                              region: str,
+                              proposal: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield each agent's comment entry as soon as its opinion is generated"""
+        async for agent, _ in self._iter_agent_opinions(proposal):
+            yield agent
+    
+    async def _iter_agent_opinions(self, proposal: Dict[str, Any]) -> AsyncIterator[Tuple[Dict[str, Any], List[str]]]:
+        """Generate agents and yield (comment entry, themes) one agent at a time"""
+        proposal = as_proposal(proposal)
+        self.run_report = {}
+        self._bound_prompt = None
+        
+        # Get grid bounds from proposal or use defaults
+        grid_bounds = proposal.bounds or DEFAULT_GRID_BOUNDS
+        
+        # Generate agents with random coordinates
+        with tracer.span("agent_generation"):
+            raw_agents = self.agent_generator.generate_agents(
+                num_agents=self.config.population,
+                grid_bounds=grid_bounds,
+                seed=self.agent_seed
+            )
+        
+        # The surrogate and the strata see agents in the converted form logged in outputs
+        records = [{"agent": self._convert_agent(raw_agent["agent"]), "coordinates": raw_agent["coordinates"]}
+                   for raw_agent in raw_agents]
+        plan = None
+        if self.surrogate is not None:
+            with tracer.span("surrogate"):
+                plan = self.surrogate.plan(proposal, records)
+        
+        # Agents are simulated in batches; sampling modes choose each batch from the answers so far
+        sampler = None
+        batches = [range(len(raw_agents))]
+        if self.sampling is not None:
+            with tracer.span("sampling"):
+                sampler = self.sampling.sampler(proposal, records, numeric=False)
+            batches = sampler.batches()
+        
+        # Generate opinions and comments using OpenAI
+        for batch in batches:
+            for i in batch:
+                raw_agent = raw_agents[i]
+                if plan is not None and not plan.routes_to_llm(i):
+                    opinion, _ = plan.answer(i)
+                    comment, themes = "", []
+                else:
+                    fallbacks = self._fallbacks
+                    opinion, comment, themes = await self._generate_opinion_and_comment(raw_agent, proposal)
+                    if plan is not None and self._fallbacks == fallbacks:
+                        plan.record(i, opinion)
+                if sampler is not None:
+                    sampler.record(i, opinion, themes)
+                
+                agent = self._comment_entry(i, raw_agent, records[i]["agent"], proposal, opinion, comment)
+                yield agent, themes
+        
+        if plan is not None:
+            self.run_report["surrogate"] = plan.report()
+        if sampler is not None:
+            self.run_report[self.sampling.name] = sampler.report()
+        self._report_prompt()
+        self._report_cascade()
+    
+    def _comment_entry(self, index: int, raw_agent: Dict[str, Any], agent: Dict[str, Any],
+                       proposal: Proposal, opinion: str, comment: str) -> Dict[str, Any]:
+        """Comment entry for a generated agent and its opinion"""
+        # Find nearest cell
+        agent_lat = raw_agent['coordinates']['lat']
+        agent_lng = raw_agent['coordinates']['lng']
+        
+        with tracer.span("nearest_cell"):
+            nearest_cell_id, nearest_cell, min_distance = proposal.nearest_cell(agent_lat, agent_lng)
+        
+        # Convert agent format to match ground truth
+        return {
+            "id": index + 1,
+            "agent": agent,
+            "location": {
+                "lat": raw_agent["coordinates"]["lat"],
+                "lng": raw_agent["coordinates"]["lng"]
+            },
+            "cell_id": nearest_cell_id,
+            "opinion": opinion,
+            "comment": comment
+        }
+    
+    def _prompt_for(self, proposal: Proposal) -> BoundPrompt:
+        """Opinion prompt with the instructions and `proposal` rendered, reused for every agent"""
+        if self._bound_prompt is None or self._bound_prompt.context["default_height"] != proposal.default_height:
+            self._bound_prompt = OPINION_PROMPT.bind(default_height=proposal.default_height)
+        return self._bound_prompt
+    
+    def _report_prompt(self) -> None:
+        """Record the cacheable prompt prefix of the latest simulation in its run report"""
+        if self._bound_prompt is not None and self._bound_prompt.renders:
+            self.run_report["prompt"] = self._bound_prompt.report()
+    
+    @staticmethod
+    def _check_response(response: str) -> Optional[str]:
+        """Reason to escalate a response to a stronger model (see models.cascade), or None"""
+        parts = response.strip().split("|")
+        if len(parts) < 2:
+            return "parse_failure"
+        if parts[0].strip().lower() not in {"support", "oppose", "neutral"}:
+            return "invalid_opinion"
+        return None
+    
+    def _convert_agent(self, agent: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert generated agent attributes to the ground truth format"""
+        return {
+            "age": self._convert_age(agent["age"]),
+            "income_level": self._convert_income(agent["income"]),
+            "education_level": self._convert_education(agent["education"]),
+            "occupation": self._convert_occupation(agent["occupation"]),
+            "gender": agent["gender"]
+        }
+    
     def _convert_age(self, age: int) -> int:
         """Convert age format"""
         # age is already an integer from agent_generator
@@ -140,67 +339,53 @@ class StupidAgentModel(BaseModel):
         }
         return occupation_map.get(occupation, "white_collar")
     
-    async def _generate_opinion_and_comment(self, agent: Dict[str, Any], proposal: Dict[str, Any]) -> Tuple[str, str, List[str]]:
+    async def _generate_opinion_and_comment(self, agent: Dict[str, Any], proposal: Proposal) -> Tuple[str, str, List[str]]:
         """Generate opinion and comment for an agent using OpenAI"""
         # 找到最近的 cell
         agent_lat = agent['coordinates']['lat']
         agent_lng = agent['coordinates']['lng']
-        nearest_cell = None
-        min_distance = float('inf')
         
-        for cell_id, cell in proposal['cells'].items():
-            bbox = cell['bbox']
-            cell_lat = (bbox['north'] + bbox['south']) / 2
-            cell_lng = (bbox['east'] + bbox['west']) / 2
-            
-            distance = ((agent_lat - cell_lat) ** 2 + (agent_lng - cell_lng) ** 2) ** 0.5
-            if distance < min_distance:
-                min_distance = distance
-                nearest_cell = cell
-
-        prompt = f"""Given a rezoning proposal and a resident's information, generate their opinion and a brief comment.
+        with tracer.span("nearest_cell"):
+            _, nearest_cell, min_distance = proposal.nearest_cell(agent_lat, agent_lng)
 
-Proposal Details:
-- Nearest Rezoning Area: A {nearest_cell['category']} zone with height limit changed to {nearest_cell['height_limit']} feet
-- Distance from Resident: {min_distance:.4f} degrees (approximately {min_distance * 111:.1f} km)
-- Default Height Limit: {proposal['height_limits']['default']} feet
-
-Resident Information:
-- Location: ({agent['coordinates']['lat']}, {agent['coordinates']['lng']})
-- Age: {agent['agent']['age']}
-- Income: {agent['agent']['income']}
-- Education: {agent['agent']['education']}
-- Occupation: {agent['agent']['occupation']}
-- Gender: {agent['agent']['gender']}
-
-Consider how the height limit change and distance from the rezoning area might affect the resident's daily life, property value, and community character.
+        with tracer.span("prompt_build"):
+            prompt = self._prompt_for(proposal).render(
+                category=nearest_cell['category'],
+                height_limit=nearest_cell['heightLimit'],
+                distance=min_distance,
+                distance_km=min_distance * 111,
+                lat=agent['coordinates']['lat'],
+                lng=agent['coordinates']['lng'],
+                **agent['agent']
+            )
 
-Generate:
-1. Opinion (support/oppose/neutral)
-2. A brief comment explaining their stance (1-2 sentences)
-3. Key themes in the comment (2-3 keywords)
-
-Format: opinion|comment|theme1,theme2,theme3"""
-
-        response = await self.llm.generate(prompt)
-        try:
-            parts = response.strip().split("|")
-            if len(parts) >= 3:
-                opinion, comment, themes = parts[:3]
-                themes = [theme.strip() for theme in themes.split(",")]
-            else:
-                opinion, comment = parts[:2]
-                themes = []
+        with tracer.span("llm_wait"):
+            response = await self.llm.generate_checked(prompt, self._check_response)
+        with tracer.span("parse"):
+            try:
+                parts = response.strip().split("|")
+                if len(parts) >= 3:
+                    opinion, comment, themes = parts[:3]
+                    themes = [theme.strip() for theme in themes.split(",")]
+                else:
+                    opinion, comment = parts[:2]
+                    themes = []
             
-            opinion = opinion.strip().lower()
+                opinion = opinion.strip().lower()
             
-            # Validate opinion
-            if opinion not in {"support", "oppose", "neutral"}:
-                opinion = random.choice(["support", "oppose", "neutral"])
+                # Validate opinion
+                if opinion not in {"support", "oppose", "neutral"}:
+                    tracer.count("fallbacks")
+                    FALLBACKS.inc(model=type(self).__name__)
+                    self._fallbacks += 1
+                    opinion = random.choice(["support", "oppose", "neutral"])
             
-            return opinion, comment.strip(), themes
-        except Exception as e:
-            # Fallback to random opinion if LLM response is invalid
-            opinion = random.choice(["support", "oppose", "neutral"])
-            comment = f"Error processing response: {str(e)}"
-            return opinion, comment, [] 
\ No newline at end of file
+                return opinion, comment.strip(), themes
+            except Exception as e:
+                # Fallback to random opinion if LLM response is invalid
+                tracer.count("fallbacks")
+                FALLBACKS.inc(model=type(self).__name__)
+                self._fallbacks += 1
+                opinion = random.choice(["support", "oppose", "neutral"])
+                comment = f"Error processing response: {str(e)}"
+                return opinion, comment, [] 
\ No newline at end of file
@@ -1,21 +1,35 @@
 import os
-from openai import AsyncOpenAI
-from typing import Optional
-from dotenv import load_dotenv
+from typing import Dict, Any, Optional, AsyncIterator
 
-# Load environment variables from .env file
-load_dotenv(override=True)
+from ...llm_backends import LLMBackend
+from ...metrics import LLM_TOKENS
+from ...tracing import tracer
 
-class OpenAILLM:
+
+class OpenAILLM(LLMBackend):
     """Simple OpenAI LLM wrapper"""
     
+    # Structured outputs: `response_format` with a JSON schema
+    supports_response_format = True
+    
     def __init__(self, model: str = "gpt-3.5-turbo"):
         """Initialize OpenAI client"""
+        # Imported on first use so importing a model does not load the OpenAI SDK
+        from dotenv import load_dotenv
+        from openai import AsyncOpenAI
+        
+        # Load environment variables from .env file
+        load_dotenv(override=True)
+        
         self.model = model
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         self.client = AsyncOpenAI(api_key=api_key)
+        # Tokens reported by the API over the wrapper's lifetime (e.g. for cascade costs),
+        # plus the calls and characters of streams closed before their usage chunk
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0,
+                      "unreported_calls": 0, "unreported_prompt_chars": 0, "unreported_completion_chars": 0}
     
     async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
         """
@@ -24,6 +38,7 @@ class OpenAILLM:
         Args:
             prompt: Input prompt
             max_tokens: Optional maximum number of tokens to generate
+            temperature: Sampling temperature
             
         Returns:
             Generated text
@@ -35,6 +50,73 @@ class OpenAILLM:
                 max_tokens=max_tokens,
                 temperature=temperature
             )
+            self._record_usage(response.usage)
             return response.choices[0].message.content.strip()
         except Exception as e:
-            raise RuntimeError(f"OpenAI API error: {str(e)}") 
\ No newline at end of file
+            raise RuntimeError(f"OpenAI API error: {str(e)}")
+    
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7,
+                     response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Stream text using OpenAI API
+        
+        Closing the generator closes the HTTP stream, which stops generation
+        (and billing) of the remaining tokens. Token usage is only reported at
+        the end of a stream, so streams closed early are counted in `usage`
+        as unreported calls with their prompt and received characters.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Optional maximum number of tokens to generate
+            temperature: Sampling temperature
+            response_format: Optional `response_format`, e.g. a JSON schema
+            
+        Yields:
+            Text deltas
+        """
+        options = {"response_format": response_format} if response_format else {}
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+                **options
+            )
+        except Exception as e:
+            raise RuntimeError(f"OpenAI API error: {str(e)}")
+        reported = False
+        received = 0
+        try:
+            async for chunk in response:
+                if chunk.usage is not None:
+                    self._record_usage(chunk.usage)
+                    reported = True
+                if chunk.choices and chunk.choices[0].delta.content:
+                    received += len(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            if not reported:
+                self.usage["unreported_calls"] += 1
+                self.usage["unreported_prompt_chars"] += len(prompt)
+                self.usage["unreported_completion_chars"] += received
+            await response.close()
+    
+    def _record_usage(self, usage: Any) -> None:
+        """Count the prompt, completion and cached prompt tokens of a response"""
+        if usage is None:
+            return
+        self.usage["prompt_tokens"] += usage.prompt_tokens
+        self.usage["completion_tokens"] += usage.completion_tokens
+        tracer.count("prompt_tokens", usage.prompt_tokens)
+        tracer.count("completion_tokens", usage.completion_tokens)
+        LLM_TOKENS.inc(usage.prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens, kind="completion")
+        # Prompt tokens served from the provider's prefix cache (see models/prompts.py)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if cached:
+            tracer.count("cached_prompt_tokens", cached)
+            LLM_TOKENS.inc(cached, kind="cached_prompt") 
\ No newline at end of file
@@ -1,12 +1,28 @@
 import json
+import logging
 import os
 import random
 from pathlib import Path
-from typing import Dict, Any, Tuple, List, Optional
+from typing import Dict, Any, Tuple, List, Optional, AsyncIterator, Callable
 
+import numpy as np
+
+from ..archetypes import ArchetypeClustering
 from ..base import BaseModel, ModelConfig
+from ..llm_backends import (
+    census_answer_complete, census_check, census_response_format, census_scenarios_complete, create_llm,
+    format_census_response, parse_scenario_blocks
+)
+from ..metrics import FALLBACKS
+from ..prompts import BoundPrompt, PromptTemplate
+from ..proposal import Proposal, as_proposal
+from ..sampling import sampling_from_config
+from ..surrogate import SurrogateRouter
+from ..tracing import tracer
 from .components.llm import OpenAILLM
 
+logger = logging.getLogger(__name__)
+
 # Default grid bounds (San Francisco area)
 DEFAULT_GRID_BOUNDS = {
     "north": 37.8120,
@@ -44,6 +60,111 @@ SCENARIO_MAPPING = {
     "proposal_008": "3.3"
 }
 
+# Agent attributes defining demographic strata in stratified sampling
+DEFAULT_STRATA = ["householder type"]
+
+# Instructions shared by the single- and multi-scenario prompts
+CONSIDERATIONS = """Consider how {subject} might affect:
+- Housing availability and affordability 
+- Neighborhood character and livability
+- Infrastructure and public services
+- Economic development and property values
+- Environmental impact
+- Equity and displacement issues
+"""
+REASON_CODES_TEXT = "\n".join(f"{code}: {reason}" for reason, code in REASON_MAPPING.items())
+
+# Instructions of the single-scenario prompts
+OPINION_INSTRUCTIONS = """You will play a resident with the characteristics given at the end, rate their opinion on a proposed housing policy change and provide reasons for their stance.
+
+{considerations}
+Provide:
+1. A rating from 1-10 (where 1=strongly oppose, 5=neutral, 10=strongly support)
+2. 1-3 main reasons for your opinion using ONLY the codes below:
+
+Reason Codes:
+{reason_codes}
+
+Format your response EXACTLY as follows:
+{example}
+
+Remember to:
+- Use ONLY the letter codes provided (A through L)
+- Include 1-3 reason codes
+- Maintain the exact format specified
+{confidence_rule}
+"""
+
+# Static instructions first, then the proposal, then the resident, so every
+# prompt of a simulation shares everything but the resident as a cacheable prefix
+OPINION_PROMPT = PromptTemplate(
+    "census",
+    static=OPINION_INSTRUCTIONS,
+    proposal="""Housing Policy Proposal:
+{proposal}
+
+Resident of {region}:
+""",
+    agent="""- Age: {age}
+- Income: {income}
+- Occupation: {occupation}
+- Housing Status: {housing}
+- Transportation: {transportation}
+- Family Type: {family}
+""",
+    considerations=CONSIDERATIONS.format(subject="this proposal"),
+    reason_codes=REASON_CODES_TEXT,
+    example=format_census_response(7, ["A", "C", "D"]),
+    confidence_rule=""
+)
+
+# Asks for a self-reported confidence, which a model cascade escalates on (see models.cascade)
+CONFIDENCE_OPINION_PROMPT = PromptTemplate(
+    "census_confidence",
+    static=OPINION_INSTRUCTIONS,
+    proposal=OPINION_PROMPT.proposal,
+    agent=OPINION_PROMPT.agent,
+    considerations=CONSIDERATIONS.format(subject="this proposal"),
+    reason_codes=REASON_CODES_TEXT,
+    example=format_census_response(7, ["A", "C", "D"], confidence=8),
+    confidence_rule="- Add how confident you are (1-10) that this resident would answer this way\n"
+)
+
+SCENARIOS_PROMPT = PromptTemplate(
+    "census_scenarios",
+    static="""You will play a resident with the characteristics given at the end, rate their opinion on each of the proposed housing policy changes below and provide reasons for their stance. Judge each scenario on its own.
+
+{considerations}
+For EACH scenario provide:
+1. A rating from 1-10 (where 1=strongly oppose, 5=neutral, 10=strongly support)
+2. 1-3 main reasons for your opinion using ONLY the codes below:
+
+Reason Codes:
+{reason_codes}
+
+Remember to:
+- Answer every scenario listed
+- Use ONLY the letter codes provided (A through L)
+- Include 1-3 reason codes per scenario
+- Maintain the exact format specified
+
+""",
+    proposal="""Housing Policy Proposals:
+
+{proposals}
+
+Scenarios to rate: {labels}
+
+Format your response EXACTLY as follows, one block per scenario in the order listed:
+{example}
+
+Resident of {region}:
+""",
+    agent=OPINION_PROMPT.agent,
+    considerations=CONSIDERATIONS.format(subject="each proposal"),
+    reason_codes=REASON_CODES_TEXT
+)
+
 class Census(BaseModel):
     """A model that generates opinions using OpenAI API and agent data from a JSON file."""
     
@@ -54,7 +175,7 @@ class Census(BaseModel):
             config: Model configuration containing settings such as population and agent_data_file.
         """
         super().__init__(config)
-        self.llm = OpenAILLM()
+        self.llm = create_llm(self.config, OpenAILLM)
         
         # Get custom OpenAI parameters if provided
         self.temperature = getattr(self.config, "temperature", 0.7)
@@ -67,10 +188,48 @@ class Census(BaseModel):
             os.path.join(os.path.dirname(__file__), "census_data", "agents_37.json")
         )
         
-        print(f"DEBUG Census.__init__: agent_data_file={self.agent_data_file}")
+        logger.debug("Census.__init__: agent_data_file=%s", self.agent_data_file)
+        
+        # Optional surrogate answering confident agents without an LLM call
+        self.surrogate = SurrogateRouter.from_config(self.config, "rating")
+        # Optional agent sampling (stratified or early stopping)
+        self.sampling = sampling_from_config(self.config, DEFAULT_STRATA)
+        # Optional archetype mode: one LLM query per cluster of similar agents
+        self.archetypes = ArchetypeClustering.from_config(self.config)
+        if self.archetypes is not None and (self.sampling is not None or self.surrogate is not None):
+            raise ValueError("Archetypes cannot be combined with agent sampling or a surrogate")
+        self._archetype_clusters = None
+        
+        # Multi-scenario survey mode: run_experiment passes all proposals to simulate_scenarios
+        self.multi_scenario = getattr(self.config, "multi_scenario", False)
+        self.scenarios_per_call = getattr(self.config, "scenarios_per_call", len(SCENARIO_MAPPING))
+        if self.multi_scenario and (self.sampling or self.surrogate or self.archetypes):
+            raise ValueError("Multi-scenario mode cannot be combined with sampling, a surrogate or archetypes")
+        
+        # Streamed responses are closed once the rating and reasons are complete;
+        # structured output constrains single-scenario answers to a JSON schema
+        self.stream_responses = getattr(self.config, "stream_responses", False)
+        self.structured_output = getattr(self.config, "structured_output", False)
+        if self.structured_output and self.multi_scenario:
+            raise ValueError("Structured output is only available for single-scenario prompts")
+        if self.structured_output and not self.llm.supports_response_format:
+            logger.warning("LLM backend does not support structured output; falling back to text responses")
+        
+        # Optional model cascade (see models.cascade): single-scenario prompts ask for a
+        # confidence when it sets `min_confidence`, and answers failing the check escalate
+        self.min_confidence = (getattr(self.config, "cascade", None) or {}).get("min_confidence")
+        self._opinion_prompt = OPINION_PROMPT if self.min_confidence is None else CONFIDENCE_OPINION_PROMPT
+        self._check_answer = census_check(self.min_confidence)
+        if self.multi_scenario and self.min_confidence is not None:
+            logger.warning("cascade.min_confidence is ignored in multi-scenario mode: its prompts ask for no confidence")
         
         # Track which proposal we're currently processing (for scenario ID mapping)
         self.current_proposal_id = None
+        # Prompt with the instructions and the current proposal rendered (see models.prompts)
+        self._bound_prompt: Optional[BoundPrompt] = None
+        # Fallback answers so far (random, or the default rating when none was parsed);
+        # their ratings are not compared with the surrogate
+        self._fallbacks = 0
     
     async def simulate_opinions(self,
                                region: str,
@@ -98,70 +257,277 @@ class Census(BaseModel):
                 ...
             }
         """
+        results = {}
+        async for participant_id, opinion_data in self._iter_opinions(region, proposal):
+            results[participant_id] = opinion_data
+            self._agent_done({"id": participant_id, **opinion_data})
+        
+        logger.debug("Completed processing %d agents", len(results))
+        return results
+    
+    async def stream_opinions(self, region: str, proposal: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield {"id": participant_id, "opinions": ..., "reasons": ...} per agent as it completes."""
+        async for participant_id, opinion_data in self._iter_opinions(region, proposal):
+            yield {"id": participant_id, **opinion_data}
+    
+    async def _iter_opinions(self, region: str, proposal: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Simulate agents one at a time, yielding (participant_id, opinion_data)."""
+        proposal = as_proposal(proposal)
+        self.run_report = {}
+        self._bound_prompt = None
+        
         # Extract proposal ID from metadata if available
         self.current_proposal_id = proposal.get("proposal_id", None)
-        print(f"DEBUG simulate_opinions: Processing proposal_id={self.current_proposal_id}")
-        
-        # Extract grid bounds and height limits info
-        grid_bounds = proposal.get("gridConfig", {}).get("bounds", DEFAULT_GRID_BOUNDS)
-        height_limits = proposal.get("heightLimits", {})
+        logger.debug("simulate_opinions: processing proposal_id=%s", self.current_proposal_id)
         
         # Prepare readable description of the proposal
-        proposal_desc = self._create_proposal_description(proposal)
-        print(f"DEBUG: Generated proposal description: {proposal_desc[:100]}...")
+        with tracer.span("proposal_description"):
+            proposal_desc = self._create_proposal_description(proposal)
+        logger.debug("Generated proposal description: %.100s...", proposal_desc)
         
+        raw_agents = self._load_agents()
+        if raw_agents is None:
+            # Generate mock data for testing/debugging
+            for item in self._generate_mock_results().items():
+                yield item
+            return
+        
+        # Process each agent (limit to 3 for testing if needed)
+        # raw_agents = raw_agents[:3]  # Uncomment to process only 3 agents for testing
+        
+        scenario_id = SCENARIO_MAPPING.get(self.current_proposal_id, "1.1")
+        if self.archetypes is not None:
+            async for item in self._iter_archetype_opinions(raw_agents, proposal, proposal_desc, region, scenario_id):
+                yield item
+            self._report_prompt()
+            self._report_cascade()
+            return
+        
+        plan = None
+        if self.surrogate is not None:
+            with tracer.span("surrogate"):
+                plan = self.surrogate.plan(proposal, raw_agents)
+        
+        # Agents are simulated in batches; sampling modes choose each batch from the answers so far
+        sampler = None
+        batches = [range(len(raw_agents))]
+        if self.sampling is not None:
+            with tracer.span("sampling"):
+                sampler = self.sampling.sampler(proposal, raw_agents, numeric=True)
+            batches = sampler.batches()
+        
+        for batch in batches:
+            for i in batch:
+                raw_agent = raw_agents[i]
+                participant_id = self._participant_id(raw_agent, i)
+                logger.debug("Processing agent %d/%d: %s", i + 1, len(raw_agents), participant_id)
+                
+                if plan is not None and not plan.routes_to_llm(i):
+                    rating, reasons = plan.answer(i)
+                    opinion_data = {
+                        "opinions": {scenario_id: rating},
+                        "reasons": {scenario_id: reasons}
+                    }
+                else:
+                    # Generate opinion and reasons for this proposal
+                    fallbacks = self._fallbacks
+                    try:
+                        opinion_data = await self._generate_opinion(
+                            raw_agent, 
+                            proposal,
+                            proposal_desc,
+                            region
+                        )
+                    except Exception as e:
+                        logger.error("Failed to generate opinion for agent %s: %s", participant_id, e)
+                        # Generate fallback data for this agent
+                        opinion_data = self._generate_fallback_opinion(scenario_id)
+                    if plan is not None and self._fallbacks == fallbacks:
+                        plan.record(i, opinion_data["opinions"][scenario_id])
+                if sampler is not None:
+                    sampler.record(i, opinion_data["opinions"][scenario_id], opinion_data["reasons"][scenario_id])
+                yield participant_id, opinion_data
+        
+        if plan is not None:
+            self.run_report["surrogate"] = plan.report()
+            logger.info("Surrogate answered %d/%d agents locally (agreement with LLM: %s)",
+                        self.run_report["surrogate"]["answered_locally"], self.run_report["surrogate"]["agents"],
+                        self.run_report["surrogate"]["agreement"])
+        if sampler is not None:
+            report = self.run_report[self.sampling.name] = sampler.report()
+            mean = report.get("mean", {"estimate": float("nan"), "se": float("nan")})
+            logger.info("Simulated %d of %d agents with %s sampling (mean rating %.2f, SE %.2f)",
+                        len(sampler.values), len(raw_agents), self.sampling.name, mean["estimate"], mean["se"])
+        self._report_prompt()
+        self._report_cascade()
+    
+    def _report_prompt(self) -> None:
+        """Record the cacheable prompt prefix of the latest simulation in its run report."""
+        if self._bound_prompt is not None and self._bound_prompt.renders:
+            self.run_report["prompt"] = self._bound_prompt.report()
+    
+    def _load_agents(self) -> Optional[List[Dict[str, Any]]]:
+        """Load the agent data file, or return None if it is missing or unreadable."""
         # Verify agent_data_file exists
         if not os.path.exists(self.agent_data_file):
-            print(f"ERROR: Agent data file not found: {self.agent_data_file}")
-            # Generate mock data for testing/debugging
-            return self._generate_mock_results()
+            logger.error("Agent data file not found: %s", self.agent_data_file)
+            return None
         
         # Load agents from JSON file
-        print(f"DEBUG: Loading agents from: {self.agent_data_file}")
+        logger.debug("Loading agents from: %s", self.agent_data_file)
         try:
-            with open(self.agent_data_file, 'r', encoding='utf-8') as f:
+            with tracer.span("load_agents"), open(self.agent_data_file, 'r', encoding='utf-8') as f:
                 raw_agents = json.load(f)
             
-            print(f"DEBUG: Loaded {len(raw_agents)} agents")
+            logger.debug("Loaded %d agents", len(raw_agents))
         except Exception as e:
-            print(f"ERROR: Failed to load agents: {str(e)}")
-            # Generate mock data for testing/debugging
-            return self._generate_mock_results()
+            logger.error("Failed to load agents: %s", e)
+            return None
+        return raw_agents
+    
+    async def simulate_scenarios(self,
+                                 region: str,
+                                 proposals: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Ask every agent about several proposals at once (multi-scenario survey mode).
         
-        results = {}
+        Each agent gets one prompt listing up to `scenarios_per_call` scenarios
+        and answers with a rating and reasons per scenario, so a nine-scenario
+        survey costs one call per agent instead of nine. Scenarios missing from
+        a response fall back to random answers, as in `simulate_opinions`.
         
-        # Process each agent (limit to 3 for testing if needed)
-        # raw_agents = raw_agents[:3]  # Uncomment to process only 3 agents for testing
+        Args:
+            region: The target region name.
+            proposals: Proposals carrying their `proposal_id`.
         
+        Returns:
+            Proposal ID (`scenario_<index>` for proposals without one) -> output
+            in the `simulate_opinions` format.
+        """
+        self.run_report = {}
+        scenarios = []
+        for k, proposal in enumerate(proposals):
+            proposal = as_proposal(proposal)
+            # Proposals without an ID are keyed (and labelled) by position so scenarios stay distinct
+            proposal_id = proposal.get("proposal_id") or f"scenario_{k}"
+            with tracer.span("proposal_description"):
+                description = self._create_proposal_description(proposal)
+            # Label in the prompt (unique), and the key used in the output as in single-scenario runs
+            label = SCENARIO_MAPPING.get(proposal_id, proposal_id)
+            scenarios.append((proposal_id, label, SCENARIO_MAPPING.get(proposal_id, "1.1"), description))
+        
+        results = {proposal_id: {} for proposal_id, _, _, _ in scenarios}
+        raw_agents = self._load_agents()
+        if raw_agents is None:
+            for proposal_id, _, _, _ in scenarios:
+                self.current_proposal_id = proposal_id
+                results[proposal_id] = self._generate_mock_results()
+            return results
+        
+        # Everything but the resident is rendered once per chunk of scenarios
+        chunks = [scenarios[start:start + self.scenarios_per_call]
+                  for start in range(0, len(scenarios), self.scenarios_per_call)]
+        with tracer.span("prompt_build"):
+            prompts = [self._scenarios_prompt([(label, description) for _, label, _, description in chunk], region)
+                       for chunk in chunks]
+        
+        calls = 0
         for i, raw_agent in enumerate(raw_agents):
-            participant_id = raw_agent.get("id")
-            if not participant_id:
-                participant_id = f"agent_{i:03d}"
+            participant_id = self._participant_id(raw_agent, i)
+            logger.debug("Processing agent %d/%d: %s", i + 1, len(raw_agents), participant_id)
+            resident = self._resident_fields(raw_agent)
+            for chunk, chunk_prompt in zip(chunks, prompts):
+                with tracer.span("prompt_build"):
+                    prompt = chunk_prompt.render(**resident)
+                answers = {}
+                try:
+                    labels = [label for _, label, _, _ in chunk]
+                    with tracer.span("llm_wait"):
+                        response = await self._ask(
+                            prompt,
+                            self.temperature,
+                            census_scenarios_complete(labels),
+                            census_check(labels=labels)
+                        )
+                    calls += 1
+                    with tracer.span("parse"):
+                        answers = self._parse_scenarios_response(response)
+                except Exception as e:
+                    logger.error("Failed to generate opinions for agent %s: %s", participant_id, e)
                 
-            print(f"DEBUG: Processing agent {i+1}/{len(raw_agents)}: {participant_id}")
+                for proposal_id, label, scenario_id, _ in chunk:
+                    if label in answers:
+                        rating, reasons = answers[label]
+                        opinion_data = {"opinions": {scenario_id: rating}, "reasons": {scenario_id: reasons}}
+                    else:
+                        opinion_data = self._generate_fallback_opinion(scenario_id)
+                    results[proposal_id][participant_id] = opinion_data
+        
+        self.run_report["multi_scenario"] = {
+            "agents": len(raw_agents),
+            "scenarios": len(scenarios),
+            "llm_calls": calls
+        }
+        self.run_report["prompt"] = [chunk_prompt.report() for chunk_prompt in prompts]
+        self._report_cascade()
+        return results
+    
+    async def _iter_archetype_opinions(self,
+                                       raw_agents: List[Dict[str, Any]],
+                                       proposal: Proposal,
+                                       proposal_desc: str,
+                                       region: str,
+                                       scenario_id: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Query the LLM once (or `samples` times) per archetype and yield every member's assigned opinion."""
+        # Clusters depend only on the agents, so every proposal reuses them
+        with tracer.span("archetypes"):
+            if self._archetype_clusters is None or self._archetype_clusters[0] != self.agent_data_file:
+                self._archetype_clusters = (self.agent_data_file, self.archetypes.cluster(raw_agents))
+            clusters, representatives, cost = self._archetype_clusters[1]
+        temperature = self.archetypes.temperature if self.archetypes.temperature is not None else self.temperature
+        
+        summary = []
+        for cluster, representative in enumerate(representatives):
+            answers = []
+            for _ in range(self.archetypes.samples):
+                try:
+                    opinion_data = await self._generate_opinion(
+                        raw_agents[representative], proposal, proposal_desc, region, temperature=temperature
+                    )
+                except Exception as e:
+                    logger.error("Failed to generate opinion for archetype %d: %s", cluster, e)
+                    opinion_data = self._generate_fallback_opinion(scenario_id)
+                answers.append((opinion_data["opinions"][scenario_id], opinion_data["reasons"][scenario_id]))
             
-            # Generate opinion and reasons for this proposal
-            try:
-                opinion_data = await self._generate_opinion(
-                    raw_agent, 
-                    proposal,
-                    proposal_desc,
-                    region
-                )
-                results[participant_id] = opinion_data
-            except Exception as e:
-                print(f"ERROR: Failed to generate opinion for agent {participant_id}: {str(e)}")
-                # Generate fallback data for this agent
-                results[participant_id] = self._generate_fallback_opinion(
-                    SCENARIO_MAPPING.get(self.current_proposal_id, "1.1")
-                )
+            members = np.flatnonzero(clusters == cluster)
+            summary.append({
+                "representative": self._participant_id(raw_agents[representative], representative),
+                "size": len(members),
+                "ratings": [rating for rating, _ in answers]
+            })
+            for i, (rating, reasons) in zip(members, self.archetypes.assign(answers, len(members))):
+                yield self._participant_id(raw_agents[i], i), {
+                    "opinions": {scenario_id: rating},
+                    "reasons": {scenario_id: reasons}
+                }
         
-        print(f"DEBUG: Completed processing {len(results)} agents")
-        return results
+        self.run_report["archetypes"] = {
+            "agents": len(raw_agents),
+            "clusters": len(representatives),
+            "samples": self.archetypes.samples,
+            "llm_calls": len(representatives) * self.archetypes.samples,
+            "cost": cost,
+            "archetypes": summary
+        }
+        logger.info("Answered %d agents from %d archetypes", len(raw_agents), len(representatives))
+    
+    @staticmethod
+    def _participant_id(raw_agent: Dict[str, Any], index: int) -> str:
+        """Participant ID of an agent record, or a positional one if it has none."""
+        return raw_agent.get("id") or f"agent_{index:03d}"
     
     def _generate_mock_results(self) -> Dict[str, Any]:
         """Generate mock results for testing/debugging purposes."""
-        print("DEBUG: Generating mock results for testing")
+        logger.debug("Generating mock results for testing")
         
         scenario_id = SCENARIO_MAPPING.get(self.current_proposal_id, "1.1")
         results = {}
@@ -187,33 +553,33 @@ class Census(BaseModel):
     def _create_proposal_description(self, proposal: Dict[str, Any]) -> str:
         """Create a human-readable description of a rezoning proposal.
         
+        The description is computed once per proposal and cached on it.
+        
         Args:
-            proposal: A dictionary containing proposal details.
+            proposal: A dictionary (or `Proposal`) containing proposal details.
             
         Returns:
             A string describing the key elements of the proposal.
         """
-        # Extract basic information
-        height_limits = proposal.get("heightLimits", {})
-        default_height = height_limits.get("default", "varies")
-        grid_config = proposal.get("gridConfig", {})
-        cell_size = grid_config.get("cellSize", 100)
-        
-        # Count zones by category
-        cells = proposal.get("cells", {})
+        proposal = as_proposal(proposal)
+        return proposal.cached("census_description", self._describe_proposal)
+    
+    @staticmethod
+    def _describe_proposal(proposal: Proposal) -> str:
+        """Build the description text; cached on the proposal by `_create_proposal_description`."""
+        default_height = proposal.default_height
+        if default_height is None:
+            default_height = "varies"
+        cell_size = proposal.cell_size
+        cells = proposal.cells
+        
+        # Count zones by category and height
         zone_counts = {}
-        
-        try:
-            for cell_id, cell in cells.items():
-                category = cell.get("category", "unknown")
-                height = cell.get("heightLimit", default_height)
-                
-                key = f"{category}_{height}"
-                zone_counts[key] = zone_counts.get(key, 0) + 1
-        except Exception as e:
-            print(f"ERROR: Failed to count zones: {str(e)}")
-            # Return a simplified description if zone counting fails
-            return f"Rezoning proposal with {cell_size}m cells. Default height limit: {default_height} feet."
+        for (category, height), count in proposal.zone_histogram.items():
+            if height is None:
+                height = default_height
+            key = f"{category}_{height}"
+            zone_counts[key] = zone_counts.get(key, 0) + count
         
         # Create description
         desc = f"Rezoning proposal with {cell_size}m cells and {len(cells)} modified zones. "
@@ -239,7 +605,8 @@ class Census(BaseModel):
                               agent: Dict[str, Any], 
                               proposal: Dict[str, Any],
                               proposal_desc: str,
-                              region: str) -> Dict[str, Any]:
+                              region: str,
+                              temperature: Optional[float] = None) -> Dict[str, Any]:
         """Generate opinion and reasons for a proposal for a specific agent.
         
         Args:
@@ -247,6 +614,7 @@ class Census(BaseModel):
             proposal: A dictionary containing the rezoning proposal details.
             proposal_desc: A human-readable description of the proposal.
             region: The target region name.
+            temperature: Sampling temperature; defaults to the configured one.
             
         Returns:
             A dictionary with opinions and reasons.
@@ -256,31 +624,35 @@ class Census(BaseModel):
         if self.current_proposal_id and self.current_proposal_id in SCENARIO_MAPPING:
             scenario_id = SCENARIO_MAPPING[self.current_proposal_id]
         
-        print(f"DEBUG: Generating opinion for scenario_id={scenario_id}")
+        logger.debug("Generating opinion for scenario_id=%s", scenario_id)
         
         # Build prompt based on proposal and agent details
-        prompt = self._build_opinion_prompt(agent, proposal_desc, region)
-        print(f"DEBUG: Prompt length: {len(prompt)} characters")
+        with tracer.span("prompt_build"):
+            prompt = self._build_opinion_prompt(agent, proposal_desc, region)
+        logger.debug("Prompt length: %d characters", len(prompt))
         
         # Skip actual LLM call for testing if needed
         # return self._generate_fallback_opinion(scenario_id)
         
         # Generate response from LLM
         try:
-            response = await self.llm.generate(
-                prompt, 
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-            print(f"DEBUG: Received response of length {len(response)} characters")
+            with tracer.span("llm_wait"):
+                response = await self._ask(
+                    prompt,
+                    self.temperature if temperature is None else temperature,
+                    lambda text: census_answer_complete(text, confidence=self.min_confidence is not None),
+                    self._check_answer
+                )
+            logger.debug("Received response of length %d characters", len(response))
         except Exception as e:
-            print(f"ERROR: LLM generation failed: {str(e)}")
+            logger.error("LLM generation failed: %s", e)
             return self._generate_fallback_opinion(scenario_id)
         
         try:
             # Parse the response to extract rating and reasons
-            rating, reasons = self._parse_opinion_response(response)
-            print(f"DEBUG: Extracted rating={rating}, reasons={reasons}")
+            with tracer.span("parse"):
+                rating, reasons = self._parse_opinion_response(response)
+            logger.debug("Extracted rating=%s, reasons=%s", rating, reasons)
             
             # Format into the expected output structure
             return {
@@ -292,16 +664,44 @@ class Census(BaseModel):
                 }
             }
         except Exception as e:
-            print(f"ERROR: Failed to parse response: {str(e)}")
+            logger.error("Failed to parse response: %s", e)
             # Generate fallback random data
             return self._generate_fallback_opinion(scenario_id)
     
+    async def _ask(self,
+                   prompt: str,
+                   temperature: Optional[float],
+                   is_complete: Callable[[str], bool],
+                   check: Callable[[str], Optional[str]]) -> str:
+        """Query the LLM, streaming and stopping early if configured.
+        
+        Args:
+            prompt: The prompt for the LLM.
+            temperature: Sampling temperature.
+            is_complete: Whether a partial response already holds every answer.
+            check: Reason to escalate a response to a stronger model, or None (see models.cascade).
+            
+        Returns:
+            The response text.
+        """
+        return await self.llm.generate_checked(
+            prompt,
+            check,
+            temperature=temperature,
+            max_tokens=self.max_tokens,
+            is_complete=is_complete if self.stream_responses or self.structured_output else None,
+            response_format=census_response_format(self.min_confidence is not None) if self.structured_output else None
+        )
+    
     def _build_opinion_prompt(self, 
                              agent: Dict[str, Any], 
                              proposal_desc: str,
                              region: str) -> str:
         """Build a prompt for generating opinions on a housing policy proposal.
         
+        The instructions and the proposal are rendered once per proposal
+        (see `models.prompts`); only the resident section is formatted here.
+        
         Args:
             agent: A dictionary containing agent demographic data.
             proposal_desc: A human-readable description of the proposal.
@@ -310,63 +710,61 @@ class Census(BaseModel):
         Returns:
             A string containing the prompt for the LLM.
         """
-        # Handle possible different agent data formats
-        agent_data = {}
-        if "agent" in agent and isinstance(agent["agent"], dict):
-            agent_data = agent["agent"]
-        elif isinstance(agent, dict):
-            agent_data = agent
+        prompt = self._bound_prompt
+        if prompt is None or prompt.context != {"proposal": proposal_desc, "region": region}:
+            prompt = self._bound_prompt = self._opinion_prompt.bind(proposal=proposal_desc, region=region)
+        return prompt.render(**self._resident_fields(agent))
+    
+    @staticmethod
+    def _scenarios_prompt(scenarios: List[Tuple[str, str]], region: str) -> BoundPrompt:
+        """Prompt asking for a rating and reasons on several proposals at once.
         
-        prompt = f"""As a resident of {region} with the following characteristics, rate your opinion on the proposed housing policy change and provide reasons for your stance.
-
-Resident Information:
-- Age: {agent_data.get('age', 'unknown')}
-- Income: {agent_data.get('income', 'unknown')}
-- Occupation: {agent_data.get('occupation', 'unknown')}
-- Housing Status: {agent_data.get('householder type', 'unknown')}
-- Transportation: {agent_data.get('means of transportation', 'unknown')}
-- Family Type: {agent_data.get('family type', 'unknown')}
-
-Housing Policy Proposal:
-{proposal_desc}
-
-Consider how this proposal might affect:
-- Housing availability and affordability 
-- Neighborhood character and livability
-- Infrastructure and public services
-- Economic development and property values
-- Environmental impact
-- Equity and displacement issues
-
-Provide:
-1. A rating from 1-10 (where 1=strongly oppose, 5=neutral, 10=strongly support)
-2. 1-3 main reasons for your opinion using ONLY the codes below:
-
-Reason Codes:
-A: Housing supply and availability
-B: Affordability for low- and middle-income residents
-C: Impact on neighborhood character
-D: Infrastructure and services capacity
-E: Economic development and job creation
-F: Environmental concerns
-G: Transit and transportation access
-H: Displacement of existing residents
-I: Equity and social justice
-J: Public space and amenities
-K: Property values and investment
-L: Historical preservation
-
-Format your response EXACTLY as follows:
-Rating: 7
-Reasons: A,C,D
-
-Remember to:
-- Use ONLY the letter codes provided (A through L)
-- Include 1-3 reason codes
-- Maintain the exact format specified
-"""
+        Args:
+            scenarios: (scenario label, proposal description) pairs.
+            region: The target region name.
+            
+        Returns:
+            The prompt with everything but the resident rendered.
+        """
+        labels = [label for label, _ in scenarios]
+        return SCENARIOS_PROMPT.bind(
+            proposals="\n\n".join(f"Scenario {label}:\n{description}" for label, description in scenarios),
+            labels=", ".join(labels),
+            region=region,
+            example="\n\n".join(
+                f"Scenario {label}\n{format_census_response(7, ['A', 'C', 'D'])}" for label in labels[:2]
+            )
+        )
+    
+    @staticmethod
+    def _resident_fields(agent: Dict[str, Any]) -> Dict[str, Any]:
+        """Resident section fields of a prompt, for either agent data format."""
+        # Handle possible different agent data formats
+        agent_data = agent["agent"] if isinstance(agent.get("agent"), dict) else agent
+        return {
+            "age": agent_data.get('age', 'unknown'),
+            "income": agent_data.get('income', 'unknown'),
+            "occupation": agent_data.get('occupation', 'unknown'),
+            "housing": agent_data.get('householder type', 'unknown'),
+            "transportation": agent_data.get('means of transportation', 'unknown'),
+            "family": agent_data.get('family type', 'unknown')
+        }
+    
+    def _parse_scenarios_response(self, response: str) -> Dict[str, Tuple[int, List[str]]]:
+        """Split a multi-scenario response into per-scenario (rating, reason_codes).
         
-        return prompt
+        Args:
+            response: The response from the LLM.
+            
+        Returns:
+            Scenario label -> (rating, reason_codes) for each block with a rating.
+        """
+        answers = {}
+        for label, block in parse_scenario_blocks(response).items():
+            if "rating:" not in block.lower():
+                continue
+            answers[label] = self._parse_opinion_response(block)
+        return answers
     
     def _parse_opinion_response(self, response: str) -> Tuple[int, List[str]]:
         """Parse the LLM response to extract rating and reason codes.
@@ -378,8 +776,19 @@ Remember to:
             A tuple of (rating, reason_codes).
         """
         rating = 5  # Default neutral rating
+        rated = False
         reasons = []
         
+        # Structured output: {"rating": n, "reasons": [codes]}
+        if response.lstrip().startswith("{"):
+            try:
+                answer = json.loads(response)
+                rating = max(1, min(10, int(answer["rating"])))
+                rated = True
+                response = f"Reasons: {','.join(answer['reasons'])}"
+            except (ValueError, KeyError, TypeError):
+                pass
+        
         lines = response.strip().split('\n')
         for line in lines:
             line = line.strip()
@@ -391,6 +800,7 @@ Remember to:
                     rating = int(rating_str)
                     # Ensure rating is in the 1-10 range
                     rating = max(1, min(10, rating))
+                    rated = True
                 except:
                     pass
             
@@ -405,13 +815,59 @@ Remember to:
                 except:
                     pass
         
+        # The default rating is a fallback too, not the LLM's answer
+        if not rated:
+            tracer.count("rating_fallbacks")
+            self._fallbacks += 1
+        
         # If no reasons were extracted, generate random ones
         if not reasons:
+            tracer.count("reason_fallbacks")
             num_reasons = random.randint(1, 3)
             reasons = random.sample(list(REASON_MAPPING.values()), num_reasons)
         
         return rating, reasons
     
+    def recorded_exchanges(self,
+                           proposal: Dict[str, Any],
+                           output: Dict[str, Any],
+                           region: str) -> List[Tuple[str, str]]:
+        """Reconstruct the prompt/response pairs behind a saved simulation output.
+        
+        Used to build replay cassettes from existing experiment runs: prompts are
+        rebuilt from the logged proposal and the agent data file, responses are
+        re-rendered from the logged ratings and reasons.
+        
+        Args:
+            proposal: The logged input proposal.
+            output: The logged output, keyed by participant ID.
+            region: The target region name.
+            
+        Returns:
+            A list of (prompt, response) tuples.
+        """
+        self.current_proposal_id = proposal.get("proposal_id", None)
+        scenario_id = SCENARIO_MAPPING.get(self.current_proposal_id, "1.1")
+        proposal_desc = self._create_proposal_description(proposal)
+        
+        with open(self.agent_data_file, 'r', encoding='utf-8') as f:
+            raw_agents = json.load(f)
+        
+        exchanges = []
+        for i, raw_agent in enumerate(raw_agents):
+            participant_id = self._participant_id(raw_agent, i)
+            recorded = output.get(participant_id)
+            if not recorded or scenario_id not in recorded.get("opinions", {}):
+                continue
+            prompt = self._build_opinion_prompt(raw_agent, proposal_desc, region)
+            response = format_census_response(
+                recorded["opinions"][scenario_id],
+                recorded.get("reasons", {}).get(scenario_id, [])
+            )
+            exchanges.append((prompt, response))
+        
+        return exchanges
+    
     def _generate_fallback_opinion(self, scenario_id: str) -> Dict[str, Any]:
         """Generate a fallback random opinion and reasons for a scenario.
         
@@ -421,12 +877,16 @@ Remember to:
         Returns:
             A dictionary with random opinions and reasons.
         """
-        # Generate random rating between 1 and 10
-        rating = random.randint(3, 9)
-        
-        # Generate 1-3 random reason codes
-        num_reasons = random.randint(1, 3)
-        reason_codes = random.sample(list(REASON_MAPPING.values()), num_reasons)
+        tracer.count("fallbacks")
+        FALLBACKS.inc(model=type(self).__name__)
+        self._fallbacks += 1
+        with tracer.span("fallback"):
+            # Generate random rating between 1 and 10
+            rating = random.randint(3, 9)
+            
+            # Generate 1-3 random reason codes
+            num_reasons = random.randint(1, 3)
+            reason_codes = random.sample(list(REASON_MAPPING.values()), num_reasons)
         
         return {
             "opinions": {
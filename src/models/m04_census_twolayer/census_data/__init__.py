@@ -1,8 +1,14 @@
 # model_census/__init__.py
 
-from .data_retriever import DataRetriever
+# DataRetriever pulls in requests and yaml; import it only when first used
+def __getattr__(name):
+    if name == "DataRetriever":
+        from .data_retriever import DataRetriever
+        return DataRetriever
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_census_data(config_path: str):
+    from .data_retriever import DataRetriever
     retriever = DataRetriever(config_path)
     return retriever.fetch_data()
 
@@ -1,29 +1,37 @@
 import os
-from openai import AsyncOpenAI
 from typing import Optional
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv(override=True)
+from ...llm_backends import LLMBackend
+from ...metrics import LLM_TOKENS
+from ...tracing import tracer
 
-class OpenAILLM:
+
+class OpenAILLM(LLMBackend):
     """Simple OpenAI LLM wrapper"""
     
     def __init__(self, model: str = "gpt-3.5-turbo"):
         """Initialize OpenAI client"""
+        # Imported on first use so importing a model does not load the OpenAI SDK
+        from dotenv import load_dotenv
+        from openai import AsyncOpenAI
+        
+        # Load environment variables from .env file
+        load_dotenv(override=True)
+        
         self.model = model
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         self.client = AsyncOpenAI(api_key=api_key)
     
-    async def generate(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, temperature: Optional[float] = 0.7) -> str:
         """
         Generate text using OpenAI API
         
         Args:
             prompt: Input prompt
             max_tokens: Optional maximum number of tokens to generate
+            temperature: Sampling temperature
             
         Returns:
             Generated text
@@ -33,8 +41,19 @@ class OpenAILLM:
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=max_tokens,
-                temperature=0.7
+                temperature=temperature
             )
+            if response.usage is not None:
+                tracer.count("prompt_tokens", response.usage.prompt_tokens)
+                tracer.count("completion_tokens", response.usage.completion_tokens)
+                LLM_TOKENS.inc(response.usage.prompt_tokens, kind="prompt")
+                LLM_TOKENS.inc(response.usage.completion_tokens, kind="completion")
+                # Prompt tokens served from the provider's prefix cache (see models/prompts.py)
+                details = getattr(response.usage, "prompt_tokens_details", None)
+                cached = getattr(details, "cached_tokens", None)
+                if cached:
+                    tracer.count("cached_prompt_tokens", cached)
+                    LLM_TOKENS.inc(cached, kind="cached_prompt")
             return response.choices[0].message.content.strip()
         except Exception as e:
             raise RuntimeError(f"OpenAI API error: {str(e)}") 
\ No newline at end of file
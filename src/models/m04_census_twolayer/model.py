@@ -1,12 +1,14 @@
 import json
 import random
 from pathlib import Path
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Optional
 
 from ..base import BaseModel, ModelConfig
 from .components.llm import OpenAILLM
 from ..m03_census.model import Census
-from .prompts import get_prompt_first_layer, get_prompt_second_layer
+from ..prompts import BoundPrompt
+from ..proposal import as_proposal
+from .prompts import bind_first_layer, get_prompt_first_layer, get_prompt_second_layer
 
 # Default grid bounds (San Francisco area)
 DEFAULT_GRID_BOUNDS = {
@@ -17,9 +19,25 @@ DEFAULT_GRID_BOUNDS = {
 }
 
 class CensusTwoLayer(Census):
+    """Census model with a two-layer (thoughts per dependency, then opinion) prompt.
+
+    Simulations run the `Census` flow, which calls `_generate_opinion`; the
+    two-layer `_generate_opinion_and_comment` below is not called by it yet.
+    """
+
     def __init__(self, config: ModelConfig = None):
         super().__init__(config)
+        # First-layer prompts with the current proposal rendered (see models.prompts)
+        self._first_layer: Optional[Dict[str, BoundPrompt]] = None
+        self._first_layer_height = None
 
+    def _first_layer_for(self, proposal: Dict[str, Any]) -> Dict[str, BoundPrompt]:
+        """First-layer prompts for `proposal`, bound once and reused for every agent"""
+        proposal = as_proposal(proposal)
+        if self._first_layer is None or self._first_layer_height != proposal.default_height:
+            self._first_layer = bind_first_layer(proposal)
+            self._first_layer_height = proposal.default_height
+        return self._first_layer
 
     async def _generate_opinion_and_comment(self, agent: Dict[str, Any], proposal: Dict[str, Any]) -> Tuple[str, str, List[str]]:
         """Generate opinion and comment for an agent using OpenAI.
@@ -32,7 +50,7 @@ class CensusTwoLayer(Census):
             A tuple of (opinion, comment, themes).
         """
         # get prompts for gerating intermediate thoughts
-        prompts_first_layer = get_prompt_first_layer(agent, proposal)
+        prompts_first_layer = get_prompt_first_layer(agent, proposal, self._first_layer_for(proposal))
 
         # generate intermediate thoughts
         intermediate_thoughts = {}
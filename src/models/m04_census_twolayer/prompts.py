@@ -7,7 +7,10 @@
 - Gender: {agent['agent'].get('gender', 'unknown')}
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from ..prompts import BoundPrompt, PromptTemplate
+from ..proposal import as_proposal
 
 dependencies = {
     "Housing Affordability": ["age", "income", "housing tenure"],
@@ -17,34 +20,52 @@ dependencies = {
     "Small Business Impact": ["occupation"]
 }
 
-def get_prompt_first_layer(agent: Dict[str, Any], proposal: Dict[str, Any]) -> str:
-    agent_lat = agent['coordinates']['lat']
-    agent_lng = agent['coordinates']['lng']
-    nearest_cell = None
-    min_distance = float('inf')
-
-    for cell_id, cell in proposal['cells'].items():
-        bbox = cell['bbox']
-        cell_lat = (bbox['north'] + bbox['south']) / 2
-        cell_lng = (bbox['east'] + bbox['west']) / 2
-        distance = ((agent_lat - cell_lat) ** 2 + (agent_lng - cell_lng) ** 2) ** 0.5
-        if distance < min_distance:
-            min_distance = distance
-            nearest_cell = cell
+# One template per dependency, ordered instructions -> proposal -> resident for prefix caching
+first_layer_prompts = {
+    dependency: PromptTemplate(
+        "twolayer_" + dependency.lower().replace(" ", "_"),
+        static="""
+    You are considering a rezoning proposal as a resident and will share your thoughts on its impact regarding {dependency}.
+""",
+        proposal="""
+    Proposal Details:
+        - Default Height Limit: {default_height} feet
+""",
+        agent="""        - Nearest Rezoning Area: A {category} zone with height limit changed to {height_limit} feet
+        - Distance from Resident: {distance:.4f} degrees (approximately {distance_km:.1f} km)
 
-    def get_prompt_for_dependency(dependency: str) -> str:
-        return  f"""
     You are a resident with the following attributes:
-    {[f"{key}: {agent.get(key, None)}" for key in dependencies[dependency]]}
+    {attributes}
 
-    You are considering the following rezoning proposal:
-    Proposal Details:
-        - Nearest Rezoning Area: A {nearest_cell['category']} zone with height limit changed to {nearest_cell['height_limit']} feet
-        - Distance from Resident: {min_distance:.4f} degrees (approximately {min_distance * 111:.1f} km)
-        - Default Height Limit: {proposal['height_limits']['default']} feet
+    Your thoughts on the impact of this proposal regarding """ + dependency + """ are:
+    """,
+        dependency=dependency
+    )
+    for dependency in dependencies
+}
+
+def bind_first_layer(proposal: Dict[str, Any]) -> Dict[str, BoundPrompt]:
+    """First-layer prompts with the proposal rendered, to reuse for every agent of a simulation."""
+    proposal = as_proposal(proposal)
+    return {dependency: template.bind(default_height=proposal.default_height)
+            for dependency, template in first_layer_prompts.items()}
+
+def get_prompt_first_layer(agent: Dict[str, Any], proposal: Dict[str, Any],
+                           bound: Optional[Dict[str, BoundPrompt]] = None) -> Dict[str, str]:
+    agent_lat = agent['coordinates']['lat']
+    agent_lng = agent['coordinates']['lng']
+    proposal = as_proposal(proposal)
+    _, nearest_cell, min_distance = proposal.nearest_cell(agent_lat, agent_lng)
+    bound = bound or bind_first_layer(proposal)
 
-    Your thoughts on the impact of this proposal regarding {dependency} are:
-    """
+    def get_prompt_for_dependency(dependency: str) -> str:
+        return bound[dependency].render(
+            attributes=[f"{key}: {agent.get(key, None)}" for key in dependencies[dependency]],
+            category=nearest_cell['category'],
+            height_limit=nearest_cell['heightLimit'],
+            distance=min_distance,
+            distance_km=min_distance * 111
+        )
 
     prompts = {
         "Housing Affordability": get_prompt_for_dependency("Housing Affordability"),
@@ -0,0 +1,328 @@
+"""
+In-process Prometheus-style metrics.
+
+Usage:
+
+```python
+from models.metrics import metrics, LLM_REQUESTS
+
+LLM_REQUESTS.inc(backend="openai", outcome="ok")
+metrics.render()          # Prometheus text exposition format
+```
+
+Metrics are always on. Updates are lock-light: each thread increments its own
+slot of a labelled series, so the hot path is a dict lookup and an add with no
+lock; the lock is only taken the first time a label set is seen. Reads
+(`render`, `snapshot`) sum the per-thread slots.
+
+The metric families shared by the backend and the experiment runner are
+defined at the bottom of this module so every call site uses the same names.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+
+# Default histogram buckets (seconds), covering fast parses to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _Series:
+    """One labelled time series with per-thread slots."""
+
+    __slots__ = ("_slots", "_size")
+
+    def __init__(self, size: int = 1):
+        self._slots: Dict[int, List[float]] = {}
+        self._size = size
+
+    def _slot(self) -> List[float]:
+        tid = threading.get_ident()
+        slot = self._slots.get(tid)
+        if slot is None:
+            # Dict assignment is atomic; only this thread ever writes the slot
+            slot = self._slots[tid] = [0.0] * self._size
+        return slot
+
+    def totals(self) -> List[float]:
+        totals = [0.0] * self._size
+        for slot in list(self._slots.values()):
+            for i, value in enumerate(slot):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    """Base class for a metric family with optional labels."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _get(self, labels: Dict[str, Any]):
+        key = self._key(labels) if labels or self.labelnames else ()
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = self._new_series()
+        return series
+
+    def _new_series(self):
+        return _Series()
+
+    def _label_text(self, key: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(sample name, label text, value) for every series."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for sample_name, labels, value in self.samples():
+            lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self._get(labels)._slot()[0] += amount
+
+    def value(self, **labels) -> float:
+        return self._get(labels).totals()[0]
+
+    def samples(self):
+        name = self.name if self.name.endswith("_total") else f"{self.name}_total"
+        return [(name, self._label_text(key), series.totals()[0]) for key, series in list(self._series.items())]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed at collection time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels) if labels or self.labelnames else ()] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self._get(labels)._slot()[0] += amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self._get(labels)._slot()[0] -= amount
+
+    def set_function(self, function: Callable[[], Any]) -> None:
+        """Compute the gauge on collection.
+
+        `function` returns a number for an unlabelled gauge, or a dict of
+        label-value tuples to numbers for a labelled one.
+        """
+        self._function = function
+
+    def value(self, **labels) -> float:
+        key = self._key(labels) if labels or self.labelnames else ()
+        return self._current().get(key, 0.0)
+
+    def _current(self) -> Dict[Tuple[str, ...], float]:
+        values = {key: series.totals()[0] for key, series in list(self._series.items())}
+        values.update(self._values)
+        if self._function is not None:
+            try:
+                computed = self._function()
+            except Exception:
+                computed = {}
+            if not isinstance(computed, dict):
+                computed = {(): computed}
+            values.update({tuple(str(v) for v in key): value for key, value in computed.items()})
+        return values
+
+    def samples(self):
+        return [(self.name, self._label_text(key), value) for key, value in self._current().items()]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        # One slot per bucket, +Inf, then sum
+        return _Series(len(self.buckets) + 2)
+
+    def observe(self, value: float, **labels) -> None:
+        slot = self._get(labels)._slot()
+        slot[bisect.bisect_left(self.buckets, value)] += 1
+        slot[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> float:
+        return sum(self._get(labels).totals()[:-1])
+
+    def samples(self):
+        samples = []
+        for key, series in list(self._series.items()):
+            totals = series.totals()
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), totals[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", self._label_text(key, {"le": _format_value(bound)}), cumulative))
+            samples.append((f"{self.name}_count", self._label_text(key), cumulative))
+            samples.append((f"{self.name}_sum", self._label_text(key), totals[-1]))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge."""
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        return "\n".join(metric.render() for metric in list(self._metrics.values())) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All samples as {"sample{labels}": value}."""
+        return {
+            f"{name}{labels}": value
+            for metric in list(self._metrics.values())
+            for name, labels, value in metric.samples()
+        }
+
+    def write(self, path: Path) -> None:
+        """Atomically write the text exposition to `path` (textfile-collector friendly)."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+class SnapshotWriter:
+    """Writes the registry to a file every `interval` seconds from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry, path: Path, interval: float = 15.0):
+        self.registry = registry
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+
+    def start(self) -> "SnapshotWriter":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the thread and write a final snapshot."""
+        self._stop.set()
+        self._thread.join()
+        self.registry.write(self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.registry.write(self.path)
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
+
+# Shared metric families
+LLM_REQUESTS = metrics.counter(
+    "llm_requests", "LLM generate calls by backend and outcome", ("backend", "outcome"))
+LLM_SECONDS = metrics.histogram(
+    "llm_request_seconds", "LLM generate call latency", ("backend",))
+LLM_TOKENS = metrics.counter(
+    "llm_tokens", "Tokens reported by the LLM API", ("kind",))
+SIMULATIONS = metrics.counter(
+    "simulations", "simulate_opinions calls by model and outcome", ("model", "outcome"))
+SIMULATION_SECONDS = metrics.histogram(
+    "simulation_seconds", "simulate_opinions wall time", ("model",))
+SIMULATED_AGENTS = metrics.counter(
+    "simulated_agents", "Agents simulated", ("model",))
+PROMPT_CHARS = metrics.counter(
+    "prompt_chars", "Rendered prompt characters by template and part (shared prefix, agent)", ("template", "part"))
+FALLBACKS = metrics.counter(
+    "opinion_fallbacks", "Agents answered by a fallback after an LLM or parse failure", ("model",))
@@ -0,0 +1,121 @@
+"""
+Compiled prompt templates ordered for provider-side prefix caching.
+
+LLM providers with prompt caching (e.g. OpenAI for prompts over 1024 tokens)
+reuse the longest prefix shared with recent requests. A prompt that starts
+with per-agent fields has a unique prefix, so every call pays for the whole
+prompt. `PromptTemplate` therefore always renders three sections in order:
+
+1. `static`: instructions, reason codes and the response format, identical
+   for every call of a model
+2. `proposal`: the proposal (and run) context, identical for every agent of a
+   simulation
+3. `agent`: the per-agent fields
+
+Sections are `str.format` templates. `static` is rendered when the template
+is compiled and `bind(**context)` renders the proposal section once per
+proposal, returning a `BoundPrompt` whose `render(**fields)` only formats the
+agent section. Rendered prefixes are kept per context, so binding the same
+proposal again (e.g. in the next simulation) does not render it again.
+
+Every render counts its characters in the `prompt_chars` metric, split into
+the shared prefix and the agent-specific suffix, and `BoundPrompt.report()`
+summarizes how much of a simulation's prompt text is cacheable.
+"""
+from collections import OrderedDict
+from string import Formatter
+from typing import Dict, Any, Set
+
+from .metrics import PROMPT_CHARS
+
+
+def _fields(template: str) -> Set[str]:
+    """Names of the replacement fields of a `str.format` template."""
+    return {field.split(".")[0].split("[")[0] for _, field, _, _ in Formatter().parse(template) if field}
+
+
+class BoundPrompt:
+    """A template with its static and proposal sections rendered."""
+
+    def __init__(self, template: "PromptTemplate", prefix: str, context: Dict[str, Any]):
+        self.template = template
+        self.prefix = prefix
+        self.context = context
+        self.renders = 0
+        self.suffix_chars = 0
+
+    @property
+    def prefix_chars(self) -> int:
+        """Length of the prefix shared by every prompt rendered from this binding."""
+        return len(self.prefix)
+
+    def render(self, **fields: Any) -> str:
+        """Full prompt for one agent."""
+        suffix = self.template.agent.format(**fields)
+        self.renders += 1
+        self.suffix_chars += len(suffix)
+        PROMPT_CHARS.inc(len(self.prefix), template=self.template.name, part="prefix")
+        PROMPT_CHARS.inc(len(suffix), template=self.template.name, part="agent")
+        return self.prefix + suffix
+
+    def report(self) -> Dict[str, Any]:
+        """Cacheable prefix length and the share of rendered prompt text it makes up."""
+        total = self.renders * self.prefix_chars + self.suffix_chars
+        return {
+            "template": self.template.name,
+            "prompts": self.renders,
+            "prefix_chars": self.prefix_chars,
+            "mean_prompt_chars": total / self.renders if self.renders else 0.0,
+            "cacheable_share": self.renders * self.prefix_chars / total if total else 0.0
+        }
+
+
+class PromptTemplate:
+    """Prompt in static -> proposal -> agent order."""
+
+    def __init__(self, name: str, static: str, proposal: str, agent: str, max_bindings: int = 16, **constants: Any):
+        """
+        Args:
+            name: Label of the template in metrics and reports
+            static: Section shared by every call; may only use `constants`
+            proposal: Section shared by every agent of a simulation
+            agent: Per-agent section
+            max_bindings: Rendered proposal sections kept for reuse
+            **constants: Values for the static section's fields
+
+        Raises:
+            ValueError: If the static section uses a field not given in `constants`
+        """
+        missing = _fields(static) - set(constants)
+        if missing:
+            raise ValueError(f"Static section of prompt '{name}' uses unknown fields: {sorted(missing)}")
+        self.name = name
+        self.static = static.format(**constants)
+        self.proposal = proposal
+        self.agent = agent
+        self.context_fields = _fields(proposal)
+        self.agent_fields = _fields(agent)
+        self.max_bindings = max_bindings
+        self._prefixes: "OrderedDict[tuple, str]" = OrderedDict()
+
+    def bind(self, **context: Any) -> BoundPrompt:
+        """Prompt with the proposal section rendered, for one simulation.
+
+        The rendered prefix is cached per context; the returned `BoundPrompt`
+        counts only its own renders.
+
+        Raises:
+            ValueError: If a field of the proposal section is missing
+        """
+        missing = self.context_fields - set(context)
+        if missing:
+            raise ValueError(f"Prompt '{self.name}' needs proposal context {sorted(missing)}")
+        key = tuple(sorted((field, str(context[field])) for field in self.context_fields))
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            prefix = self.static + self.proposal.format(**context)
+            self._prefixes[key] = prefix
+            while len(self._prefixes) > self.max_bindings:
+                self._prefixes.popitem(last=False)
+        self._prefixes.move_to_end(key)
+        return BoundPrompt(self, prefix, context)
@@ -0,0 +1,401 @@
+"""
+Normalized proposals, proposal identity and cell-level deltas.
+
+`Proposal` is the schema-normalized form every model works with. It is a
+dict (so it serializes and reads like the raw JSON) whose key aliases are
+resolved once at load time to the camelCase schema of the real data:
+
+    grid_config -> gridConfig, height_limits -> heightLimits,
+    cell height_limit -> heightLimit
+
+and which lazily caches derived data: NumPy arrays of cell centroids, heights
+and categories, a zone histogram, the content hash and any model-specific
+summary registered through `cached()`. Treat a `Proposal` as immutable;
+top-level assignments clear the caches, edits inside cells are not tracked.
+
+A proposal is identified by the SHA-256 of its canonical JSON encoding, so
+the same content always hashes the same regardless of key order. A delta
+describes a proposal as edits to a base proposal:
+
+    {
+        "base": "<content hash of the base proposal>",
+        "cells": {"12_40": {"heightLimit": 240}, "3_7": null},
+        "fields": {"title": "Taller towers near transit"}
+    }
+
+Cell entries are merged into the base cell (a new cell id adds a cell) and
+`null` removes the cell; `fields` replaces top-level keys other than `cells`.
+
+Parametric scenarios (see `experiment/eval/utils/sweep_utils.py`) can instead
+describe bulk edits, applied before `cells`:
+
+    {
+        "base": "<content hash>",
+        "keep_heights": [85, 300],
+        "set_cells": {"heightLimit": 140}
+    }
+
+`keep_heights` keeps only base cells whose height limit lies in the inclusive
+range (a mask over `Proposal.heights`; cells without a height are dropped) and
+`set_cells` is merged into every remaining cell.
+"""
+import copy
+import hashlib
+import json
+import numbers
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Alias -> canonical key, at the proposal level and inside cells
+PROPOSAL_ALIASES = {
+    "grid_config": "gridConfig",
+    "height_limits": "heightLimits"
+}
+CELL_ALIASES = {
+    "height_limit": "heightLimit",
+    "last_updated": "lastUpdated"
+}
+GRID_CONFIG_ALIASES = {
+    "cell_size": "cellSize"
+}
+
+
+def content_hash(proposal: Dict[str, Any]) -> str:
+    """SHA-256 of the proposal's canonical JSON encoding."""
+    encoded = json.dumps(proposal, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _resolve_aliases(data: Dict[str, Any], aliases: Dict[str, str]) -> Dict[str, Any]:
+    """Copy of `data` with alias keys renamed (canonical keys win), or `data` itself if none."""
+    if aliases.keys().isdisjoint(data):
+        return data
+    resolved = {}
+    for key, value in data.items():
+        canonical = aliases.get(key, key)
+        if canonical != key and canonical in data:
+            continue
+        resolved[canonical] = value
+    return resolved
+
+
+class Proposal(dict):
+    """Schema-normalized proposal with lazily cached derived data."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache: Dict[str, Any] = {}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Proposal":
+        """Build a normalized proposal from raw JSON data (camelCase or snake_case).
+
+        Cells (and the cells dict itself, if no cell uses an alias) are shared
+        with `data` rather than copied.
+        """
+        if isinstance(data, cls):
+            return data
+        proposal = cls(_resolve_aliases(data, PROPOSAL_ALIASES))
+        if isinstance(proposal.get("gridConfig"), dict):
+            dict.__setitem__(proposal, "gridConfig", _resolve_aliases(proposal["gridConfig"], GRID_CONFIG_ALIASES))
+        cells = proposal.get("cells")
+        if isinstance(cells, dict):
+            isdisjoint = CELL_ALIASES.keys().isdisjoint
+            if not all(isdisjoint(cell) for cell in cells.values() if isinstance(cell, dict)):
+                dict.__setitem__(proposal, "cells", {
+                    cell_id: _resolve_aliases(cell, CELL_ALIASES) if isinstance(cell, dict) else cell
+                    for cell_id, cell in cells.items()
+                })
+        return proposal
+
+    # Any top-level change invalidates the derived data
+    def _invalidate(self):
+        self._cache.clear()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._invalidate()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._invalidate()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._invalidate()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._invalidate()
+        return value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._invalidate()
+        return super().setdefault(key, default)
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+
+    def __reduce__(self):
+        # Pickle/deepcopy as a plain proposal; caches are rebuilt on demand
+        return (self.__class__, (dict(self),))
+
+    def cached(self, key: str, factory: Callable[["Proposal"], Any]) -> Any:
+        """Return `factory(self)`, computed once per proposal (until it changes)."""
+        if key not in self._cache:
+            self._cache[key] = factory(self)
+        return self._cache[key]
+
+    # Schema accessors
+
+    @property
+    def cells(self) -> Dict[str, Dict[str, Any]]:
+        return self.get("cells", {})
+
+    @property
+    def grid_config(self) -> Dict[str, Any]:
+        return self.get("gridConfig", {})
+
+    @property
+    def bounds(self) -> Optional[Dict[str, float]]:
+        return self.grid_config.get("bounds")
+
+    @property
+    def cell_size(self) -> Any:
+        return self.grid_config.get("cellSize", 100)
+
+    @property
+    def height_limits(self) -> Dict[str, Any]:
+        return self.get("heightLimits", {})
+
+    @property
+    def default_height(self) -> Any:
+        return self.height_limits.get("default")
+
+    # Derived data
+
+    @property
+    def content_hash(self) -> str:
+        return self.cached("content_hash", content_hash)
+
+    def _arrays(self) -> Dict[str, Any]:
+        def build(proposal):
+            cells = proposal.cells
+            count = len(cells)
+            ids: List[str] = []
+            centroids = np.full((count, 2), np.nan)
+            heights = np.full(count, np.nan)
+            categories = np.empty(count, dtype=object)
+            for i, (cell_id, cell) in enumerate(cells.items()):
+                ids.append(cell_id)
+                bbox = cell.get("bbox")
+                if bbox:
+                    centroids[i, 0] = (bbox["north"] + bbox["south"]) / 2
+                    centroids[i, 1] = (bbox["east"] + bbox["west"]) / 2
+                height = cell.get("heightLimit")
+                if isinstance(height, numbers.Real) and not isinstance(height, bool):
+                    heights[i] = height
+                categories[i] = cell.get("category", "unknown")
+            return {"ids": ids, "centroids": centroids, "heights": heights, "categories": categories}
+        return self.cached("arrays", build)
+
+    @property
+    def cell_ids(self) -> List[str]:
+        """Cell IDs in the order of the arrays below."""
+        return self._arrays()["ids"]
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """(N, 2) array of cell centre (lat, lng); NaN for cells without a bbox."""
+        return self._arrays()["centroids"]
+
+    @property
+    def heights(self) -> np.ndarray:
+        """(N,) array of cell height limits; NaN where missing."""
+        return self._arrays()["heights"]
+
+    @property
+    def categories(self) -> np.ndarray:
+        """(N,) object array of cell categories ("unknown" where missing)."""
+        return self._arrays()["categories"]
+
+    @property
+    def zone_histogram(self) -> Dict[Tuple[str, Any], int]:
+        """Cell counts per (category, height limit), in order of first appearance.
+
+        Cells without a height limit count under the proposal's default height.
+        """
+        def build(proposal):
+            default_height = proposal.default_height
+            histogram: Dict[Tuple[str, Any], int] = {}
+            for cell in proposal.cells.values():
+                key = (cell.get("category", "unknown"), cell.get("heightLimit", default_height))
+                histogram[key] = histogram.get(key, 0) + 1
+            return histogram
+        return self.cached("zone_histogram", build)
+
+    def height_mask(self, height_range: Sequence[float]) -> np.ndarray:
+        """Boolean mask over the cell arrays: height limit within the inclusive (min, max)."""
+        try:
+            low, high = height_range
+        except (TypeError, ValueError):
+            raise ValueError(f"Height range must be [min, max], got {height_range!r}") from None
+        heights = self.heights
+        with np.errstate(invalid="ignore"):
+            return (heights >= low) & (heights <= high)
+
+    def select_cells(self, height_range: Sequence[float]) -> List[str]:
+        """IDs of cells whose height limit lies in the inclusive `height_range`, in cell order."""
+        mask = self.height_mask(height_range)
+        return [self.cell_ids[i] for i in np.flatnonzero(mask)]
+
+    def at_resolution(self, cell_size: int, method: str = "majority") -> "Proposal":
+        """This proposal aggregated to a coarser `cell_size` (a multiple of the current one).
+
+        See `grid.coarsen`; levels are computed once and cached.
+        """
+        if cell_size == self.cell_size:
+            return self
+        factor = cell_size / self.cell_size
+        if factor < 1 or not float(factor).is_integer():
+            raise ValueError(f"Cell size {cell_size} is not a multiple of {self.cell_size}")
+        from .grid import coarsen
+        return self.cached(f"resolution:{cell_size}:{method}",
+                           lambda proposal: coarsen(proposal, int(factor), method=method))
+
+    def nearest_cell(self, lat: float, lng: float) -> Tuple[Optional[str], Optional[Dict[str, Any]], float]:
+        """Cell whose bbox centre is closest to a location, computed over the cached centroids.
+
+        Replaces the models' per-agent loop over every cell (ties go to the first cell, as there).
+
+        Returns:
+            Tuple of (cell ID, cell, distance in degrees); (None, None, inf) if there are no cells
+        """
+        centroids = self.centroids
+        if not len(centroids):
+            return None, None, float("inf")
+        squared = (centroids[:, 0] - lat) ** 2 + (centroids[:, 1] - lng) ** 2
+        squared = np.where(np.isnan(squared), np.inf, squared)
+        index = int(np.argmin(squared))
+        if squared[index] == np.inf:
+            return None, None, float("inf")
+        cell_id = self.cell_ids[index]
+        return cell_id, self.cells[cell_id], float(np.sqrt(squared[index]))
+
+    def nearest_cells(self, lats: Sequence[float], lngs: Sequence[float],
+                      chunk_size: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+        """`nearest_cell` for many points at once.
+
+        Points are processed in chunks so memory stays bounded by
+        `chunk_size` x number of cells.
+
+        Returns:
+            Tuple of (cell indices into `cell_ids`, distances in degrees);
+            index -1 and distance inf for points without coordinates or if
+            no cell has a bbox
+        """
+        points = np.column_stack([np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)])
+        indices = np.full(len(points), -1)
+        distances = np.full(len(points), np.inf)
+        valid = ~np.isnan(self.centroids).any(axis=1)
+        positions = np.flatnonzero(valid)
+        centroids = self.centroids[valid]
+        if not len(centroids):
+            return indices, distances
+        located = np.flatnonzero(~np.isnan(points).any(axis=1))
+        for start in range(0, len(located), chunk_size):
+            rows = located[start:start + chunk_size]
+            squared = ((points[rows, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+            nearest = np.argmin(squared, axis=1)
+            indices[rows] = positions[nearest]
+            distances[rows] = np.sqrt(squared[np.arange(len(rows)), nearest])
+        return indices, distances
+
+
+def as_proposal(data: Dict[str, Any]) -> Proposal:
+    """Return `data` as a normalized `Proposal` (no-op if it already is one)."""
+    return Proposal.from_dict(data)
+
+
+def apply_delta(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the proposal described by `delta` without modifying `base`.
+
+    Only edited cells are copied; untouched cells are shared with `base`.
+
+    Raises:
+        ValueError: If the delta is malformed or removes a cell that does not exist
+    """
+    cell_edits = delta.get("cells", {}) or {}
+    field_edits = delta.get("fields", {}) or {}
+    set_cells = delta.get("set_cells", {}) or {}
+    if not isinstance(cell_edits, dict) or not isinstance(field_edits, dict) or not isinstance(set_cells, dict):
+        raise ValueError("Delta 'cells', 'fields' and 'set_cells' must be objects")
+    if "cells" in field_edits:
+        raise ValueError("Delta 'fields' cannot replace 'cells'; use 'cells' edits instead")
+
+    proposal = {key: value for key, value in base.items() if key != "cells"}
+    proposal.update(copy.deepcopy(field_edits))
+
+    keep_heights = delta.get("keep_heights")
+    if keep_heights is not None:
+        base = as_proposal(base)
+        cells = {cell_id: base.cells[cell_id] for cell_id in base.select_cells(height_range=keep_heights)}
+    else:
+        cells = dict(base.get("cells", {}))
+    if set_cells:
+        if any(isinstance(value, (dict, list)) for value in set_cells.values()):
+            cells = {cell_id: {**cell, **copy.deepcopy(set_cells)} for cell_id, cell in cells.items()}
+        else:
+            cells = {cell_id: {**cell, **set_cells} for cell_id, cell in cells.items()}
+
+    for cell_id, edit in cell_edits.items():
+        if edit is None:
+            if cell_id not in cells:
+                raise ValueError(f"Delta removes unknown cell: {cell_id}")
+            del cells[cell_id]
+        elif isinstance(edit, dict):
+            merged = copy.deepcopy(cells.get(cell_id, {}))
+            merged.update(copy.deepcopy(edit))
+            cells[cell_id] = merged
+        else:
+            raise ValueError(f"Invalid edit for cell {cell_id}: expected an object or null")
+    proposal["cells"] = cells
+    return proposal
+
+
+def make_delta(base: Dict[str, Any], proposal: Dict[str, Any],
+               base_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Smallest delta turning `base` into `proposal` (inverse of `apply_delta`)."""
+    base_cells = base.get("cells", {})
+    cells = proposal.get("cells", {})
+
+    cell_edits = {}
+    for cell_id, cell in cells.items():
+        base_cell = base_cells.get(cell_id)
+        if base_cell is None:
+            cell_edits[cell_id] = cell
+            continue
+        if set(base_cell) - set(cell):
+            raise ValueError(f"Cell {cell_id} drops keys; deltas can only add or change cell keys")
+        changed = {key: value for key, value in cell.items() if base_cell.get(key) != value}
+        if changed:
+            cell_edits[cell_id] = changed
+    for cell_id in base_cells:
+        if cell_id not in cells:
+            cell_edits[cell_id] = None
+
+    field_edits = {
+        key: value for key, value in proposal.items()
+        if key != "cells" and base.get(key) != value
+    }
+    if set(base) - set(proposal) - {"cells"}:
+        raise ValueError("Proposal drops top-level keys; deltas can only add or change them")
+
+    return {
+        "base": base_hash or content_hash(base),
+        "cells": cell_edits,
+        "fields": field_edits
+    }
@@ -0,0 +1,84 @@
+"""
+Lazy model registry.
+
+Models are registered by name as `"module:ClassName"` import strings and are
+only imported when first requested, so listing models or parsing command line
+arguments never loads a model's dependencies (OpenAI SDK, NumPy, census data).
+
+Additional models can be registered at runtime with `register_model`, or by
+installed packages through the `agent_city_hall.models` entry point group:
+
+```toml
+[project.entry-points."agent_city_hall.models"]
+my_model = "my_package.model:MyModel"
+```
+"""
+import importlib
+from typing import Dict, List, Type, Union
+
+from .base import BaseModel, ModelConfig
+
+ENTRY_POINT_GROUP = "agent_city_hall.models"
+
+# Built-in models: name -> "module:ClassName"
+MODEL_REGISTRY: Dict[str, str] = {
+    "basic": "models.m01_basic.model:BasicSimulationModel",
+    "stupid": "models.m02_stupid.model:StupidAgentModel",
+    "census": "models.m03_census.model:Census",
+    "twolayer": "models.m04_census_twolayer.model:CensusTwoLayer"
+}
+
+_loaded: Dict[str, Type[BaseModel]] = {}
+_entry_points_loaded = False
+
+
+def register_model(name: str, target: Union[str, Type[BaseModel]]) -> None:
+    """Register a model class, or a "module:ClassName" string resolved on first use."""
+    _loaded.pop(name, None)
+    if isinstance(target, str):
+        MODEL_REGISTRY[name] = target
+    else:
+        MODEL_REGISTRY[name] = f"{target.__module__}:{target.__qualname__}"
+        _loaded[name] = target
+
+
+def _load_entry_points() -> None:
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        MODEL_REGISTRY.setdefault(entry_point.name, entry_point.value)
+
+
+def available_models() -> List[str]:
+    """Names of all registered models (nothing is imported)."""
+    _load_entry_points()
+    return list(MODEL_REGISTRY)
+
+
+def get_model_class(name: str) -> Type[BaseModel]:
+    """Import and return the model class registered as `name`.
+
+    Raises:
+        KeyError: If no model is registered under `name`
+    """
+    model_class = _loaded.get(name)
+    if model_class is not None:
+        return model_class
+
+    _load_entry_points()
+    if name not in MODEL_REGISTRY:
+        raise KeyError(f"Unknown model: {name}. Available models: {list(MODEL_REGISTRY)}")
+    module_name, _, attribute = MODEL_REGISTRY[name].partition(":")
+    model_class = importlib.import_module(module_name)
+    for part in attribute.split("."):
+        model_class = getattr(model_class, part)
+    _loaded[name] = model_class
+    return model_class
+
+
+def create_model(name: str, config: ModelConfig = None) -> BaseModel:
+    """Instantiate the model registered as `name`."""
+    return get_model_class(name)(config)
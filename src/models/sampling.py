@@ -0,0 +1,455 @@
+"""
+Stratified agent sampling with post-stratification estimates.
+
+Instead of simulating every agent, a stratified run partitions the agent table
+into strata (demographic attributes x distance band to the nearest proposal
+cell), spends a fixed LLM budget on a sample of agents and estimates the
+population's opinion distribution and reason shares from the sample with
+post-stratification weights `N_h / n_h`.
+
+The budget is allocated in two phases: a small pilot per stratum measures the
+spread of answers within each stratum, then the rest follows Neyman
+allocation (`n_h` proportional to `N_h * S_h`), assigned one agent at a time to
+the stratum whose variance drops the most. Configure it in `model_config`:
+
+```yaml
+model_config:
+  stratified:
+    budget: 200                          # LLM calls per proposal
+    strata: ["householder type"]         # agent attributes defining demographic strata
+    bins: {age: [35, 55]}                # bin edges for numeric strata attributes
+    location_bands: [250, 1000]          # metres to the nearest proposal cell
+    pilot: 2                             # agents per stratum simulated first
+    seed: 0
+```
+
+Estimates carry standard errors from the stratified variance formula with
+finite population correction. Strata the budget never reaches are left out
+and reported as `unsampled_share`.
+
+Sequential sampling (`early_stopping`) instead draws agents in random batches
+and stops as soon as the confidence intervals of the support/neutral/oppose
+shares (census ratings are banded as in `RATING_OPINIONS`) and of the most
+cited reasons are narrower than a tolerance, or when the budget is spent:
+
+```yaml
+model_config:
+  early_stopping:
+    tolerance: 0.05     # max CI half-width of each opinion and top-reason share
+    confidence: 0.95
+    batch_size: 10
+    min_agents: 20      # never stop before this many agents
+    budget: 500         # max agents simulated (default: all)
+    top_reasons: 3
+    seed: 0
+```
+
+A model uses at most one of the two modes.
+"""
+import heapq
+import math
+from statistics import NormalDist
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .grid import METERS_PER_DEGREE
+from .proposal import as_proposal
+from .surrogate import agent_attributes
+
+# Rating bands (inclusive upper bounds) of the 1-10 census scale
+RATING_OPINIONS = [(4, "oppose"), (6, "neutral"), (10, "support")]
+
+
+def rating_opinion(rating: float) -> str:
+    """The support/neutral/oppose band of a 1-10 rating."""
+    for upper, opinion in RATING_OPINIONS:
+        if rating <= upper:
+            return opinion
+    return RATING_OPINIONS[-1][1]
+
+
+def neyman_allocation(sizes: Sequence[int], spreads: Sequence[float], budget: int,
+                      already: Optional[Sequence[int]] = None,
+                      caps: Optional[Sequence[int]] = None) -> np.ndarray:
+    """Integer Neyman allocation of `budget` samples over strata.
+
+    Each sample goes to the stratum whose estimator variance
+    `N_h^2 S_h^2 (1/n_h - 1/N_h)` drops the most, which converges to
+    `n_h ~ N_h S_h`. Strata with no sample yet come first, largest first.
+
+    Args:
+        sizes: Stratum sizes N_h
+        spreads: Within-stratum standard deviations S_h
+        budget: Total number of samples, including `already`
+        already: Samples already taken per stratum
+        caps: Maximum samples per stratum (default: `sizes`)
+
+    Returns:
+        Samples per stratum (including `already`)
+    """
+    sizes = np.asarray(sizes, dtype=int)
+    spreads = np.asarray(spreads, dtype=float)
+    caps = sizes if caps is None else np.asarray(caps, dtype=int)
+    allocation = np.zeros(len(sizes), dtype=int) if already is None else np.array(already, dtype=int)
+
+    def entry(h):
+        n = allocation[h]
+        gain = math.inf if n == 0 else (sizes[h] * spreads[h]) ** 2 * (1 / n - 1 / (n + 1))
+        return (-gain, -sizes[h], h)
+
+    heap = [entry(h) for h in range(len(sizes)) if allocation[h] < caps[h]]
+    heapq.heapify(heap)
+    remaining = budget - int(allocation.sum())
+    while remaining > 0 and heap:
+        _, _, h = heapq.heappop(heap)
+        allocation[h] += 1
+        remaining -= 1
+        if allocation[h] < caps[h]:
+            heapq.heappush(heap, entry(h))
+    return allocation
+
+
+def _spread(values: List[Any], numeric: bool) -> float:
+    """Standard deviation of numeric answers, or of the label indicators for categorical ones."""
+    if len(values) < 2:
+        return math.nan
+    if numeric:
+        return float(np.std(values, ddof=1))
+    _, counts = np.unique(np.asarray(values, dtype=str), return_counts=True)
+    shares = counts / len(values)
+    return float(np.sqrt(np.sum(shares * (1 - shares))))
+
+
+def stratified_share(sizes: np.ndarray, samples: List[np.ndarray]) -> Dict[str, float]:
+    """Post-stratified estimate of a population share (or mean) and its standard error.
+
+    Args:
+        sizes: Stratum sizes N_h of the sampled strata
+        samples: Per stratum, the sampled values (indicators for a share)
+    """
+    weights = sizes / sizes.sum()
+    estimate = 0.0
+    variance = 0.0
+    for weight, size, values in zip(weights, sizes, samples):
+        n = len(values)
+        estimate += weight * float(np.mean(values))
+        if n > 1:
+            variance += weight ** 2 * (1 - n / size) * float(np.var(values, ddof=1)) / n
+    return {"estimate": float(estimate), "se": math.sqrt(max(float(variance), 0.0))}
+
+
+class StratifiedSampler:
+    """Draws the agents of one proposal stratum by stratum and estimates population results."""
+
+    def __init__(self, strata: np.ndarray, names: List[str], budget: int, pilot: int,
+                 numeric: bool, rng: np.random.Generator):
+        """
+        Args:
+            strata: Stratum index per agent
+            names: Stratum labels
+            budget: LLM calls to spend
+            pilot: Agents per stratum in the pilot phase
+            numeric: Whether answers are numeric ratings (else opinion labels)
+            rng: Random generator for drawing agents
+        """
+        self.strata = strata
+        self.names = names
+        self.budget = min(budget, len(strata))
+        self.pilot = pilot
+        self.numeric = numeric
+        self.sizes = np.bincount(strata, minlength=len(names))
+        # Agents of each stratum in random draw order
+        self._members = [rng.permutation(np.flatnonzero(strata == h)) for h in range(len(names))]
+        self.taken = np.zeros(len(names), dtype=int)
+        self.spreads = np.full(len(names), math.nan)
+        self.values: Dict[int, Any] = {}
+        self.reasons: Dict[int, List[str]] = {}
+
+    def batches(self) -> Iterator[List[int]]:
+        """Yield the pilot sample, then the Neyman-allocated rest.
+
+        The second batch is allocated from the answers recorded for the first.
+        """
+        yield self._take(neyman_allocation(self.sizes, np.ones(len(self.names)), self.budget,
+                                           caps=np.minimum(self.sizes, self.pilot)))
+
+        spreads = np.array([_spread([self.values[i] for i in self._sampled(h) if i in self.values], self.numeric)
+                            for h in range(len(self.names))])
+        # Strata with too few answers, or unanimous pilots, get a fraction of the pooled spread
+        pooled = _spread(list(self.values.values()), self.numeric)
+        floor = 0.25 * pooled if pooled and not math.isnan(pooled) else 1.0
+        self.spreads = np.where(np.isnan(spreads), floor, np.maximum(spreads, floor))
+        yield self._take(neyman_allocation(self.sizes, self.spreads, self.budget, already=self.taken))
+
+    def _sampled(self, stratum: int) -> np.ndarray:
+        return self._members[stratum][:self.taken[stratum]]
+
+    def _take(self, allocation: np.ndarray) -> List[int]:
+        drawn = []
+        for h, target in enumerate(allocation):
+            drawn.extend(int(i) for i in self._members[h][self.taken[h]:target])
+            self.taken[h] = max(self.taken[h], target)
+        return drawn
+
+    def record(self, index: int, value: Any, reasons: Sequence[str] = ()) -> None:
+        """Record the simulated answer of agent `index`."""
+        self.values[index] = value
+        self.reasons[index] = list(reasons)
+
+    def report(self) -> Dict[str, Any]:
+        """Population estimates with standard errors, plus the allocation per stratum."""
+        answered = [[i for i in self._sampled(h) if i in self.values] for h in range(len(self.names))]
+        covered = np.array([len(members) > 0 for members in answered])
+        report = {
+            "population": int(len(self.strata)),
+            "sampled": len(self.values),
+            "budget": self.budget,
+            "strata": len(self.names),
+            "sampled_strata": int(covered.sum()),
+            "unsampled_share": float(self.sizes[~covered].sum() / max(len(self.strata), 1)),
+            "allocation": [
+                {"stratum": name, "size": int(self.sizes[h]), "sampled": len(answered[h]),
+                 "weight": float(self.sizes[h] / len(answered[h])) if answered[h] else None,
+                 "spread": None if math.isnan(self.spreads[h]) else float(self.spreads[h])}
+                for h, name in enumerate(self.names)
+            ]
+        }
+        if not covered.any():
+            return report
+
+        sizes = self.sizes[covered]
+        groups = [members for members, hit in zip(answered, covered) if hit]
+        labels = sorted(set(self.values.values()))
+        report["distribution"] = {
+            str(label): stratified_share(sizes, [np.array([self.values[i] == label for i in g], dtype=float)
+                                                 for g in groups])
+            for label in labels
+        }
+        if self.numeric:
+            report["mean"] = stratified_share(sizes, [np.array([self.values[i] for i in g], dtype=float)
+                                                      for g in groups])
+        codes = sorted({code for i in self.reasons for code in self.reasons[i]})
+        report["reasons"] = {
+            code: stratified_share(sizes, [np.array([code in self.reasons[i] for i in g], dtype=float)
+                                           for g in groups])
+            for code in codes
+        }
+        return report
+
+
+class StratifiedSampling:
+    """Stratified sampling settings from a model configuration."""
+
+    name = "stratified"
+
+    def __init__(self, budget: int, strata: Sequence[str], bins: Optional[Dict[str, Sequence[float]]] = None,
+                 location_bands: Sequence[float] = (250, 1000), pilot: int = 2, seed: int = 0):
+        if budget < 1:
+            raise ValueError(f"Stratified sampling budget must be at least 1, got {budget}")
+        self.budget = int(budget)
+        self.strata = list(strata)
+        self.bins = {key: sorted(edges) for key, edges in (bins or {}).items()}
+        self.location_bands = sorted(location_bands)
+        self.pilot = max(int(pilot), 1)
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_config(cls, config: Any, default_strata: Sequence[str]) -> Optional["StratifiedSampling"]:
+        """Settings for a configuration's `stratified` entry, or None if it has none."""
+        options = dict(getattr(config, "stratified", None) or {})
+        if not options:
+            return None
+        return cls(budget=options["budget"],
+                   strata=options.get("strata", default_strata),
+                   bins=options.get("bins"),
+                   location_bands=options.get("location_bands", (250, 1000)),
+                   pilot=options.get("pilot", 2),
+                   seed=options.get("seed", 0))
+
+    def _band_labels(self) -> List[str]:
+        edges = [0, *self.location_bands]
+        labels = [f"<{edges[1]:g}m"] if len(edges) > 1 else []
+        labels += [f"{low:g}-{high:g}m" for low, high in zip(edges[1:], edges[2:])]
+        labels.append(f">={edges[-1]:g}m" if len(edges) > 1 else "any distance")
+        return labels
+
+    def _attribute_label(self, key: str, value: Any) -> str:
+        if key not in self.bins or not isinstance(value, (int, float)) or isinstance(value, bool):
+            return str(value)
+        edges = self.bins[key]
+        index = int(np.searchsorted(edges, value, side="right"))
+        if index == 0:
+            return f"{key}<{edges[0]:g}"
+        if index == len(edges):
+            return f"{key}>={edges[-1]:g}"
+        return f"{key} {edges[index - 1]:g}-{edges[index]:g}"
+
+    def sampler(self, proposal: Dict[str, Any], records: List[Dict[str, Any]], numeric: bool) -> StratifiedSampler:
+        """Partition `records` (agent file entries or comment-style agents) and start sampling."""
+        proposal = as_proposal(proposal)
+        parsed = [agent_attributes(record) for record in records]
+        lats = np.array([lat for _, lat, _ in parsed], dtype=float)
+        lngs = np.array([lng for _, _, lng in parsed], dtype=float)
+        _, distances = proposal.nearest_cells(lats, lngs)
+        bands = np.searchsorted(self.location_bands, distances * METERS_PER_DEGREE, side="right")
+        band_labels = self._band_labels()
+
+        keys = [
+            "|".join([*(self._attribute_label(key, attributes.get(key)) for key in self.strata),
+                      band_labels[band] if np.isfinite(distance) else "no location"])
+            for (attributes, _, _), band, distance in zip(parsed, bands, distances)
+        ]
+        names, strata = np.unique(np.asarray(keys, dtype=str), return_inverse=True)
+        return StratifiedSampler(strata.reshape(-1), [str(name) for name in names], self.budget,
+                                 self.pilot, numeric, self.rng)
+
+
+def share_interval(successes: int, n: int, population: int, z: float) -> Dict[str, float]:
+    """Agresti-Coull interval of a share with finite population correction."""
+    adjusted = n + z * z
+    centre = (successes + z * z / 2) / adjusted
+    fpc = (population - n) / (population - 1) if population > 1 else 0.0
+    half_width = z * math.sqrt(centre * (1 - centre) / adjusted * max(fpc, 0.0))
+    estimate = successes / n if n else 0.0
+    return {"estimate": estimate, "low": max(centre - half_width, 0.0), "high": min(centre + half_width, 1.0),
+            "half_width": half_width}
+
+
+class SequentialSampler:
+    """Draws random batches of agents until the opinion estimates are precise enough."""
+
+    def __init__(self, count: int, numeric: bool, tolerance: float, confidence: float, batch_size: int,
+                 min_agents: int, budget: int, top_reasons: int, rng: np.random.Generator):
+        self.count = count
+        self.numeric = numeric
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.batch_size = batch_size
+        self.min_agents = min_agents
+        self.budget = min(budget, count)
+        self.top_reasons = top_reasons
+        self.order = rng.permutation(count)
+        self.values: Dict[int, Any] = {}
+        self.reasons: Dict[int, List[str]] = {}
+        self.history: List[Dict[str, Any]] = []
+        self.stopped = None
+
+    def batches(self) -> Iterator[List[int]]:
+        """Yield random batches, checking the intervals after each one."""
+        taken = 0
+        while taken < self.budget:
+            size = min(self.batch_size, self.budget - taken)
+            yield [int(i) for i in self.order[taken:taken + size]]
+            taken += size
+            widest = self._widest()
+            self.history.append({"agents": len(self.values), "max_half_width": widest})
+            if len(self.values) >= self.min_agents and widest <= self.tolerance:
+                self.stopped = "converged"
+                return
+        self.stopped = "budget" if self.budget < self.count else "population"
+
+    def record(self, index: int, value: Any, reasons: Sequence[str] = ()) -> None:
+        """Record the simulated answer of agent `index`."""
+        self.values[index] = value
+        self.reasons[index] = list(reasons)
+
+    def _opinions(self) -> List[Any]:
+        values = list(self.values.values())
+        return [rating_opinion(value) for value in values] if self.numeric else values
+
+    def _intervals(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        n = len(self.values)
+        opinions = self._opinions()
+        labels = [opinion for _, opinion in RATING_OPINIONS] if self.numeric else sorted(set(opinions))
+        intervals = {"opinions": {label: share_interval(opinions.count(label), n, self.count, self.z)
+                                  for label in labels}}
+        counts: Dict[str, int] = {}
+        for codes in self.reasons.values():
+            for code in codes:
+                counts[code] = counts.get(code, 0) + 1
+        top = sorted(counts, key=lambda code: (-counts[code], code))[:self.top_reasons]
+        intervals["reasons"] = {code: share_interval(counts[code], n, self.count, self.z) for code in top}
+        return intervals
+
+    def _widest(self) -> float:
+        if not self.values:
+            return math.inf
+        intervals = self._intervals()
+        return max(interval["half_width"] for group in intervals.values() for interval in group.values())
+
+    def report(self) -> Dict[str, Any]:
+        """Stopping point, final intervals and the estimated rating/opinion distribution."""
+        n = len(self.values)
+        report = {
+            "population": self.count,
+            "simulated": n,
+            "stopped": self.stopped,
+            "tolerance": self.tolerance,
+            "confidence": self.confidence,
+            "max_half_width": self._widest() if n else None,
+            "history": self.history
+        }
+        if not n:
+            return report
+        report.update(self._intervals())
+        values = list(self.values.values())
+        report["distribution"] = {
+            str(label): share_interval(values.count(label), n, self.count, self.z) for label in sorted(set(values))
+        }
+        if self.numeric:
+            fpc = (self.count - n) / (self.count - 1) if self.count > 1 else 0.0
+            se = float(np.std(values, ddof=1)) * math.sqrt(max(fpc, 0.0) / n) if n > 1 else math.nan
+            report["mean"] = {"estimate": float(np.mean(values)), "se": se,
+                              "low": float(np.mean(values)) - self.z * se,
+                              "high": float(np.mean(values)) + self.z * se}
+        return report
+
+
+class SequentialSampling:
+    """Early-stopping settings from a model configuration."""
+
+    name = "early_stopping"
+
+    def __init__(self, tolerance: float = 0.05, confidence: float = 0.95, batch_size: int = 10,
+                 min_agents: int = 20, budget: Optional[int] = None, top_reasons: int = 3, seed: int = 0):
+        if not 0 < confidence < 1:
+            raise ValueError(f"Confidence must be between 0 and 1, got {confidence}")
+        if batch_size < 1:
+            raise ValueError(f"Batch size must be at least 1, got {batch_size}")
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.batch_size = int(batch_size)
+        self.min_agents = int(min_agents)
+        self.budget = budget
+        self.top_reasons = int(top_reasons)
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_config(cls, config: Any) -> Optional["SequentialSampling"]:
+        """Settings for a configuration's `early_stopping` entry, or None if it has none."""
+        options = dict(getattr(config, "early_stopping", None) or {})
+        if not options:
+            return None
+        return cls(**options)
+
+    def sampler(self, proposal: Dict[str, Any], records: List[Dict[str, Any]], numeric: bool) -> SequentialSampler:
+        """Start sampling `records`; the proposal does not affect the draw order."""
+        budget = len(records) if self.budget is None else int(self.budget)
+        return SequentialSampler(len(records), numeric, self.tolerance, self.confidence, self.batch_size,
+                                 self.min_agents, budget, self.top_reasons, self.rng)
+
+
+def sampling_from_config(config: Any, default_strata: Sequence[str]):
+    """The agent sampling mode configured for a model (`StratifiedSampling`,
+    `SequentialSampling` or None).
+
+    Raises:
+        ValueError: If both modes are configured
+    """
+    stratified = StratifiedSampling.from_config(config, default_strata)
+    sequential = SequentialSampling.from_config(config)
+    if stratified and sequential:
+        raise ValueError("Configure either stratified sampling or early stopping, not both")
+    return stratified or sequential
@@ -0,0 +1,494 @@
+"""
+Surrogate opinion model trained on logged LLM answers.
+
+Much of what the LLM answers for an agent is predictable from the agent's
+demographics and the proposal around them. A `Surrogate` is a small NumPy
+classifier over
+
+- agent features: every scalar agent attribute, numeric ones standardized
+  and the rest one-hot encoded, and
+- proposal features: height of and distance to the nearest cell, plus the
+  number of cells, their mean height and the category mix within `radius`
+  metres of the agent,
+
+trained on the outputs accumulated in `experiment/log` (see
+`experiment/train_surrogate.py`). Census-style outputs train a rating
+classifier with a reason-code head; comment-style outputs (`StupidAgentModel`)
+train a support/neutral/oppose classifier.
+
+Models use it through a `SurrogateRouter`, configured in `model_config`:
+
+```yaml
+model_config:
+  surrogate:
+    path: src/experiment/surrogates/census.json
+    confidence: 0.6   # answer locally when the top class has at least this probability
+    llm_budget: 0.25  # max LLM calls per proposal: a fraction of the agents (< 1) or a count
+    audit: 0.1        # share of confident agents still sent to the LLM to measure agreement
+    seed: 0
+```
+
+Uncertain agents go to the LLM, least confident first, until the budget is
+spent; the rest are answered locally. Every run reports how many agents each
+path answered and how often the surrogate agreed with the LLM.
+"""
+import json
+import logging
+import math
+import numbers
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .grid import METERS_PER_DEGREE
+from .proposal import Proposal, as_proposal
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+LABEL_KINDS = ("rating", "opinion")
+
+# Record keys that are not agent attributes
+_NON_ATTRIBUTES = {"id", "coordinates", "location", "cell_id", "opinion", "comment"}
+
+
+def agent_attributes(record: Dict[str, Any]) -> Tuple[Dict[str, Any], float, float]:
+    """(scalar attributes, lat, lng) of an agent record from an agent file or a comment.
+
+    Coordinates are NaN if the record has none.
+    """
+    attributes = record.get("agent") if isinstance(record.get("agent"), dict) else {
+        key: value for key, value in record.items() if key not in _NON_ATTRIBUTES
+    }
+    attributes = {key: value for key, value in attributes.items()
+                  if value is None or isinstance(value, (str, numbers.Real))}
+    point = record.get("coordinates") or record.get("location") or {}
+    return attributes, float(point.get("lat", math.nan)), float(point.get("lng", math.nan))
+
+
+def _is_numeric(value: Any) -> bool:
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def proposal_features(proposal: Proposal,
+                      lats: np.ndarray,
+                      lngs: np.ndarray,
+                      radius: float,
+                      categories: Sequence[str],
+                      chunk_size: int = 256) -> np.ndarray:
+    """Raw proposal features per agent: (N, 4 + len(categories)).
+
+    Columns are nearest-cell height, log distance to it in metres, log number
+    of cells within `radius` metres, their mean height and the share of each
+    of `categories` among them. Missing values are NaN.
+    """
+    count = len(lats)
+    features = np.full((count, 4 + len(categories)), np.nan)
+    centroids = proposal.centroids
+    if not count or not len(centroids):
+        return features
+    default_height = proposal.default_height if _is_numeric(proposal.default_height) else np.nan
+    heights = np.where(np.isnan(proposal.heights), default_height, proposal.heights)
+
+    nearest, distances = proposal.nearest_cells(lats, lngs)
+    found = nearest >= 0
+    features[found, 0] = heights[nearest[found]]
+    features[found, 1] = np.log1p(distances[found] * METERS_PER_DEGREE)
+
+    valid = ~np.isnan(centroids).any(axis=1)
+    centroids = centroids[valid]
+    heights = heights[valid]
+    has_height = ~np.isnan(heights)
+    heights = np.nan_to_num(heights)
+    one_hot = (proposal.categories[valid][:, None] == np.asarray(categories, dtype=object)[None, :]).astype(float)
+    located = np.flatnonzero(~np.isnan(lats) & ~np.isnan(lngs))
+    for start in range(0, len(located), chunk_size):
+        rows = located[start:start + chunk_size]
+        dy = (lats[rows, None] - centroids[None, :, 0]) * METERS_PER_DEGREE
+        dx = (lngs[rows, None] - centroids[None, :, 1]) * METERS_PER_DEGREE * np.cos(np.deg2rad(lats[rows, None]))
+        within = (dx * dx + dy * dy <= radius * radius).astype(float)
+        cells = within.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            features[rows, 2] = np.log1p(cells)
+            features[rows, 3] = (within @ heights) / (within @ has_height)
+            if len(categories):
+                features[rows, 4:] = (within @ one_hot) / cells[:, None]
+    return features
+
+
+class FeatureEncoder:
+    """Turns agents and a proposal into a standardized feature matrix."""
+
+    def __init__(self,
+                 numeric: Optional[List[str]] = None,
+                 vocabulary: Optional[Dict[str, List[str]]] = None,
+                 categories: Optional[List[str]] = None,
+                 radius: float = 500.0,
+                 mean: Optional[Sequence[float]] = None,
+                 scale: Optional[Sequence[float]] = None):
+        """
+        Args:
+            numeric: Numeric agent attributes
+            vocabulary: Categorical agent attribute -> known values
+            categories: Zone categories whose share around the agent is a feature
+            radius: Neighbourhood radius in metres for the zone mix
+            mean, scale: Standardization of the raw features (set by `fit`)
+        """
+        self.numeric = numeric or []
+        self.vocabulary = vocabulary or {}
+        self.categories = categories or []
+        self.radius = radius
+        self.mean = None if mean is None else np.asarray(mean, dtype=float)
+        self.scale = None if scale is None else np.asarray(scale, dtype=float)
+
+    def fit(self, batches: Sequence[Tuple[Proposal, List[Dict[str, Any]]]]) -> "FeatureEncoder":
+        """Learn attribute vocabularies, zone categories and standardization from (proposal, agent records) pairs."""
+        values: Dict[str, List[Any]] = {}
+        categories = set()
+        for proposal, records in batches:
+            categories.update(str(category) for category in proposal.categories)
+            for record in records:
+                for key, value in agent_attributes(record)[0].items():
+                    if value is not None:
+                        values.setdefault(key, []).append(value)
+        self.numeric = sorted(key for key, seen in values.items() if all(_is_numeric(v) for v in seen))
+        self.vocabulary = {key: sorted({str(v) for v in seen})
+                           for key, seen in sorted(values.items()) if key not in self.numeric}
+        self.categories = sorted(categories)
+
+        raw = np.vstack([self._raw(proposal, records) for proposal, records in batches])
+        with np.errstate(invalid="ignore"):
+            self.mean = np.nan_to_num(np.nanmean(raw, axis=0)) if len(raw) else np.zeros(raw.shape[1])
+            scale = np.nan_to_num(np.nanstd(raw, axis=0)) if len(raw) else np.ones(raw.shape[1])
+        self.scale = np.where(scale > 0, scale, 1.0)
+        return self
+
+    def _raw(self, proposal: Proposal, records: List[Dict[str, Any]]) -> np.ndarray:
+        """Unstandardized numeric columns: numeric attributes, then proposal features."""
+        parsed = [agent_attributes(record) for record in records]
+        numeric = np.array([[attributes.get(key) if _is_numeric(attributes.get(key)) else np.nan
+                             for key in self.numeric] for attributes, _, _ in parsed],
+                           dtype=float).reshape(len(parsed), len(self.numeric))
+        lats = np.array([lat for _, lat, _ in parsed], dtype=float)
+        lngs = np.array([lng for _, _, lng in parsed], dtype=float)
+        spatial = proposal_features(as_proposal(proposal), lats, lngs, self.radius, self.categories)
+        return np.hstack([numeric, spatial])
+
+    def transform(self, proposal: Proposal, records: List[Dict[str, Any]]) -> np.ndarray:
+        """(N, D) feature matrix; missing values sit at the training mean."""
+        standardized = (self._raw(proposal, records) - self.mean) / self.scale
+        standardized = np.nan_to_num(standardized)
+        one_hot = []
+        for key, known in self.vocabulary.items():
+            index = {value: i for i, value in enumerate(known)}
+            block = np.zeros((len(records), len(known)))
+            for row, record in enumerate(records):
+                value = agent_attributes(record)[0].get(key)
+                if value is not None and str(value) in index:
+                    block[row, index[str(value)]] = 1.0
+            one_hot.append(block)
+        return np.hstack([standardized, *one_hot]) if one_hot else standardized
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "numeric": self.numeric,
+            "vocabulary": self.vocabulary,
+            "categories": self.categories,
+            "radius": self.radius,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FeatureEncoder":
+        return cls(**data)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _sigmoid(logits: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-logits))
+
+
+def fit_linear(X: np.ndarray, Y: np.ndarray, multilabel: bool = False,
+               l2: float = 1e-2, epochs: int = 500, learning_rate: float = 0.5) -> np.ndarray:
+    """Fit a softmax (or, with `multilabel`, one-vs-rest logistic) regression by gradient descent.
+
+    Args:
+        X: (N, D) features
+        Y: (N, K) one-hot (or multi-hot) targets
+
+    Returns:
+        (D + 1, K) weights, the last row being the bias
+    """
+    X = np.hstack([X, np.ones((len(X), 1))])
+    W = np.zeros((X.shape[1], Y.shape[1]))
+    penalty = np.ones((X.shape[1], 1))
+    penalty[-1] = 0.0
+    activation = _sigmoid if multilabel else _softmax
+    for _ in range(epochs):
+        gradient = X.T @ (activation(X @ W) - Y) / len(X) + l2 * penalty * W
+        W -= learning_rate * gradient
+    return W
+
+
+def _apply_linear(X: np.ndarray, W: np.ndarray) -> np.ndarray:
+    return X @ W[:-1] + W[-1]
+
+
+class Surrogate:
+    """Classifier predicting an agent's LLM answer from agent and proposal features."""
+
+    def __init__(self,
+                 label_kind: str,
+                 classes: List[Any],
+                 encoder: FeatureEncoder,
+                 weights: np.ndarray,
+                 reason_codes: Optional[List[str]] = None,
+                 reason_weights: Optional[np.ndarray] = None,
+                 training: Optional[Dict[str, Any]] = None):
+        if label_kind not in LABEL_KINDS:
+            raise ValueError(f"Unknown label kind: {label_kind}. Use one of {LABEL_KINDS}")
+        self.label_kind = label_kind
+        self.classes = classes
+        self.encoder = encoder
+        self.weights = np.asarray(weights, dtype=float)
+        self.reason_codes = reason_codes or []
+        self.reason_weights = None if reason_weights is None else np.asarray(reason_weights, dtype=float)
+        self.training = training or {}
+
+    @classmethod
+    def train(cls,
+              examples: List[Dict[str, Any]],
+              radius: float = 500.0,
+              holdout: float = 0.2,
+              seed: int = 0,
+              **fit_options) -> "Surrogate":
+        """Train on logged answers.
+
+        Each example holds one proposal's answers: {"source", "proposal",
+        "agents" (agent records), "labels", "reasons", "label_kind"}.
+
+        A random `holdout` share of the agents is used to report accuracy
+        before the final model is refitted on everything.
+
+        Raises:
+            ValueError: If there are no examples or they mix label kinds
+        """
+        if not examples:
+            raise ValueError("No training examples")
+        kinds = {example["label_kind"] for example in examples}
+        if len(kinds) != 1:
+            raise ValueError(f"Training examples mix label kinds: {sorted(kinds)}")
+        label_kind = kinds.pop()
+
+        batches = [(example["proposal"], example["agents"]) for example in examples]
+        encoder = FeatureEncoder(radius=radius).fit(batches)
+        X = np.vstack([encoder.transform(proposal, records) for proposal, records in batches])
+        labels = [label for example in examples for label in example["labels"]]
+        classes = sorted(set(labels))
+        Y = np.zeros((len(labels), len(classes)))
+        Y[np.arange(len(labels)), [classes.index(label) for label in labels]] = 1.0
+
+        reason_codes, R = [], None
+        if label_kind == "rating":
+            reasons = [codes for example in examples for codes in example["reasons"]]
+            reason_codes = sorted({code for codes in reasons for code in codes})
+            R = np.zeros((len(reasons), len(reason_codes)))
+            for row, codes in enumerate(reasons):
+                R[row, [reason_codes.index(code) for code in codes]] = 1.0
+
+        training = {"examples": len(labels), "proposals": len(examples),
+                    "sources": sorted({example["source"] for example in examples})}
+        rng = np.random.default_rng(seed)
+        test = rng.random(len(labels)) < holdout
+        if test.any() and (~test).any():
+            W = fit_linear(X[~test], Y[~test], **fit_options)
+            predicted = np.argmax(_apply_linear(X[test], W), axis=1)
+            training["holdout_accuracy"] = float(np.mean(predicted == np.argmax(Y[test], axis=1)))
+            training["holdout_examples"] = int(test.sum())
+
+        weights = fit_linear(X, Y, **fit_options)
+        reason_weights = fit_linear(X, R, multilabel=True, **fit_options) if R is not None and len(reason_codes) else None
+        return cls(label_kind, classes, encoder, weights, reason_codes, reason_weights, training)
+
+    def predict(self, proposal: Dict[str, Any],
+                records: List[Dict[str, Any]]) -> Tuple[List[Any], np.ndarray, List[List[str]]]:
+        """Predict every agent's answer to `proposal`.
+
+        Returns:
+            Tuple of (labels, confidence = probability of the predicted label,
+            reason codes per agent; empty lists for opinion surrogates)
+        """
+        X = self.encoder.transform(as_proposal(proposal), records)
+        probabilities = _softmax(_apply_linear(X, self.weights))
+        best = np.argmax(probabilities, axis=1)
+        labels = [self.classes[i] for i in best]
+        confidence = probabilities[np.arange(len(best)), best]
+
+        reasons: List[List[str]] = [[] for _ in records]
+        if self.reason_weights is not None:
+            reason_probabilities = _sigmoid(_apply_linear(X, self.reason_weights))
+            for row, scores in enumerate(reason_probabilities):
+                order = np.argsort(-scores)[:3]
+                # Reasons above even odds, and always at least the most likely one
+                reasons[row] = [self.reason_codes[i] for i in order if scores[i] >= 0.5] or [self.reason_codes[order[0]]]
+        return labels, confidence, reasons
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": FORMAT_VERSION,
+            "label_kind": self.label_kind,
+            "classes": self.classes,
+            "encoder": self.encoder.to_dict(),
+            "weights": self.weights.tolist(),
+            "reason_codes": self.reason_codes,
+            "reason_weights": None if self.reason_weights is None else self.reason_weights.tolist(),
+            "training": self.training
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Surrogate":
+        """Load a saved surrogate.
+
+        Raises:
+            ValueError: If the file was written by an incompatible version
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported surrogate format version {data.get('version')} in {path}")
+        return cls(data["label_kind"], data["classes"], FeatureEncoder.from_dict(data["encoder"]),
+                   data["weights"], data["reason_codes"], data["reason_weights"], data["training"])
+
+
+def _resolve_budget(budget: Optional[float], population: int) -> int:
+    """LLM call budget: unlimited (None), a fraction of the population (< 1) or a count."""
+    if budget is None:
+        return population
+    if budget < 1:
+        return int(math.ceil(budget * population))
+    return int(budget)
+
+
+class RoutingPlan:
+    """Which agents of one proposal the LLM answers, and how often it agreed with the surrogate."""
+
+    def __init__(self, labels: List[Any], confidence: np.ndarray, reasons: List[List[str]],
+                 use_llm: np.ndarray, audited: np.ndarray, threshold: float, budget: int,
+                 numeric: bool):
+        self.labels = labels
+        self.confidence = confidence
+        self.reasons = reasons
+        self.use_llm = use_llm
+        self.audited = audited
+        self.threshold = threshold
+        self.budget = budget
+        self.numeric = numeric
+        self._compared: List[Tuple[bool, Any, Any]] = []
+        self._visited = np.zeros(len(labels), dtype=bool)
+
+    def routes_to_llm(self, index: int) -> bool:
+        """Whether agent `index` goes to the LLM; only agents asked about are reported."""
+        self._visited[index] = True
+        return bool(self.use_llm[index])
+
+    def answer(self, index: int) -> Tuple[Any, List[str]]:
+        """The surrogate's (label, reasons) for agent `index`."""
+        return self.labels[index], self.reasons[index]
+
+    def record(self, index: int, llm_label: Any) -> None:
+        """Compare the LLM's answer for agent `index` with the surrogate's prediction."""
+        self._compared.append((bool(self.audited[index]), self.labels[index], llm_label))
+
+    def report(self) -> Dict[str, Any]:
+        visited = self._visited
+        confident = (self.confidence >= self.threshold) & visited
+        use_llm = self.use_llm & visited
+        report = {
+            "agents": int(visited.sum()),
+            "llm_calls": int(use_llm.sum()),
+            "answered_locally": int((visited & ~use_llm).sum()),
+            "confident": int(confident.sum()),
+            "uncertain_over_budget": int((visited & ~confident & ~use_llm).sum()),
+            "audited": int((self.audited & visited).sum()),
+            "threshold": self.threshold,
+            "budget": self.budget,
+            "mean_confidence": float(self.confidence[visited].mean()) if visited.any() else None
+        }
+        # Audited agents estimate the accuracy of the local answers;
+        # all LLM answers show how well the surrogate fits this proposal overall
+        for key, rows in (("agreement", [c for c in self._compared if c[0]]), ("agreement_all", self._compared)):
+            report[key] = float(np.mean([p == a for _, p, a in rows])) if rows else None
+            if self.numeric:
+                report[f"{key}_within_one"] = (
+                    float(np.mean([abs(p - a) <= 1 for _, p, a in rows])) if rows else None)
+        return report
+
+
+class SurrogateRouter:
+    """Routes agents between a `Surrogate` and the LLM under a call budget."""
+
+    def __init__(self, surrogate: Surrogate, confidence: float = 0.6,
+                 llm_budget: Optional[float] = None, audit: float = 0.1, seed: int = 0):
+        self.surrogate = surrogate
+        self.confidence = confidence
+        self.llm_budget = llm_budget
+        self.audit = audit
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_config(cls, config: Any, label_kind: str) -> Optional["SurrogateRouter"]:
+        """Router for a model configuration's `surrogate` entry, or None if it has none.
+
+        Raises:
+            ValueError: If the surrogate predicts a different kind of label than the model produces
+        """
+        options = dict(getattr(config, "surrogate", None) or {})
+        if not options:
+            return None
+        surrogate = Surrogate.load(options["path"])
+        if surrogate.label_kind != label_kind:
+            raise ValueError(f"Surrogate {options['path']} predicts {surrogate.label_kind}s, "
+                             f"this model needs {label_kind}s")
+        return cls(surrogate,
+                   confidence=options.get("confidence", 0.6),
+                   llm_budget=options.get("llm_budget"),
+                   audit=options.get("audit", 0.1),
+                   seed=options.get("seed", 0))
+
+    def plan(self, proposal: Dict[str, Any], records: List[Dict[str, Any]]) -> RoutingPlan:
+        """Predict every agent and choose which ones go to the LLM.
+
+        A random `audit` share of the confident agents is reserved first so
+        agreement can always be measured; the remaining budget goes to the
+        uncertain agents, least confident first.
+        """
+        labels, confidence, reasons = self.surrogate.predict(proposal, records)
+        count = len(records)
+        budget = min(_resolve_budget(self.llm_budget, count), count)
+        use_llm = np.zeros(count, dtype=bool)
+        audited = np.zeros(count, dtype=bool)
+
+        confident = np.flatnonzero(confidence >= self.confidence)
+        uncertain = np.flatnonzero(confidence < self.confidence)
+        audits = min(int(math.ceil(self.audit * len(confident))), budget)
+        if audits:
+            audited[self.rng.choice(confident, size=audits, replace=False)] = True
+        use_llm |= audited
+        uncertain = uncertain[np.argsort(confidence[uncertain], kind="stable")]
+        use_llm[uncertain[:budget - audits]] = True
+
+        numeric = all(_is_numeric(label) for label in self.surrogate.classes)
+        return RoutingPlan(labels, confidence, reasons, use_llm, audited, self.confidence, budget, numeric)
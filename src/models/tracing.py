@@ -0,0 +1,159 @@
+"""
+Lightweight span tracing for simulation hot paths.
+
+Usage:
+
+```python
+from models.tracing import tracer
+
+with tracer.span("llm_wait"):
+    response = await llm.generate(prompt)
+tracer.count("fallbacks")
+```
+
+Tracing is disabled by default. While disabled, `span()` returns a shared
+no-op context manager and `count()` returns immediately, so instrumented code
+pays only an attribute check. Enabled traces can be exported as Chrome
+trace-event JSON (load in chrome://tracing or Perfetto) and summarized as
+per-stage percentiles.
+"""
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+
+class _NullSpan:
+    """Span used while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Times one stage and reports it to the tracer on exit."""
+
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._record(self.name, self.start, end - self.start, self.args)
+        return False
+
+
+class Tracer:
+    """Collects timed spans and counters for one process."""
+
+    def __init__(self):
+        self.enabled = False
+        self._events: List[Tuple[str, int, int, int, Dict[str, Any]]] = []
+        self._counters: Dict[str, float] = {}
+        self._origin = time.perf_counter_ns()
+
+    def enable(self) -> None:
+        """Start recording spans (clears anything recorded before)."""
+        self.reset()
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop recording spans; recorded data is kept until `reset()`."""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Drop all recorded spans and counters."""
+        self._events = []
+        self._counters = {}
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name: str, **args):
+        """Return a context manager timing the stage `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def count(self, name: str, value: float = 1) -> None:
+        """Add `value` to the counter `name` (e.g. tokens, fallbacks)."""
+        if not self.enabled:
+            return
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def _record(self, name: str, start: int, duration: int, args: Dict[str, Any]) -> None:
+        self._events.append((name, start, duration, threading.get_ident(), args))
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Return recorded spans in Chrome trace-event format."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) / 1000,
+                "dur": duration / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": args
+            }
+            for name, start, duration, tid, args in self._events
+        ]
+        for name, value in self._counters.items():
+            events.append({"name": name, "ph": "C", "ts": 0, "pid": pid, "args": {name: value}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: Path) -> None:
+        """Write recorded spans as a Chrome trace-event JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize spans per stage (count, total and p50/p95/p99 in ms) plus counters."""
+        durations: Dict[str, List[int]] = {}
+        for name, _, duration, _, _ in self._events:
+            durations.setdefault(name, []).append(duration)
+
+        stages = {}
+        for name, values in durations.items():
+            values.sort()
+            stages[name] = {
+                "count": len(values),
+                "total_ms": sum(values) / 1e6,
+                "p50_ms": _percentile(values, 50) / 1e6,
+                "p95_ms": _percentile(values, 95) / 1e6,
+                "p99_ms": _percentile(values, 99) / 1e6
+            }
+
+        return {"stages": stages, "counters": dict(self._counters)}
+
+
+def _percentile(sorted_values: List[int], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return float(sorted_values[rank])
+
+
+# Process-wide tracer used by models and runners
+tracer = Tracer()
@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from models.cascade import CHARS_PER_TOKEN, CascadeLLM, CascadeTier
+from models.llm_backends import census_answer_complete, census_check
+from models.m03_census.components.llm import OpenAILLM
+
+ANSWER = "Rating: 7\nReasons: A, C\n"
+EXPLANATION = "\nExplanation: " + "more housing near transit " * 20
+COST = {"prompt": 1.0, "completion": 2.0}
+
+
+class FakeStream:
+    """Chat completion stream whose usage only arrives in the final chunk."""
+
+    def __init__(self, text, usage):
+        words = text.split(" ")
+        self.chunks = [SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+                       for word in words]
+        self.chunks.append(SimpleNamespace(usage=usage, choices=[]))
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, text, usage):
+        self.streams = []
+        self.text = text
+        self.usage = usage
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.streams.append(FakeStream(self.text, self.usage))
+        return self.streams[-1]
+
+
+@pytest.fixture
+def openai_llm(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    def create(text, usage=None):
+        llm = OpenAILLM("gpt-4o-mini")
+        llm.client = FakeClient(text, usage)
+        return llm
+
+    return create
+
+
+def run(cascade, prompt):
+    return asyncio.run(cascade.generate_checked(prompt, census_check(), is_complete=census_answer_complete))
+
+
+def test_stream_stopped_early_is_estimated(openai_llm):
+    llm = openai_llm(ANSWER + EXPLANATION, SimpleNamespace(prompt_tokens=100, completion_tokens=200))
+    cascade = CascadeLLM([CascadeTier("fast", llm, cost=COST)])
+    prompt = "Rate the proposal. " * 40
+
+    assert run(cascade, prompt).startswith(ANSWER.strip())
+    assert llm.client.streams[0].closed
+    assert llm.usage["prompt_tokens"] == 0
+    assert llm.usage["unreported_calls"] == 1
+
+    tier = cascade.report()["tiers"][0]
+    assert tier["estimated"]
+    assert tier["prompt_tokens"] == round(len(prompt) / CHARS_PER_TOKEN)
+    assert 0 < tier["completion_tokens"] < round(len(ANSWER + EXPLANATION) / CHARS_PER_TOKEN)
+    assert tier["cost"] == pytest.approx((tier["prompt_tokens"] * 1.0 + tier["completion_tokens"] * 2.0) / 1e6)
+
+
+def test_finished_stream_uses_reported_usage(openai_llm):
+    llm = openai_llm("I am not sure about this one.", SimpleNamespace(prompt_tokens=100, completion_tokens=20))
+    cascade = CascadeLLM([CascadeTier("fast", llm, cost=COST)])
+
+    run(cascade, "Rate the proposal.")
+    tier = cascade.report()["tiers"][0]
+    assert not tier["estimated"]
+    assert (tier["prompt_tokens"], tier["completion_tokens"]) == (100, 20)
+    assert tier["cost"] == pytest.approx(140 / 1e6)
+
+
+def test_reported_and_estimated_calls_add_up(openai_llm):
+    llm = openai_llm(ANSWER + EXPLANATION, SimpleNamespace(prompt_tokens=100, completion_tokens=200))
+    cascade = CascadeLLM([CascadeTier("fast", llm, cost=COST)])
+    run(cascade, "Rate the proposal.")
+    stopped = cascade.report(reset=True)["tiers"][0]
+    assert stopped["estimated"]
+
+    llm.client.text = "No rating here."
+    run(cascade, "Rate the proposal.")
+    run(cascade, "Rate the proposal.")
+    tier = cascade.report()["tiers"][0]
+    assert not tier["estimated"]
+    assert (tier["prompt_tokens"], tier["completion_tokens"]) == (200, 400)
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from backend import encoding
+from backend.encoding import from_columns, to_columns
+
+LIST_RESPONSE = {
+    "summary": {"support": 1, "oppose": 1, "neutral": 0},
+    "comments": [
+        {"id": 1, "agent": {"age": "26-40"}, "location": {"lat": 37.75, "lng": -122.43},
+         "cell_id": "0_0", "opinion": "support", "comment": "More homes"},
+        {"id": 2, "agent": {"age": "41-60"}, "location": {"lat": 37.76, "lng": -122.42},
+         "cell_id": "0_1", "opinion": "oppose", "comment": "Too tall"}
+    ]
+}
+
+DICT_RESPONSE = {
+    "summary": {"support": 1, "oppose": 0, "neutral": 1},
+    "comments": {
+        0: {"agent": {"age": "26-40"}, "opinion": "support", "comment": "More homes"},
+        5: {"agent": {"age": "41-60"}, "location": {"lat": 37.76, "lng": -122.42}, "opinion": "neutral"}
+    }
+}
+
+# Explicit nulls next to fields that some comments lack
+SPARSE_RESPONSE = {
+    "summary": {"support": 1, "oppose": 0, "neutral": 0},
+    "comments": [
+        {"id": "a", "cell_id": None, "location": None, "opinion": "support", "comment": None},
+        {"id": "b", "cell_id": "0_1", "location": {"lat": 37.76, "lng": -122.42}},
+        {"id": "c", "opinion": None}
+    ]
+}
+
+RESPONSES = [LIST_RESPONSE, DICT_RESPONSE, SPARSE_RESPONSE]
+RESPONSE_IDS = ["list", "dict", "sparse"]
+
+
+@pytest.mark.parametrize("response", RESPONSES, ids=RESPONSE_IDS)
+def test_columns_round_trip(response):
+    assert from_columns(to_columns(response)) == response
+
+
+@pytest.mark.parametrize("response", RESPONSES, ids=RESPONSE_IDS)
+def test_columns_round_trip_through_json(response):
+    decoded = from_columns(json.loads(encoding.dumps_json(to_columns(response))))
+    assert decoded["comments"] == response["comments"]
+
+
+@pytest.mark.skipif(not encoding.HAS_MSGPACK, reason="msgpack not installed")
+@pytest.mark.parametrize("response", RESPONSES, ids=RESPONSE_IDS)
+def test_binary_columns_round_trip(response):
+    packed = encoding.msgpack.packb(to_columns(response, binary=True), default=encoding._to_builtin)
+    decoded = from_columns(encoding.msgpack.unpackb(packed, strict_map_key=False))
+    assert decoded == response
+
+
+def test_absent_lists_only_missing_fields():
+    columns = to_columns(SPARSE_RESPONSE)["comments"]
+    assert "id" not in columns["absent"]
+    assert columns["absent"]["cell_id"] == [2]
+    assert columns["absent"]["comment"] == [1, 2]
@@ -0,0 +1,67 @@
+import asyncio
+import copy
+
+import numpy as np
+
+from experiment.benchmarks import fixtures
+from models.base import ModelConfig
+from models.grid import METERS_PER_DEGREE
+from models.incremental import AgentIndex, affected_agents, changed_cells
+from models.m02_stupid.model import StupidAgentModel
+from models.proposal import Proposal
+
+
+def setup_agents(proposal, count=500):
+    locations = fixtures.make_locations(count, seed=1)
+    lats = [location["lat"] for location in locations]
+    lngs = [location["lng"] for location in locations]
+    parsed = Proposal.from_dict(proposal)
+    nearest = [parsed.nearest_cell(lat, lng)[0] for lat, lng in zip(lats, lngs)]
+    return np.array(lats), np.array(lngs), nearest
+
+
+def test_cells_only_edit_affects_agents_near_the_edit():
+    proposal = fixtures.make_proposal(100)
+    edited = copy.deepcopy(proposal)
+    edited["cells"]["4_4"]["heightLimit"] += 100
+    assert changed_cells(proposal, edited) == {"4_4"}
+
+    lats, lngs, nearest = setup_agents(proposal)
+    radius = 1500.0
+    mask = affected_agents(proposal, edited, AgentIndex(lats, lngs), nearest, radius=radius)
+
+    centre = Proposal.from_dict(proposal).centroids[Proposal.from_dict(proposal).cell_ids.index("4_4")]
+    distance = np.hypot(lats - centre[0], lngs - centre[1]) * METERS_PER_DEGREE
+    expected = (np.array(nearest) == "4_4") | (distance <= radius)
+    assert np.array_equal(mask, expected)
+    assert 0 < mask.sum() < len(mask)
+
+
+def test_non_cell_change_affects_every_agent():
+    proposal = fixtures.make_proposal(100)
+    edited = {**proposal, "heightLimits": {**proposal["heightLimits"], "default": 40}}
+    assert changed_cells(proposal, edited) is None
+
+    lats, lngs, nearest = setup_agents(proposal)
+    mask = affected_agents(proposal, edited, AgentIndex(lats, lngs), nearest)
+    assert mask.all()
+
+
+def test_incremental_result_matches_full_run():
+    model = StupidAgentModel(ModelConfig(population=200, agent_seed=0, llm={"backend": "synthetic"}))
+    proposal = {"title": "Upzone", "description": "Test", **fixtures.make_proposal(100)}
+    edited = copy.deepcopy(proposal)
+    for cell_id in ("2_3", "6_6"):
+        edited["cells"][cell_id]["heightLimit"] = 300
+
+    async def run():
+        previous = await model.simulate_opinions("san_francisco", proposal)
+        incremental = await model.resimulate_opinions("san_francisco", edited, proposal, previous)
+        report = dict(model.run_report["incremental"])
+        full = await model.simulate_opinions("san_francisco", edited)
+        return incremental, report, full
+
+    incremental, report, full = asyncio.run(run())
+    assert 0 < report["resimulated"] < report["agents"]
+    assert incremental["comments"] == full["comments"]
+    assert incremental["summary"] == full["summary"]
@@ -0,0 +1,166 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.jobs import CANCELLED, COMPLETED, QUEUED, RUNNING, JobRunner, JobStore
+from backend.model_pool import ModelPool
+from models.base import BaseModel, ModelConfig
+
+
+class AgentModel(BaseModel):
+    """Simulates `population` agents, one every `delay` seconds."""
+
+    def __init__(self, config=None, census=False, delay=0.0):
+        super().__init__(config or ModelConfig(population=5))
+        self.census = census
+        self.delay = delay
+        self.cancelled = False
+
+    async def simulate_opinions(self, region, proposal):
+        results = {}
+        try:
+            for i in range(self.config.population):
+                await asyncio.sleep(self.delay)
+                results[f"p{i}"] = {"opinions": {"1.1": 8 if i % 2 else 2}, "reasons": {"1.1": ["A"]}}
+                self._agent_done({"id": f"p{i}", **results[f"p{i}"]})
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.census:
+            return results
+        comments = [{"id": i, "opinion": "support" if i % 2 else "oppose"} for i in range(len(results))]
+        support = sum(comment["opinion"] == "support" for comment in comments)
+        # e.g. a sampled run's population estimate rather than the sample counts
+        return {"summary": {"support": support * 10, "oppose": (len(comments) - support) * 10, "neutral": 0},
+                "comments": comments, "key_themes": {"support": ["transit"], "oppose": ["traffic"]}}
+
+
+class FakePool(ModelPool):
+    def __init__(self, **options):
+        super().__init__(["fake"], size=1)
+        self.options = options
+
+    def _build(self, name):
+        return AgentModel(**self.options)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def submit(store, priority=0, population=0):
+    return store.submit("fake", "region", {"title": "t"}, population=population, priority=priority)
+
+
+def test_claim_takes_highest_priority_first(store):
+    low = submit(store, priority=0)
+    high = submit(store, priority=5)
+    high_later = submit(store, priority=5)
+    lowest = submit(store, priority=-1)
+
+    claimed = [store.claim("w", ["fake"])["id"] for _ in range(4)]
+    assert claimed == [high, high_later, low, lowest]
+    assert store.claim("w", ["fake"]) is None
+    assert all(store.get(job_id)["status"] == RUNNING for job_id in claimed)
+
+
+def test_claim_skips_models_the_worker_does_not_serve(store):
+    submit(store)
+    assert store.claim("w", ["other"]) is None
+    assert store.claim("w", []) is None
+    assert store.claim("w", ["fake", "other"]) is not None
+
+
+def test_concurrent_claims_take_each_job_once(store):
+    job_ids = {submit(store) for _ in range(30)}
+
+    def drain(worker):
+        claimed = []
+        while (job := store.claim(worker, ["fake"])) is not None:
+            claimed.append(job["id"])
+        return claimed
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        claimed = [job_id for jobs in pool.map(drain, [f"w{i}" for i in range(8)]) for job_id in jobs]
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_stale_running_jobs_are_requeued(store):
+    stale = submit(store)
+    fresh = submit(store)
+    store.claim("w1", ["fake"])
+    store.claim("w2", ["fake"])
+    store.update_progress(stale, 3, 10, {"support": 3})
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 1000, stale))
+
+    assert store.requeue_stale(600) == 1
+    job = store.get(stale)
+    assert (job["status"], job["worker"], job["completed"]) == (QUEUED, None, 0)
+    assert store.get(fresh)["status"] == RUNNING
+    assert store.claim("w3", ["fake"])["id"] == stale
+
+
+def test_cancel_queued_job(store):
+    job_id = submit(store)
+    assert store.cancel(job_id) == CANCELLED
+    assert store.claim("w", ["fake"]) is None
+    assert store.cancel("missing") is None
+
+
+def run_claimed(store, pool, **options):
+    async def run():
+        await pool.start()
+        runner = JobRunner(store, pool, **options)
+        job = store.claim("w", pool.available_models)
+        await runner.run_job(job)
+        return job["id"]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("census", [False, True])
+def test_result_is_the_discuss_response(store, census):
+    pool = FakePool(census=census)
+    submit(store)
+    job_id = run_claimed(store, pool)
+
+    async def discuss():
+        from backend.simulation import run_simulation
+        return await run_simulation(AgentModel(census=census), "region", {"title": "t"})
+
+    expected = asyncio.run(discuss())
+    assert store.result(job_id) == expected
+    job = store.get(job_id)
+    assert job["status"] == COMPLETED
+    assert job["completed"] == job["total"] == 5
+    assert job["summary"] == {"support": 2, "oppose": 3, "neutral": 0}
+
+
+def test_cancel_while_running(store):
+    pool = FakePool(delay=0.01)
+    job_id = submit(store, population=200)
+
+    async def run():
+        await pool.start()
+        runner = JobRunner(store, pool, progress_interval=0.02)
+        job = store.claim("w", pool.available_models)
+        task = asyncio.create_task(runner.run_job(job))
+        while not store.get(job_id)["completed"]:
+            await asyncio.sleep(0.01)
+        assert store.cancel(job_id) == RUNNING
+        await asyncio.wait_for(task, timeout=5)
+        async with pool.acquire("fake") as model:
+            return model
+
+    model = asyncio.run(run())
+    job = store.get(job_id)
+    assert job["status"] == CANCELLED
+    assert 0 < job["completed"] < 200
+    assert model.cancelled
+    assert model.on_agent is None
+    assert store.result(job_id) is None
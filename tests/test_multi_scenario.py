@@ -0,0 +1,17 @@
+import asyncio
+from pathlib import Path
+
+from models.base import ModelConfig
+from models.m03_census.model import Census
+
+AGENTS = Path(__file__).parent.parent / "src" / "models" / "m03_census" / "census_data" / "agents_100.json"
+
+
+def test_proposals_without_id_get_distinct_scenarios():
+    model = Census(ModelConfig(llm={"backend": "synthetic"}, multi_scenario=True, agent_data_file=str(AGENTS)))
+    proposals = [{"title": "Upzone", "description": "A", "cells": {}},
+                 {"title": "Downzone", "description": "B", "cells": {}}]
+    results = asyncio.run(model.simulate_scenarios("san_francisco", proposals))
+    assert list(results) == ["scenario_0", "scenario_1"]
+    agents = model.run_report["multi_scenario"]["agents"]
+    assert all(len(output) == agents for output in results.values())
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from backend.result_cache import ResultCache
+
+
+def test_concurrent_callers_share_one_computation():
+    cache = ResultCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"summary": {"support": 1}}
+
+    async def run():
+        return await asyncio.gather(cache.get_or_compute("k", compute), cache.get_or_compute("k", compute))
+
+    first, second = asyncio.run(run())
+    assert calls == 1
+    assert first == second == {"summary": {"support": 1}}
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 1
+    assert cache.get("k") == first
+
+
+def test_failed_computation_is_not_cached():
+    cache = ResultCache()
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("simulation failed")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("k", fail)
+        assert cache.get("k") is None
+        assert cache.stats()["inflight"] == 0
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("k", fail)
+
+    asyncio.run(run())
+    assert calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_shared_computation():
+    cache = ResultCache()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return {"summary": {}}
+
+    async def run():
+        impatient = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        patient = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        assert await patient == {"summary": {}}
+        assert impatient.cancelled()
+
+    asyncio.run(run())
+    assert cache.get("k") == {"summary": {}}
+
+
+def test_no_cache_does_not_join_an_inflight_computation():
+    cache = ResultCache()
+    versions = iter(["stale", "fresh"])
+
+    async def compute():
+        version = next(versions)
+        await asyncio.sleep(0.02 if version == "stale" else 0.01)
+        return {"version": version}
+
+    async def run():
+        stale = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        fresh = await cache.get_or_compute("k", compute, use_cache=False)
+        joined = await cache.get_or_compute("k", compute)
+        return await stale, fresh, joined
+
+    stale, fresh, joined = asyncio.run(run())
+    assert stale == {"version": "stale"}
+    assert fresh == joined == {"version": "fresh"}
+    # The replaced computation finishing later does not overwrite the fresh result
+    assert cache.get("k") == {"version": "fresh"}
+    assert cache.stats()["misses"] == 2 and cache.stats()["coalesced"] == 0
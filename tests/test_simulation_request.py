@@ -0,0 +1,63 @@
+import pytest
+
+from backend import main
+from backend.proposal_registry import ProposalRegistry, UnknownProposalError
+
+PROPOSAL = {
+    "title": "Test rezoning",
+    "description": "Upzone two cells",
+    "cells": {
+        "0_0": {"bbox": {"north": 37.76, "south": 37.75, "east": -122.43, "west": -122.44}, "heightLimit": 65},
+        "0_1": {"bbox": {"north": 37.76, "south": 37.75, "east": -122.42, "west": -122.43}, "heightLimit": 85}
+    }
+}
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = ProposalRegistry(max_entries=1)
+    monkeypatch.setattr(main, "proposal_registry", registry)
+    return registry
+
+
+def request(**fields):
+    return {"region": "san_francisco", "population": 10, "model": main.default_model, **fields}
+
+
+def test_unknown_proposal_id(registry):
+    with pytest.raises(UnknownProposalError):
+        main.parse_simulation_request(request(proposal_id="0" * 64))
+
+
+def test_proposal_id_must_be_a_string(registry):
+    with pytest.raises(ValueError, match="proposal_id"):
+        main.parse_simulation_request(request(proposal_id=["abc"]))
+
+
+@pytest.mark.parametrize("delta", [["base", "cells"], "abc", {"base": 42}, {"cells": {"0_0": None}}])
+def test_malformed_delta(registry, delta):
+    with pytest.raises(ValueError, match="proposal_delta"):
+        main.parse_simulation_request(request(proposal_delta=delta))
+
+
+def test_malformed_delta_edits(registry):
+    base = registry.register(PROPOSAL)
+    with pytest.raises(ValueError):
+        main.parse_simulation_request(request(proposal_delta={"base": base, "cells": ["0_0"]}))
+
+
+def test_delta_on_evicted_base(registry):
+    base = registry.register(PROPOSAL)
+    registry.register({**PROPOSAL, "title": "Another proposal"})
+    assert base not in registry
+    with pytest.raises(UnknownProposalError):
+        main.parse_simulation_request(request(proposal_delta={"base": base, "cells": {"0_0": {"heightLimit": 40}}}))
+
+
+def test_delta_on_registered_base(registry, monkeypatch):
+    monkeypatch.setattr(type(main.model_pool), "available_models", property(lambda pool: [main.default_model]))
+    base = registry.register(PROPOSAL)
+    _, _, _, proposal, proposal_hash = main.parse_simulation_request(
+        request(proposal_delta={"base": base, "cells": {"0_0": {"heightLimit": 40}}}))
+    assert proposal["cells"]["0_0"]["heightLimit"] == 40
+    assert proposal_hash != base
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from models.llm_backends import LLMBackend, SyntheticLLM, census_answer_complete, census_scenarios_complete
+
+
+class ChunkedLLM(LLMBackend):
+    """Streams a fixed response a few characters at a time and records how much was read."""
+
+    def __init__(self, response, size=3):
+        self.response = response
+        self.size = size
+        self.sent = 0
+        self.closed = False
+
+    async def generate(self, prompt, max_tokens=None, temperature=0.7):
+        return self.response
+
+    async def stream(self, prompt, max_tokens=None, temperature=0.7, response_format=None):
+        try:
+            for start in range(0, len(self.response), self.size):
+                self.sent = start + self.size
+                yield self.response[start:start + self.size]
+        finally:
+            self.closed = True
+
+
+@pytest.mark.parametrize("text", [
+    "Rating: 7",
+    "Rating: 1",  # could still become 10
+    "Rating: 7\n",
+    "Rating: 7\nReasons:",
+    "Rating: 7\nReasons: A, C",  # more codes may follow
+    "Rating: 7\nReasons: A, C, H",  # "H" may be the start of a word
+    "Rating: 7\nExplanation: housing supply\n",  # no Reasons section
+    "Rating: 11\nReasons: A\n",
+    "Rating: 7\nReasons: A, Z\n",
+    '{"rating": 7, "reasons": ["A"',
+    '{"rating": 7}',
+])
+def test_incomplete_answers(text):
+    assert not census_answer_complete(text)
+
+
+@pytest.mark.parametrize("text", [
+    "Rating: 7\nReasons: A, C, D\n",
+    "**Rating:** 10\n**Reasons:** B\n",
+    '{"rating": 7, "reasons": ["A", "C"]}',
+])
+def test_complete_answers(text):
+    assert census_answer_complete(text)
+
+
+def test_confidence_line_required_when_asked():
+    assert not census_answer_complete("Rating: 7\nReasons: A\n", confidence=True)
+    assert not census_answer_complete("Rating: 7\nReasons: A\nConfidence: 8", confidence=True)
+    assert census_answer_complete("Rating: 7\nReasons: A\nConfidence: 8\n", confidence=True)
+    assert not census_answer_complete('{"rating": 7, "reasons": ["A"]}', confidence=True)
+
+
+def test_scenarios_complete_needs_every_block():
+    is_complete = census_scenarios_complete(["1.1", "1.2"])
+    assert not is_complete("Scenario 1.1\nRating: 3\nReasons: A\n\nScenario 1.2\nRating: 4\nReasons: B")
+    assert is_complete("Scenario 1.1\nRating: 3\nReasons: A\n\nScenario 1.2\nRating: 4\nReasons: B\n")
+
+
+def test_generate_until_stops_after_reasons_line():
+    answer = "Rating: 7\nReasons: A, C, D\n"
+    llm = ChunkedLLM(answer + "\nExplanation: " + "the neighborhood would change " * 20)
+    text = asyncio.run(llm.generate_until("prompt", census_answer_complete))
+    assert text.startswith(answer)
+    assert llm.closed and llm.sent < len(llm.response)
+
+
+def test_generate_until_reads_whole_answer_without_reasons():
+    llm = ChunkedLLM("Rating: 7\nI would support this.")
+    text = asyncio.run(llm.generate_until("prompt", census_answer_complete))
+    assert text == llm.response
+
+
+def test_synthetic_chatter_is_cut_without_losing_reasons():
+    prompt = "Rate this proposal.\nRating: <1-10>"
+    full = SyntheticLLM(seed=3, chatter=50).respond(prompt)
+    text = asyncio.run(SyntheticLLM(seed=3, chatter=50).generate_until(prompt, census_answer_complete))
+    assert len(text) < len(full)
+    assert text.split("\n")[:2] == full.split("\n")[:2]
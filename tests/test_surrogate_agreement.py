@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import numpy as np
+
+from models.base import ModelConfig
+from models.llm_backends import LLMBackend
+from models.m02_stupid.model import StupidAgentModel
+from models.m03_census.model import Census
+from models.surrogate import RoutingPlan
+
+from test_multi_scenario import AGENTS
+
+
+class AlternatingLLM(LLMBackend):
+    """Answers every other prompt with text the models cannot parse."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    async def generate(self, prompt, max_tokens=None, temperature=0.7):
+        self.calls += 1
+        return self.answer if self.calls % 2 else "I would rather not say."
+
+
+class FixedRouter:
+    """Sends every agent to the LLM and audits all of them against `label`."""
+
+    def __init__(self, label):
+        self.label = label
+        self.plans = []
+
+    def plan(self, proposal, records):
+        n = len(records)
+        plan = RoutingPlan([self.label] * n, np.ones(n), [[]] * n, np.ones(n, dtype=bool),
+                           np.ones(n, dtype=bool), threshold=0.5, budget=n, numeric=isinstance(self.label, int))
+        self.plans.append(plan)
+        return plan
+
+
+def test_stupid_model_compares_only_parsed_answers():
+    model = StupidAgentModel(ModelConfig(population=6, llm={"backend": "synthetic"}))
+    model.llm = AlternatingLLM("oppose|Too tall|height")
+    model.surrogate = router = FixedRouter("oppose")
+    proposal = {"title": "Upzone", "description": "Taller buildings",
+                "cells": {"0_0": {"bbox": {"north": 37.8, "south": 37.7, "east": -122.4, "west": -122.5},
+                                  "category": "residential", "heightLimit": 65}}}
+    asyncio.run(model.simulate_opinions("san_francisco", proposal))
+
+    assert [llm_label for _, _, llm_label in router.plans[0]._compared] == ["oppose"] * 3
+    assert model.run_report["surrogate"]["agreement"] == 1.0
+
+
+def test_census_compares_only_parsed_answers(tmp_path):
+    agents = tmp_path / "agents.json"
+    agents.write_text(json.dumps(json.loads(AGENTS.read_text())[:6]))
+    model = Census(ModelConfig(llm={"backend": "synthetic"}, agent_data_file=str(agents)))
+    model.llm = AlternatingLLM("Rating: 2\nReasons: A\n")
+    model.surrogate = router = FixedRouter(2)
+    asyncio.run(model.simulate_opinions("san_francisco", {"title": "Upzone", "description": "Taller", "cells": {}}))
+
+    assert [llm_label for _, _, llm_label in router.plans[0]._compared] == [2] * 3
+    assert model.run_report["surrogate"]["agreement"] == 1.0